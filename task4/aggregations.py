@@ -0,0 +1,150 @@
+"""Columnar order aggregations shared by both pipelines.
+
+Each function returns a Series ordered by first appearance in df_orders,
+which is the order the row-by-row loops it replaces filled their dicts in,
+so ties resolve to the same winner. Author metrics group on the integer
+author_set_id the orders get from books.AuthorIndex.
+"""
+import numpy as np
+import pandas as pd
+
+UNKNOWN_AUTHOR = 'Unknown Author'
+
+
+def quantity_by_author_set_id(df_orders):
+    """Quantity sold per author_set_id (orders without authors, id -1, are skipped)."""
+    set_ids = df_orders['author_set_id'].to_numpy(dtype=np.int64)
+    valid = set_ids >= 0
+    quantity = pd.to_numeric(df_orders['quantity'], errors='coerce').fillna(0).astype(int).to_numpy()
+    return pd.Series(quantity[valid]).groupby(set_ids[valid], sort=False).sum()
+
+
+def quantity_by_author_set(df_orders, author_sets):
+    """Quantity sold per non-empty author_set tuple; author_sets maps ids to tuples."""
+    sales = quantity_by_author_set_id(df_orders)
+    sales.index = pd.Index([author_sets[k] for k in sales.index], tupleize_cols=False)
+    return sales
+
+
+def quantity_by_author(df_orders):
+    """Quantity sold per author; orders without an author list are skipped.
+
+    Sums by author_set_id first, then spreads each set's total over its
+    authors. Each set's authors are taken from the first order carrying it,
+    in that order's list order, so authors come out in the same order an
+    explode of the authors column would give them.
+    """
+    set_ids = df_orders['author_set_id'].to_numpy(dtype=np.int64)
+    valid = set_ids >= 0
+    quantity = df_orders['quantity'].to_numpy()[valid]
+    set_quantity = pd.Series(quantity).groupby(set_ids[valid], sort=False).sum()
+    return spread_over_authors(set_quantity, first_authors(df_orders, set_ids, valid))
+
+
+def first_authors(df_orders, set_ids, valid):
+    """{author_set_id: authors list of the first order carrying it}."""
+    first_rows = pd.Series(np.flatnonzero(valid)).groupby(set_ids[valid], sort=False).first()
+    authors = df_orders['authors']
+    return {k: authors.iat[row] for k, row in zip(first_rows.index.tolist(), first_rows.tolist())}
+
+
+def spread_over_authors(set_quantity, set_authors):
+    """Per-author quantity from per-set quantities, authors in set_authors list order."""
+    names, totals = [], []
+    for k, total in zip(set_quantity.index.tolist(), set_quantity.tolist()):
+        for author in set_authors[k]:
+            names.append(author)
+            totals.append(total)
+    sales = pd.Series(totals, index=pd.Index(names, dtype=object), dtype=set_quantity.dtype)
+    valid_author = sales.index.notna() & (sales.index != '') & (sales.index != UNKNOWN_AUTHOR)
+    return sales[valid_author].groupby(level=0, sort=False).sum()
+
+
+def spending_by_cluster(df_orders):
+    """paid_price per cluster_id, added up in row order."""
+    cluster_id = df_orders['cluster_id']
+    paid = df_orders['paid_price']
+    valid = (cluster_id.notna() & (cluster_id.astype(str) != '') & paid.notna()).to_numpy(dtype=bool)
+    codes, uniques = pd.factorize(cluster_id[valid])
+    totals = np.zeros(len(uniques))
+    # np.add.at adds sequentially, matching a running Python sum to the bit
+    np.add.at(totals, codes, paid[valid].to_numpy(dtype=float))
+    return pd.Series(totals, index=uniques)
+
+
+def top_ties(sales):
+    """Index labels sharing the maximum value, in order."""
+    if sales.empty:
+        return []
+    return sales.index[sales.to_numpy() == sales.max()].tolist()
+
+
+def to_cents(paid):
+    return np.round(paid.to_numpy(dtype=float) * 100).astype(np.int64)
+
+
+class OrderTotals:
+    """Daily revenue, author(-set) quantities and cluster spending built up
+    batch by batch from enriched orders.
+
+    Every update folds the batch into the running totals, so memory is
+    bounded by the number of distinct dates / author sets / clusters, not
+    by the number of orders. paid_price is already rounded to cents, so
+    money is summed as integer cents and the totals don't depend on how
+    the orders were split into batches.
+    """
+
+    def __init__(self, author_sets=()):
+        self.author_sets = author_sets
+        self.daily_cents = pd.Series(dtype=np.int64)
+        self.set_quantity = pd.Series(dtype=np.int64)
+        self.set_authors = {}
+        self.cluster_cents = pd.Series(dtype=np.int64)
+
+    def update(self, df_orders):
+        paid = df_orders['paid_price'].fillna(0.0)
+        # summed per distinct date first, so only those are boxed into date
+        # objects ('date' holds date objects, or Arrow date32 values in lean mode)
+        codes, dates = pd.factorize(df_orders['date'])
+        per_date = pd.Series(to_cents(paid)).groupby(codes).sum()
+        keys = np.append(np.asarray(dates, dtype=object), pd.NaT)
+        daily = pd.Series(per_date.to_numpy(), index=keys[per_date.index.to_numpy()])
+        self.daily_cents = _merge(self.daily_cents, daily.groupby(level=0, dropna=False).sum(), dropna=False)
+        self.set_quantity = _merge(self.set_quantity, quantity_by_author_set_id(df_orders), sort=False)
+        set_ids = df_orders['author_set_id'].to_numpy(dtype=np.int64)
+        for k, authors in first_authors(df_orders, set_ids, set_ids >= 0).items():
+            self.set_authors.setdefault(k, authors)
+        # likewise per distinct cluster (cluster_id is categorical: no string hashing)
+        codes, clusters = pd.factorize(df_orders['cluster_id'])
+        valid = codes >= 0
+        per_cluster = pd.Series(to_cents(paid[valid])).groupby(codes[valid]).sum()
+        keys = np.asarray(clusters, dtype=object)[per_cluster.index.to_numpy()]
+        spend = pd.Series(per_cluster.to_numpy(), index=keys)
+        self.cluster_cents = _merge(self.cluster_cents, spend.groupby(level=0).sum())
+
+    def daily_revenue(self):
+        """Same frame as df.groupby('date', dropna=False)['paid_price'].sum().reset_index()."""
+        return pd.DataFrame({'date': self.daily_cents.index.to_numpy(),
+                             'paid_price': self.daily_cents.to_numpy() / 100})
+
+    def author_set_quantity(self):
+        """Quantity per author_set tuple, in first-appearance order."""
+        sales = self.set_quantity.copy()
+        sales.index = pd.Index([self.author_sets[k] for k in sales.index], tupleize_cols=False)
+        return sales
+
+    def author_quantity(self):
+        """Quantity per author, the same Series quantity_by_author gives
+        for all the orders seen."""
+        return spread_over_authors(self.set_quantity, self.set_authors)
+
+    def cluster_spending(self):
+        """paid_price per cluster_id, sorted by cluster_id."""
+        return pd.Series(self.cluster_cents.to_numpy() / 100,
+                         index=self.cluster_cents.index.rename('cluster_id'), name='paid_price')
+
+
+def _merge(total, partial, sort=True, dropna=True):
+    if total.empty:
+        return partial.astype(np.int64)
+    return pd.concat([total, partial]).groupby(level=0, sort=sort, dropna=dropna).sum()
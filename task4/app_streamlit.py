@@ -1,11 +1,12 @@
 import streamlit as st
 import pandas as pd
-import json
 import os
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 
+from dashboard_data import DashboardData, lazy_tabs, tab_open
+
 OUTPUT_DIR = "./output"
 
 # Professional Page Configuration
@@ -70,30 +71,33 @@ if not os.path.exists(OUTPUT_DIR):
     st.error("❌ No processed data found. Please run process_data.py first.")
     st.stop()
 
-# Load data with error handling
+# Summaries are small and cached on file mtime; a dataset's frames are
+# only read when a tab that shows them is open
+data_layer = DashboardData(OUTPUT_DIR)
 datasets = {}
 for dataset in ["DATA1", "DATA2", "DATA3"]:
-    summary_file = os.path.join(OUTPUT_DIR, f"{dataset}_summary.json")
-    revenue_file = os.path.join(OUTPUT_DIR, f"{dataset}_daily_revenue.csv")
-    
     try:
-        if os.path.exists(summary_file):
-            with open(summary_file, "r", encoding="utf-8") as f:
-                summary_data = json.load(f)
-            
-            revenue_data = None
-            if os.path.exists(revenue_file):
-                revenue_data = pd.read_csv(revenue_file)
-                if 'paid_price' in revenue_data.columns:
-                    revenue_data['paid_price'] = pd.to_numeric(revenue_data['paid_price'], errors='coerce')
-            
-            datasets[dataset] = {
-                "summary": summary_data,
-                "revenue_data": revenue_data
-            }
+        summary_data = data_layer.summary(dataset)
+        if summary_data is not None:
+            datasets[dataset] = {"summary": summary_data}
     except Exception as e:
         st.error(f"Error loading {dataset}: {str(e)}")
 
+
+def load_dataset_frames(dataset):
+    """Daily revenue and revenue cube of one dataset (cached), added to datasets[dataset]."""
+    data = datasets[dataset]
+    if "revenue_data" not in data:
+        # daily_revenue.parquet if present (typed, only the two columns), else the CSV
+        revenue_data = data_layer.daily_revenue(dataset)
+        if revenue_data is not None and 'paid_price' in revenue_data.columns:
+            revenue_data['paid_price'] = pd.to_numeric(revenue_data['paid_price'], errors='coerce')
+        data["revenue_data"] = revenue_data
+        # month / weekday breakdowns come from the pre-aggregated revenue cube
+        data["cube"] = data_layer.cube(dataset)
+    return data
+
+
 if not datasets:
     st.error("❌ No datasets available. Please check data processing.")
     st.stop()
@@ -103,212 +107,240 @@ st.success(f"✅ {len(datasets)} dataset(s) loaded successfully! Dashboard is re
 
 # Create professional tabs
 tab_names = ["📊 COMPARISON DASHBOARD"] + [f"📁 {dataset}" for dataset in datasets.keys()]
-tabs = st.tabs(tab_names)
+tabs = lazy_tabs(tab_names, key="dataset_tabs")
 
 # Comparison Tab - Professional Layout
 with tabs[0]:
-    st.markdown("## 📈 Multi-Dataset Performance Overview")
+    if tab_open(tabs[0]):
+        for dataset in datasets:
+            load_dataset_frames(dataset)
+        st.markdown("## 📈 Multi-Dataset Performance Overview")
     
-    # KPI Cards Row
-    st.markdown("### 🎯 Key Performance Indicators")
-    cols = st.columns(len(datasets))
+        # KPI Cards Row
+        st.markdown("### 🎯 Key Performance Indicators")
+        cols = st.columns(len(datasets))
     
-    for i, (dataset, data) in enumerate(datasets.items()):
-        summary = data["summary"]
-        with cols[i]:
-            total_revenue = data["revenue_data"]['paid_price'].sum() if data["revenue_data"] is not None else 0
+        for i, (dataset, data) in enumerate(datasets.items()):
+            summary = data["summary"]
+            with cols[i]:
+                total_revenue = data["revenue_data"]['paid_price'].sum() if data["revenue_data"] is not None else 0
             
-            st.markdown(f"""
-            <div class="metric-card">
-                <h3>{dataset}</h3>
-                <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${total_revenue:,.0f}</p>
-                <p>Total Revenue</p>
-                <p style="font-size: 1.1rem; margin: 0.2rem 0;">👥 {summary.get('unique_real_users', 0):,} Users</p>
-                <p style="font-size: 1.1rem; margin: 0.2rem 0;">📚 {summary.get('unique_author_sets', 0)} Author Sets</p>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h3>{dataset}</h3>
+                    <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${total_revenue:,.0f}</p>
+                    <p>Total Revenue</p>
+                    <p style="font-size: 1.1rem; margin: 0.2rem 0;">👥 {summary.get('unique_real_users', 0):,} Users</p>
+                    <p style="font-size: 1.1rem; margin: 0.2rem 0;">📚 {summary.get('unique_author_sets', 0)} Author Sets</p>
+                </div>
+                """, unsafe_allow_html=True)
     
-    # Revenue Comparison Chart
-    st.markdown("### 📊 Revenue Trends Comparison")
-    fig_comparison = go.Figure()
+        # Revenue Comparison Chart
+        st.markdown("### 📊 Revenue Trends Comparison")
+        fig_comparison = go.Figure()
     
-    colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
-    for idx, (dataset, data) in enumerate(datasets.items()):
-        if data["revenue_data"] is not None and not data["revenue_data"].empty:
-            df = data["revenue_data"].copy()
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna(subset=['date', 'paid_price'])
+        colors = ['#1f77b4', '#ff7f0e', '#2ca02c']
+        for idx, (dataset, data) in enumerate(datasets.items()):
+            if data["revenue_data"] is not None and not data["revenue_data"].empty:
+                df = data["revenue_data"].copy()
+                df['date'] = pd.to_datetime(df['date'], errors='coerce')
+                df = df.dropna(subset=['date', 'paid_price'])
             
-            if not df.empty:
-                fig_comparison.add_trace(go.Scatter(
-                    x=df['date'], 
-                    y=df['paid_price'],
-                    name=dataset,
-                    line=dict(width=3, color=colors[idx]),
-                    mode='lines'
-                ))
+                if not df.empty:
+                    fig_comparison.add_trace(go.Scatter(
+                        x=df['date'], 
+                        y=df['paid_price'],
+                        name=dataset,
+                        line=dict(width=3, color=colors[idx]),
+                        mode='lines'
+                    ))
     
-    fig_comparison.update_layout(
-        title="Daily Revenue Trends Across All Datasets",
-        xaxis_title="Date",
-        yaxis_title="Revenue ($)",
-        height=400,
-        template="plotly_white"
-    )
-    st.plotly_chart(fig_comparison, use_container_width=True)
+        fig_comparison.update_layout(
+            title="Daily Revenue Trends Across All Datasets",
+            xaxis_title="Date",
+            yaxis_title="Revenue ($)",
+            height=400,
+            template="plotly_white"
+        )
+        st.plotly_chart(fig_comparison, use_container_width=True)
 
 # Individual Dataset Tabs - Professional Layout
-for i, (dataset, data) in enumerate(datasets.items(), 1):
+for i, dataset in enumerate(datasets, 1):
     with tabs[i]:
-        summary = data["summary"]
+        if tab_open(tabs[i]):
+            data = load_dataset_frames(dataset)
+            summary = data["summary"]
         
-        # Header with dataset info
-        st.markdown(f"## 📋 {dataset} - Detailed Analysis")
+            # Header with dataset info
+            st.markdown(f"## 📋 {dataset} - Detailed Analysis")
         
-        # Top Row - Key Metrics
-        st.markdown("### 🎯 Performance Overview")
-        col1, col2, col3, col4 = st.columns(4)
+            # Top Row - Key Metrics
+            st.markdown("### 🎯 Performance Overview")
+            col1, col2, col3, col4 = st.columns(4)
         
-        with col1:
-            unique_users = summary.get('unique_real_users', 0)
-            st.markdown(f"""
-            <div class="metric-card">
-                <h4>👥 Unique Users</h4>
-                <p style="font-size: 2rem; font-weight: bold; margin: 0.5rem 0;">{unique_users:,}</p>
-                <p>After user reconciliation</p>
-            </div>
-            """, unsafe_allow_html=True)
+            with col1:
+                unique_users = summary.get('unique_real_users', 0)
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h4>👥 Unique Users</h4>
+                    <p style="font-size: 2rem; font-weight: bold; margin: 0.5rem 0;">{unique_users:,}</p>
+                    <p>After user reconciliation</p>
+                </div>
+                """, unsafe_allow_html=True)
         
-        with col2:
-            author_sets = summary.get('unique_author_sets', 0)
-            st.markdown(f"""
-            <div class="metric-card">
-                <h4>📚 Author Sets</h4>
-                <p style="font-size: 2rem; font-weight: bold; margin: 0.5rem 0;">{author_sets}</p>
-                <p>Unique combinations</p>
-            </div>
-            """, unsafe_allow_html=True)
+            with col2:
+                author_sets = summary.get('unique_author_sets', 0)
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h4>📚 Author Sets</h4>
+                    <p style="font-size: 2rem; font-weight: bold; margin: 0.5rem 0;">{author_sets}</p>
+                    <p>Unique combinations</p>
+                </div>
+                """, unsafe_allow_html=True)
         
-        with col3:
-            authors = summary.get("most_popular_authors", [])
-            display_author = authors[0] if authors else "No data"
-            st.markdown(f"""
-            <div class="metric-card">
-                <h4>🏆 Popular Author</h4>
-                <p style="font-size: 1.3rem; font-weight: bold; margin: 0.5rem 0;">{display_author}</p>
-                <p>Most frequent in catalog</p>
-            </div>
-            """, unsafe_allow_html=True)
+            with col3:
+                authors = summary.get("most_popular_authors", [])
+                display_author = authors[0] if authors else "No data"
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h4>🏆 Popular Author</h4>
+                    <p style="font-size: 1.3rem; font-weight: bold; margin: 0.5rem 0;">{display_author}</p>
+                    <p>Most frequent in catalog</p>
+                </div>
+                """, unsafe_allow_html=True)
         
-        with col4:
-            total_spent = summary.get('top_customer_total_spent', 0)
-            st.markdown(f"""
-            <div class="metric-card">
-                <h4>💰 Top Spender</h4>
-                <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${total_spent:,.0f}</p>
-                <p>Total customer spending</p>
-            </div>
-            """, unsafe_allow_html=True)
+            with col4:
+                total_spent = summary.get('top_customer_total_spent', 0)
+                st.markdown(f"""
+                <div class="metric-card">
+                    <h4>💰 Top Spender</h4>
+                    <p style="font-size: 1.5rem; font-weight: bold; margin: 0.5rem 0;">${total_spent:,.0f}</p>
+                    <p>Total customer spending</p>
+                </div>
+                """, unsafe_allow_html=True)
         
-        # Two Column Layout for Details
-        col_left, col_right = st.columns(2)
+            # Two Column Layout for Details
+            col_left, col_right = st.columns(2)
         
-        with col_left:
-            # Top 5 Revenue Days - Professional Cards
-            st.markdown("### 🎯 Top 5 Revenue Days")
-            top5_days = summary.get("top5_days", [])
-            if top5_days:
-                for j, day in enumerate(top5_days[:5], 1):
-                    date = day.get('date', 'Unknown')
-                    revenue = day.get('paid_price', 0)
-                    st.markdown(f"""
-                    <div class="top-day-card">
-                        <div style="display: flex; justify-content: space-between; align-items: center;">
-                            <div>
-                                <strong style="font-size: 1.1em;">#{j} {date}</strong>
-                            </div>
-                            <div style="font-size: 1.2em; font-weight: bold;">
-                                ${revenue:,.2f}
+            with col_left:
+                # Top 5 Revenue Days - Professional Cards
+                st.markdown("### 🎯 Top 5 Revenue Days")
+                top5_days = summary.get("top5_days", [])
+                if top5_days:
+                    for j, day in enumerate(top5_days[:5], 1):
+                        date = day.get('date', 'Unknown')
+                        revenue = day.get('paid_price', 0)
+                        st.markdown(f"""
+                        <div class="top-day-card">
+                            <div style="display: flex; justify-content: space-between; align-items: center;">
+                                <div>
+                                    <strong style="font-size: 1.1em;">#{j} {date}</strong>
+                                </div>
+                                <div style="font-size: 1.2em; font-weight: bold;">
+                                    ${revenue:,.2f}
+                                </div>
                             </div>
                         </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.info("📊 No revenue day data available")
+                        """, unsafe_allow_html=True)
+                else:
+                    st.info("📊 No revenue day data available")
         
-        with col_right:
-            # Best Buyer Information - Professional Card
-            st.markdown("### 👑 Best Buyer Details")
-            buyer_ids = summary.get("top_customer_user_ids", [])
-            total_spent = summary.get('top_customer_total_spent', 0)
+            with col_right:
+                # Best Buyer Information - Professional Card
+                st.markdown("### 👑 Best Buyer Details")
+                buyer_ids = summary.get("top_customer_user_ids", [])
+                total_spent = summary.get('top_customer_total_spent', 0)
             
-            if buyer_ids:
-                st.markdown(f"""
-                <div class="customer-card">
-                    <h4 style="margin: 0 0 1rem 0;">🏆 Top Customer</h4>
-                    <p style="font-size: 1.1em; margin: 0.5rem 0;"><strong>User IDs:</strong> {', '.join(map(str, buyer_ids))}</p>
-                    <p style="font-size: 1.3em; font-weight: bold; margin: 0.5rem 0; color: #27ae60;">
-                        Total Spent: ${total_spent:,.2f}
-                    </p>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.info("👤 No buyer data available")
+                if buyer_ids:
+                    st.markdown(f"""
+                    <div class="customer-card">
+                        <h4 style="margin: 0 0 1rem 0;">🏆 Top Customer</h4>
+                        <p style="font-size: 1.1em; margin: 0.5rem 0;"><strong>User IDs:</strong> {', '.join(map(str, buyer_ids))}</p>
+                        <p style="font-size: 1.3em; font-weight: bold; margin: 0.5rem 0; color: #27ae60;">
+                            Total Spent: ${total_spent:,.2f}
+                        </p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                else:
+                    st.info("👤 No buyer data available")
         
-        # Revenue Chart - Professional Styling
-        if data["revenue_data"] is not None and not data["revenue_data"].empty:
-            st.markdown("### 📈 Revenue Analytics")
+            # Revenue Chart - Professional Styling
+            if data["revenue_data"] is not None and not data["revenue_data"].empty:
+                st.markdown("### 📈 Revenue Analytics")
             
-            df = data["revenue_data"].copy()
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna(subset=['date', 'paid_price'])
+                df = data["revenue_data"].copy()
+                df['date'] = pd.to_datetime(df['date'], errors='coerce')
+                df = df.dropna(subset=['date', 'paid_price'])
             
-            if not df.empty:
-                # Create area chart for better visual appeal
-                fig = px.area(df, x='date', y='paid_price', 
-                            title=f"{dataset} - Daily Revenue Trend",
-                            labels={'paid_price': 'Revenue ($)', 'date': 'Date'})
+                if not df.empty:
+                    # Create area chart for better visual appeal
+                    fig = px.area(df, x='date', y='paid_price', 
+                                title=f"{dataset} - Daily Revenue Trend",
+                                labels={'paid_price': 'Revenue ($)', 'date': 'Date'})
                 
-                fig.update_layout(
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color="#2c3e50"),
-                    height=400,
-                    hovermode='x unified',
-                    xaxis=dict(showgrid=True, gridcolor='lightgray'),
-                    yaxis=dict(showgrid=True, gridcolor='lightgray')
-                )
+                    fig.update_layout(
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color="#2c3e50"),
+                        height=400,
+                        hovermode='x unified',
+                        xaxis=dict(showgrid=True, gridcolor='lightgray'),
+                        yaxis=dict(showgrid=True, gridcolor='lightgray')
+                    )
                 
-                fig.update_traces(
-                    line=dict(color='#3498db', width=3),
-                    fillcolor='rgba(52, 152, 219, 0.3)'
-                )
+                    fig.update_traces(
+                        line=dict(color='#3498db', width=3),
+                        fillcolor='rgba(52, 152, 219, 0.3)'
+                    )
                 
-                st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig, use_container_width=True)
                 
-                # Revenue Statistics
-                st.markdown("#### 💹 Revenue Statistics")
-                stat_cols = st.columns(4)
+                    # Revenue Statistics
+                    st.markdown("#### 💹 Revenue Statistics")
+                    stat_cols = st.columns(4)
                 
-                with stat_cols[0]:
-                    total_rev = df['paid_price'].sum()
-                    st.metric("Total Revenue", f"${total_rev:,.0f}")
+                    with stat_cols[0]:
+                        total_rev = df['paid_price'].sum()
+                        st.metric("Total Revenue", f"${total_rev:,.0f}")
                 
-                with stat_cols[1]:
-                    avg_daily = df['paid_price'].mean()
-                    st.metric("Avg Daily", f"${avg_daily:,.0f}")
+                    with stat_cols[1]:
+                        avg_daily = df['paid_price'].mean()
+                        st.metric("Avg Daily", f"${avg_daily:,.0f}")
                 
-                with stat_cols[2]:
-                    highest_day = df['paid_price'].max()
-                    st.metric("Peak Day", f"${highest_day:,.0f}")
+                    with stat_cols[2]:
+                        highest_day = df['paid_price'].max()
+                        st.metric("Peak Day", f"${highest_day:,.0f}")
                 
-                with stat_cols[3]:
-                    days_count = len(df)
-                    st.metric("Days Tracked", days_count)
+                    with stat_cols[3]:
+                        days_count = len(df)
+                        st.metric("Days Tracked", days_count)
+                else:
+                    st.info("📊 No valid revenue data for visualization")
             else:
-                st.info("📊 No valid revenue data for visualization")
-        else:
-            st.info("📊 No revenue chart data available")
+                st.info("📊 No revenue chart data available")
+        
+            # Month / weekday breakdowns from the revenue cube
+            if data["cube"] is not None:
+                st.markdown("### 📅 Revenue by Month & Weekday")
+                cube_cols = st.columns(2)
+            
+                with cube_cols[0]:
+                    monthly = data["cube"].query(by=['month'])
+                    fig = px.bar(monthly, x='month', y='paid_price',
+                                 title=f"{dataset} - Monthly Revenue",
+                                 labels={'paid_price': 'Revenue ($)', 'month': 'Month'})
+                    fig.update_traces(marker_color='#3498db')
+                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', height=350)
+                    st.plotly_chart(fig, use_container_width=True)
+            
+                with cube_cols[1]:
+                    by_weekday = data["cube"].query(by=['weekday'])
+                    fig = px.bar(by_weekday, x='weekday', y='paid_price',
+                                 title=f"{dataset} - Revenue by Weekday",
+                                 labels={'paid_price': 'Revenue ($)', 'weekday': 'Weekday'})
+                    fig.update_traces(marker_color='#2ecc71')
+                    fig.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', height=350)
+                    st.plotly_chart(fig, use_container_width=True)
 
 # Professional Footer
 st.markdown("---")
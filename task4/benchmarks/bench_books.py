@@ -0,0 +1,58 @@
+"""Benchmark books.yaml ingestion: pure-Python SafeLoader, libyaml
+CSafeLoader and the Parquet sidecar.
+
+    python benchmarks/bench_books.py --books 300000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_books
+from books import YAML_LOADER, books_frame, load_books, normalize_key
+from pipeline import AUTHORS_VERSION, extract_authors_from_book
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=300000)
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    yaml_path = os.path.join(args.work_dir, f"books_{args.books}.yaml")
+    if not os.path.exists(yaml_path):
+        with open(yaml_path, 'w', encoding='utf-8') as f:
+            yaml.dump(make_books(args.books), f, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), sort_keys=False)
+    cache_dir = os.path.join(args.work_dir, 'books_cache')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    t0 = time.perf_counter()
+    with open(yaml_path, 'r', encoding='utf-8') as f:
+        slow = yaml.safe_load(f)
+    slow = books_frame([{normalize_key(k): v for k, v in b.items()} for b in slow], extract_authors_from_book)
+    safe_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast, _ = load_books(yaml_path, extract_authors_from_book, AUTHORS_VERSION, cache_dir)
+    first_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cached, _ = load_books(yaml_path, extract_authors_from_book, AUTHORS_VERSION, cache_dir)
+    sidecar_s = time.perf_counter() - t0
+
+    same = slow.astype(str).equals(fast.astype(str)) and slow.astype(str).equals(cached.astype(str))
+    print(f"books:                 {args.books:,}")
+    print(f"safe_load:             {safe_s:.2f}s")
+    print(f"{YAML_LOADER.__name__} + sidecar: {first_s:.2f}s ({safe_s / first_s:.1f}x)")
+    print(f"sidecar:               {sidecar_s:.2f}s ({safe_s / sidecar_s:.1f}x)")
+    print(f"same books:            {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Revenue cube queries vs re-scanning orders_enriched.
+
+    python benchmarks/bench_cube.py --orders 1000000 --batch-size 200000
+
+Runs the pipeline (Parquet tables) on a synthetic dataset (see
+synthetic.py), then answers the same questions twice: from the cube
+tables through cube.RevenueCube, and by reading orders_enriched.parquet
+and grouping it. Prints the cube sizes, the time of each query both ways
+and whether the answers agree. With --batch-size the cube is also built
+from streamed batches and must equal the whole-file one.
+"""
+import os
+import sys
+import time
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import numpy as np
+import pandas as pd
+
+from cube import CUBE_LEVELS, RevenueCube
+from outputs import read_table
+from pipeline import Pipeline
+from synthetic import write_dataset
+
+QUERIES = {
+    'total': ([], {}),
+    'by month': (['month'], {}),
+    'by weekday': (['weekday'], {}),
+    'month x author, one year': (['month', 'author'], {'year': 2024}),
+    'by cluster, two months': (['cluster_id'], {'month': ['2024-11', '2024-12']}),
+    'by book, one day': (['book_id'], {'date': '2024-06-01'}),
+}
+
+
+def scan(out_prefix, by, where):
+    """The query answered from orders_enriched, paid_price summed in cents."""
+    orders = read_table(out_prefix, 'orders_enriched',
+                        columns=['timestamp_parsed', 'book_id', 'cluster_id', 'authors', 'quantity', 'paid_price'])
+    ts = pd.to_datetime(orders['timestamp_parsed'])
+    orders = orders.assign(date=ts.dt.normalize(), month=ts.dt.strftime('%Y-%m'), year=ts.dt.year,
+                           weekday=ts.dt.day_name(), orders=1,
+                           paid_cents=np.round(orders['paid_price'].fillna(0.0) * 100).astype(np.int64))
+    if 'author' in set(by) | set(where):
+        orders = orders.explode('authors').rename(columns={'authors': 'author'})
+    for dim, value in where.items():
+        values = value if isinstance(value, list) else [value]
+        orders = orders[orders[dim].isin(pd.to_datetime(values) if dim == 'date' else values)]
+    measures = ['quantity', 'paid_cents', 'orders']
+    if by:
+        result = orders.groupby(by, sort=True, observed=True)[measures].sum().reset_index()
+    else:
+        result = pd.DataFrame({m: [orders[m].sum()] for m in measures})
+    result['paid_price'] = result.pop('paid_cents') / 100
+    return result
+
+
+def same(a, b, by):
+    a = a.astype({col: str for col in by}).sort_values(by).reset_index(drop=True) if by else a
+    b = b.astype({col: str for col in by}).sort_values(by).reset_index(drop=True) if by else b
+    cols = ['quantity', 'orders', 'paid_price']
+    return len(a) == len(b) and all((a[c].to_numpy() == b[c].to_numpy()).all() for c in cols)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def build(data_dir, out_dir, batch_size):
+    pipeline = Pipeline(batch_size=batch_size, output_format='parquet', log=lambda message: None)
+    run = pipeline.run(data_dir, out_dir)
+    return run.out_prefix, run.profile
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=0, help='default: orders / 20')
+    parser.add_argument('--books', type=int, default=0, help='default: orders / 200')
+    parser.add_argument('--batch-size', type=int, default=0, help='also build the cube from streamed batches')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    n = args.orders
+    data_dir = os.path.join(args.work_dir, f"CUBE_{n}_{args.seed}")
+    if not os.path.exists(os.path.join(data_dir, 'orders.parquet')):
+        write_dataset(data_dir, n, n_users=args.users or max(1000, n // 20),
+                      n_books=args.books or max(1000, n // 200), seed=args.seed)
+    out_prefix, profile = build(data_dir, os.path.join(args.work_dir, 'cube_out'), None)
+    aggregate = profile.stages['aggregate'].parts.get('cube', 0.0)
+    write = profile.stages['write'].parts.get('cube', 0.0)
+    print(f"cube build: aggregate {aggregate:.2f}s, write {write:.2f}s")
+
+    cube = RevenueCube(out_prefix)
+    for level in CUBE_LEVELS:
+        table = cube.table(f'cube_{level}')
+        size = os.path.getsize(f"{out_prefix}_cube_{level}.parquet") / 2 ** 20
+        print(f"  cube_{level:<6} {len(table):>10} rows {size:>8.1f} MB")
+
+    print(f"\n{'query':<28} {'cube_ms':>9} {'scan_ms':>9} {'speedup':>8} {'same':>5}")
+    for name, (by, where) in QUERIES.items():
+        cube_s, result = min((timed(lambda: cube.query(by, where)) for _ in range(args.repeat)), key=lambda r: r[0])
+        scan_s, expected = min((timed(lambda: scan(out_prefix, by, where)) for _ in range(args.repeat)),
+                               key=lambda r: r[0])
+        print(f"{name:<28} {cube_s * 1000:>9.1f} {scan_s * 1000:>9.1f} {scan_s / cube_s:>7.0f}x "
+              f"{'yes' if same(result, expected, by) else 'NO':>5}")
+
+    if args.batch_size:
+        streamed_prefix, _ = build(data_dir, os.path.join(args.work_dir, 'cube_out_streamed'), args.batch_size)
+        streamed = RevenueCube(streamed_prefix)
+        equal = all(cube.table(f'cube_{level}').equals(streamed.table(f'cube_{level}')) for level in CUBE_LEVELS)
+        print(f"\nstreamed (batch {args.batch_size}) cube equals whole-file cube: {'yes' if equal else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""pandas vs lazy polars engine (polars_engine.py) on synthetic datasets.
+
+    python benchmarks/bench_engines.py --orders 1000000 5000000 --threads 8
+
+Each size is run once per engine in a fresh child process, writing every
+table (the CLI) and writing only the summary (the dashboard, where the
+polars engine never materializes the enriched orders). Prints wall time,
+peak RSS, the aggregate stage's seconds (where the polars plans are
+collected) and whether the summary equals the pandas engine's
+(total_revenue to within float rounding).
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from bench_pipeline import dataset_dir
+from check_golden import stable
+
+ENGINES = ('pandas', 'polars')
+
+
+def run_engine(data_dir, out_dir, engine, write_tables, threads):
+    """Pipeline.run in a child process: (seconds, peak RSS MB, stage seconds, summary)."""
+    code = (
+        "import sys, io, contextlib; sys.path.insert(0, %r)\n"
+        "from pipeline import Pipeline\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    Pipeline(engine=%r, write_tables=%r).run(%r, %r)\n"
+    ) % (os.path.dirname(HERE), engine, write_tables, data_dir, out_dir)
+    env = dict(os.environ)
+    if threads:
+        env['POLARS_MAX_THREADS'] = str(threads)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code], env=env)
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - t0
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError(f"{engine} engine failed for {data_dir}")
+    name = os.path.basename(os.path.normpath(data_dir))
+    with open(os.path.join(out_dir, f"{name}_profile.json"), encoding='utf-8') as f:
+        stages = {stage: stats['seconds'] for stage, stats in json.load(f)['stages'].items()}
+    with open(os.path.join(out_dir, f"{name}_summary.json"), encoding='utf-8') as f:
+        summary = stable(json.load(f))
+    return seconds, usage.ru_maxrss / 1024, stages, summary
+
+
+def same_summary(expected, actual):
+    expected, actual = dict(expected), dict(actual)
+    return (math.isclose(expected.pop('total_revenue'), actual.pop('total_revenue'), rel_tol=1e-12)
+            and expected == actual)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--dup-rate', type=float, default=0.05)
+    parser.add_argument('--threads', type=int, default=0, help='POLARS_MAX_THREADS (0 = all cores)')
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    print(f"{'orders':>9} {'tables':>7} {'engine':>7} {'seconds':>8} {'peak MB':>8} {'aggregate s':>11} "
+          f"{'same summary':>12}")
+    for n in args.orders:
+        data_dir = dataset_dir(args.work_dir, n, args.users, args.books, args.dup_rate, 42)
+        for write_tables in (True, False):
+            results = {}
+            for engine in ENGINES:
+                out_dir = os.path.join(args.work_dir, f"engines_{engine}_{n}_{int(write_tables)}")
+                results[engine] = run_engine(data_dir, out_dir, engine, write_tables, args.threads)
+            for engine, (seconds, peak, stages, summary) in results.items():
+                same = 'yes' if same_summary(results['pandas'][3], summary) else 'NO'
+                print(f"{n:>9} {'yes' if write_tables else 'no':>7} {engine:>7} {seconds:>8.2f} {peak:>8.0f} "
+                      f"{stages.get('aggregate', 0.0):>11.2f} {same:>12}")
+
+
+if __name__ == "__main__":
+    main()
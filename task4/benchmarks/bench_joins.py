@@ -0,0 +1,94 @@
+"""Compare the old astype(str) + map/merge joins with joins.py.
+
+    python benchmarks/bench_joins.py --orders 10000000 --books 1000000
+
+Synthetic orders (integer user and book ids, as in orders.parquet) are
+joined to a users mapping and a books table both ways. The outputs are
+checked for equal values: user_id, cluster_id, book_id and authors, plus
+author_set_id.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from books import AuthorIndex
+from joins import attach_clusters, join_books
+
+
+def make_frames(n_orders, n_books, n_users, seed=42):
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Author {i}" for i in range(max(n_books // 3, 1))], dtype=object)
+    picks = rng.integers(0, len(names), size=(n_books, 2))
+    sizes = rng.integers(1, 3, size=n_books)
+    authors = [list(names[p[:k]]) for p, k in zip(picks, sizes)]
+    df_books = pd.DataFrame({'book_id': np.arange(n_books), 'authors': authors})
+    # roughly one user in twenty belongs to another user's cluster
+    clustered = rng.choice(n_users, size=n_users // 20, replace=False)
+    mapping = {str(u): str(rng.integers(0, n_users)) for u in clustered}
+    df_orders = pd.DataFrame({
+        # a few ids miss the catalogue to exercise the left-join fill
+        'user_id': rng.integers(0, n_users, size=n_orders),
+        'book_id': rng.integers(0, int(n_books * 1.01), size=n_orders),
+    })
+    return df_orders, df_books, mapping
+
+
+def legacy(df_orders, df_books, mapping, author_index):
+    df_orders['user_id'] = df_orders['user_id'].astype(str)
+    df_orders['cluster_id'] = df_orders['user_id'].map(mapping).fillna(df_orders['user_id'])
+    df_books = df_books.assign(book_id=df_books['book_id'].astype(str))
+    df_orders['book_id'] = df_orders['book_id'].astype(str)
+    book_authors = df_books[['book_id', 'authors']].assign(author_set_id=author_index.book_set_ids)
+    df_orders = df_orders.merge(book_authors, on='book_id', how='left')
+    df_orders['author_set_id'] = df_orders['author_set_id'].fillna(author_index.NO_SET).astype('int64')
+    return df_orders
+
+
+def indexed(df_orders, df_books, mapping, author_index):
+    df_orders = attach_clusters(df_orders, mapping)
+    return join_books(df_orders, df_books, author_index)
+
+
+def same(a, b):
+    for col in ('user_id', 'cluster_id', 'book_id'):
+        if not (a[col].astype(object).to_numpy() == b[col].astype(object).to_numpy()).all():
+            return False
+    if not (a['author_set_id'].to_numpy() == b['author_set_id'].to_numpy()).all():
+        return False
+    return all((x == y) if isinstance(x, list) else (pd.isna(x) and pd.isna(y))
+               for x, y in zip(a['authors'], b['authors']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=10000000)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--no-verify', action='store_true', help='skip the row-by-row comparison')
+    args = parser.parse_args()
+
+    df_orders, df_books, mapping = make_frames(args.orders, args.books, args.users)
+    author_index = AuthorIndex(df_books['authors'])
+
+    t0 = time.perf_counter()
+    old = legacy(df_orders.copy(), df_books, mapping, author_index)
+    legacy_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = indexed(df_orders.copy(), df_books, mapping, author_index)
+    indexed_s = time.perf_counter() - t0
+
+    old_mb = old.memory_usage(deep=True).sum() / 2**20
+    new_mb = new.memory_usage(deep=True).sum() / 2**20
+    ok = 'skipped' if args.no_verify else ('yes' if same(old, new) else 'NO')
+    print(f"{'orders':>10} {'books':>9} {'merge_s':>8} {'indexed_s':>10} {'merge_MB':>9} {'indexed_MB':>11} {'same':>7}")
+    print(f"{args.orders:>10} {args.books:>9} {legacy_s:>8.2f} {indexed_s:>10.2f} {old_mb:>9.0f} {new_mb:>11.0f} {ok:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Memory of the default vs the lean_memory pipeline, stage by stage.
+
+    python benchmarks/bench_lean_memory.py --orders 1000000 4000000
+
+Each size runs through process_dataset_folder with memory_report=True in
+a fresh child process: once with the default dtypes and once with
+--lean-memory, each with its own default batching (the default loads
+orders.parquet whole, lean streams it in LEAN_BATCH_SIZE batches) unless
+--batch-size sets both (0 loads both whole). Prints the raw input size
+(orders.parquet uncompressed), the largest the pipeline's frames grew
+(and after which stage), that peak as a multiple of the raw inputs and
+whether it is under the target, the child's peak RSS growth and wall
+time, and whether the CSV tables are identical to the default run's.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from bench_pipeline import dataset_dir
+from pipeline import LEAN_BATCH_SIZE, OUTPUT_TABLES
+
+MODES = ('default', 'lean')
+
+
+def run_mode(data_dir, out_dir, lean, batch_size):
+    """process_dataset_folder in a child process: (seconds, memory report, stage data MB)."""
+    code = (
+        "import sys, io, contextlib; sys.path.insert(0, %r)\n"
+        "from process_data import process_dataset_folder\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    process_dataset_folder(%r, %r, batch_size=%r, lean_memory=%r, memory_report=True)\n"
+    ) % (os.path.dirname(HERE), data_dir, out_dir, batch_size, lean)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code])
+    _, status, _ = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - t0
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError(f"child failed for {data_dir} (lean_memory={lean})")
+    name = os.path.basename(os.path.normpath(data_dir))
+    with open(os.path.join(out_dir, f"{name}_profile.json"), encoding='utf-8') as f:
+        profile = json.load(f)
+    stages = {stage: stats.get('data_mb') for stage, stats in profile['stages'].items()}
+    return seconds, profile['memory'], stages
+
+
+def table_hashes(out_dir, name):
+    hashes = {}
+    for table in OUTPUT_TABLES:
+        with open(os.path.join(out_dir, f"{name}_{table}.csv"), 'rb') as f:
+            hashes[table] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='stream orders.parquet in batches of this many rows in both modes (0 = load it whole)')
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    print(f"{'orders':>9} {'mode':>8} {'batch':>7} {'seconds':>8} {'input MB':>9} {'frames MB':>10} {'x input':>8} "
+          f"{'target':>7} {'after':>10} {'RSS +MB':>8} {'same csv':>9}")
+    for n in args.orders:
+        data_dir = dataset_dir(args.work_dir, n, args.users, args.books, 0.05, 42)
+        name = os.path.basename(os.path.normpath(data_dir))
+        hashes = {}
+        for mode in MODES:
+            out_dir = os.path.join(args.work_dir, f"lean_{mode}_{n}")
+            seconds, memory, stages = run_mode(data_dir, out_dir, mode == 'lean', args.batch_size)
+            hashes[mode] = table_hashes(out_dir, name)
+            same = 'yes' if hashes[mode] == hashes['default'] else 'NO'
+            batch = args.batch_size if args.batch_size is not None else (LEAN_BATCH_SIZE if mode == 'lean' else 0)
+            target = 'met' if memory['within_target'] else 'missed'
+            print(f"{n:>9} {mode:>8} {batch or 'whole':>7} {seconds:>8.2f} {memory['input_mb']:>9.1f} "
+                  f"{memory['data_peak_mb']:>10.1f} {memory['data_peak_ratio']:>8.2f} {target:>7} "
+                  f"{memory['data_peak_stage']:>10} {memory['rss_growth_mb']:>8.0f} {same:>9}")
+            print(f"{'':>26} frames after each stage (MB): "
+                  + ", ".join(f"{stage} {mb:.0f}" for stage, mb in stages.items() if mb is not None))
+
+
+if __name__ == "__main__":
+    main()
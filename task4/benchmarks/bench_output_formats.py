@@ -0,0 +1,81 @@
+"""Compare CSV and Parquet output tables: write time, read time and size.
+
+    python benchmarks/bench_output_formats.py --data-dir data/DATA1
+    python benchmarks/bench_output_formats.py --orders 1000000
+
+One dataset is processed with --output-format parquet (a synthetic one when
+--orders is given). Each typed table is then written again in both formats
+and read back, once in full and once projected to two columns. The read
+times cover what a dashboard pays; the CSV reads don't even restore the
+dtypes.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import contextlib
+import io
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from outputs import read_table, table_path, write_table
+from pipeline import OUTPUT_TABLES
+from process_data import process_dataset_folder
+
+PROJECTIONS = {
+    'orders_enriched': ['date', 'paid_price'],
+    'users_reconciled': ['user_id', 'cluster_id'],
+    'books_processed': ['authors'],
+    'daily_revenue': ['date', 'paid_price'],
+    'top5_days': ['date', 'paid_price'],
+}
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', type=str, default=None, help='DATA folder to process')
+    parser.add_argument('--orders', type=int, default=500000, help='synthetic orders when no --data-dir')
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        from synthetic import write_dataset
+        data_dir = os.path.join(args.work_dir, f"DATA_{args.orders}")
+        if not os.path.exists(os.path.join(data_dir, 'orders.parquet')):
+            write_dataset(data_dir, args.orders)
+    name = os.path.basename(os.path.normpath(data_dir))
+    typed_dir = os.path.join(args.work_dir, 'typed')
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_dataset_folder(data_dir, typed_dir, output_format='parquet')
+
+    out_dir = os.path.join(args.work_dir, 'formats')
+    print(f"{'table':<17} {'rows':>9} {'fmt':>8} {'write_s':>8} {'read_s':>7} {'proj_s':>7} {'size_KB':>9}")
+    for table in OUTPUT_TABLES:
+        df = read_table(os.path.join(typed_dir, name), table)
+        for fmt in ('csv', 'parquet'):
+            fmt_dir = os.path.join(out_dir, fmt)
+            shutil.rmtree(fmt_dir, ignore_errors=True)
+            os.makedirs(fmt_dir)
+            prefix = os.path.join(fmt_dir, name)
+            write_s, path = timed(lambda: write_table(df, prefix, table, fmt))
+            read_s, _ = timed(lambda: read_table(prefix, table))
+            proj_s, _ = timed(lambda: read_table(prefix, table, columns=PROJECTIONS[table]))
+            size_kb = os.path.getsize(table_path(prefix, table, fmt)) / 1024
+            print(f"{table:<17} {len(df):>9} {fmt:>8} {write_s:>8.3f} {read_s:>7.3f} {proj_s:>7.3f} {size_kb:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
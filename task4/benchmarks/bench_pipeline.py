@@ -0,0 +1,182 @@
+"""Scaling benchmark for the whole pipeline and for each of its stages.
+
+    python benchmarks/bench_pipeline.py --orders 100000 1000000 --save bench_results/main.json
+    python benchmarks/bench_pipeline.py --orders 100000 1000000 --baseline bench_results/main.json
+    python benchmarks/bench_pipeline.py --compare bench_results/main.json bench_results/branch.json
+
+For each size a seeded synthetic dataset is written under --work-dir (see
+synthetic.py), unless it is already there. Then:
+  * process_dataset_folder runs in a fresh child process: wall time, peak
+    RSS, and the per-stage seconds from the run's _profile.json;
+  * each stage runs on its own: a fresh Pipeline is stopped right after
+    that stage, and only that stage's seconds are kept.
+Every number is the best of --repeat runs.
+
+--save writes the results as JSON. --baseline (or --compare with two saved
+files) prints the two runs side by side and flags any number more than
+--threshold slower, for catching regressions before a deploy.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import pandas as pd
+
+from pipeline import Pipeline
+
+
+def dataset_dir(work_dir, n, n_users, n_books, dup_rate, seed):
+    """Write (once) and return the synthetic dataset for these parameters."""
+    from synthetic import write_dataset
+    data_dir = os.path.join(work_dir, f"DATA_{n}_{n_users}_{n_books}_{dup_rate}_{seed}")
+    if not os.path.exists(os.path.join(data_dir, 'orders.parquet')):
+        write_dataset(data_dir, n, n_users=n_users, n_books=n_books, seed=seed, dup_rate=dup_rate)
+    return data_dir
+
+
+def run_full(data_dir, out_dir, batch_size, output_format):
+    """process_dataset_folder in a child process: (seconds, peak RSS MB, stage seconds)."""
+    code = (
+        "import sys, io, contextlib; sys.path.insert(0, %r)\n"
+        "from process_data import process_dataset_folder\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    process_dataset_folder(%r, %r, batch_size=%r, output_format=%r)\n"
+    ) % (os.path.dirname(HERE), data_dir, out_dir, batch_size, output_format)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code])
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - t0
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError(f"process_dataset_folder failed for {data_dir}")
+    name = os.path.basename(os.path.normpath(data_dir))
+    with open(os.path.join(out_dir, f"{name}_profile.json"), encoding='utf-8') as f:
+        profile = json.load(f)
+    stages = {stage: st['seconds'] for stage, st in profile['stages'].items()}
+    # ru_maxrss is in kilobytes on Linux
+    return seconds, usage.ru_maxrss / 1024, stages
+
+
+def run_isolated(data_dir, out_dir, batch_size, output_format):
+    """{stage: seconds} with each stage timed in a pipeline that stops after it."""
+    seconds = {}
+    stage_names = [stage.name for stage in Pipeline().stages]
+    for k, name in enumerate(stage_names):
+        pipeline = Pipeline(batch_size=batch_size, output_format=output_format, log=lambda message: None)
+        run = pipeline.new_run(data_dir, out_dir)
+        pipeline.run_stages(run, pipeline.stages[:k + 1])
+        seconds[name] = run.profile.stages[name].seconds
+    return seconds
+
+
+def bench_size(args, n):
+    n_users = args.users or max(1000, n // 20)
+    n_books = args.books or max(1000, n // 200)
+    data_dir = dataset_dir(args.work_dir, n, n_users, n_books, args.dup_rate, args.seed)
+    out_dir = os.path.join(args.work_dir, 'out')
+
+    full = [run_full(data_dir, out_dir, args.batch_size, args.output_format) for _ in range(args.repeat)]
+    isolated = [run_isolated(data_dir, out_dir, args.batch_size, args.output_format) for _ in range(args.repeat)]
+    return {
+        'orders': n, 'users': n_users, 'books': n_books,
+        'full_s': min(seconds for seconds, _, _ in full),
+        'peak_mb': min(peak for _, peak, _ in full),
+        'stages': {name: min(stages[name] for _, _, stages in full) for name in full[0][2]},
+        'isolated': {name: min(run[name] for run in isolated) for name in isolated[0]},
+    }
+
+
+def metrics(result):
+    """Flat (metric, value) pairs of one size's results, in table order."""
+    yield 'full_s', result['full_s']
+    yield 'peak_mb', result['peak_mb']
+    for name, seconds in result['stages'].items():
+        yield f'stage {name}', seconds
+    for name, seconds in result['isolated'].items():
+        yield f'isolated {name}', seconds
+
+
+def print_results(results):
+    print(f"{'orders':>10} {'metric':<20} {'value':>10}")
+    for result in results['sizes']:
+        for metric, value in metrics(result):
+            print(f"{result['orders']:>10} {metric:<20} {value:>10.3f}")
+
+
+def print_comparison(base, new, threshold):
+    """Side-by-side table; returns the number of regressions."""
+    print(f"base: {base['label']}   new: {new['label']}")
+    print(f"{'orders':>10} {'metric':<20} {'base':>10} {'new':>10} {'ratio':>7}")
+    base_sizes = {r['orders']: dict(metrics(r)) for r in base['sizes']}
+    regressions = 0
+    for result in new['sizes']:
+        before = base_sizes.get(result['orders'])
+        if before is None:
+            continue
+        for metric, value in metrics(result):
+            if metric not in before:
+                continue
+            ratio = value / before[metric] if before[metric] else float('nan')
+            # sub-10ms stages are mostly noise
+            slower = ratio > 1 + threshold and value - before[metric] > 0.01
+            regressions += slower
+            print(f"{result['orders']:>10} {metric:<20} {before[metric]:>10.3f} {value:>10.3f} "
+                  f"{ratio:>6.2f}x{'  <-- slower' if slower else ''}")
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--users', type=int, default=0, help='users per dataset (default: orders / 20)')
+    parser.add_argument('--books', type=int, default=0, help='books per dataset (default: orders / 200)')
+    parser.add_argument('--dup-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=0, help='stream orders in batches (0 = whole file)')
+    parser.add_argument('--output-format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    parser.add_argument('--label', type=str, default=None, help='name of this run in comparisons')
+    parser.add_argument('--save', type=str, default=None, help='write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None, help='saved results to compare this run against')
+    parser.add_argument('--compare', type=str, nargs=2, default=None, metavar=('BASE', 'NEW'),
+                        help='only compare two saved result files')
+    parser.add_argument('--threshold', type=float, default=0.10, help='ratio above 1 + threshold counts as slower')
+    args = parser.parse_args()
+
+    if args.compare:
+        base, new = (load(path) for path in args.compare)
+        sys.exit(1 if print_comparison(base, new, args.threshold) else 0)
+
+    results = {
+        'label': args.label or time.strftime('%Y-%m-%d %H:%M'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'params': {k: getattr(args, k) for k in ('users', 'books', 'dup_rate', 'seed', 'batch_size',
+                                                 'output_format', 'repeat')},
+        'sizes': [bench_size(args, n) for n in args.orders],
+    }
+    print_results(results)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        print()
+        sys.exit(1 if print_comparison(load(args.baseline), results, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Benchmark vectorized price parsing against the per-row path.
+
+    python benchmarks/bench_prices.py --rows 3000000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_prices
+from prices import parse_price, parse_price_series
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=3000000)
+    parser.add_argument('--distinct', type=int, default=5000)
+    parser.add_argument('--eur-rate', type=float, default=1.2)
+    args = parser.parse_args()
+
+    prices = make_prices(args.rows, n_distinct=args.distinct)
+
+    t0 = time.perf_counter()
+    per_row = prices.apply(lambda v: parse_price(v, args.eur_rate))
+    per_row_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vectorized = parse_price_series(prices, args.eur_rate)
+    vectorized_s = time.perf_counter() - t0
+
+    same = np.allclose(per_row.to_numpy(dtype=float), vectorized.to_numpy(), equal_nan=True)
+    print(f"rows:          {args.rows:,}")
+    print(f"per-row apply: {per_row_s:.2f}s")
+    print(f"vectorized:    {vectorized_s:.2f}s ({per_row_s / vectorized_s:.1f}x)")
+    print(f"same results:  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark the blocking-key user reconciliation against synthetic users.
+
+    python benchmarks/bench_reconcile.py --sizes 10000 100000 1000000
+
+Sizes up to --verify-upto are also run through the pairwise scan and the
+two results are checked for identical cluster ids.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_users
+from user_reconciliation import reconcile_users
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dup-rate', type=float, default=0.05)
+    parser.add_argument('--verify-upto', type=int, default=3000,
+                        help='also run the O(n^2) scan for sizes up to this many users')
+    args = parser.parse_args()
+
+    print(f"{'users':>10} {'clusters':>10} {'indexed_s':>10} {'pairwise_s':>11} {'same':>5}")
+    for n in args.sizes:
+        df_users = make_users(n, dup_rate=args.dup_rate)
+        t0 = time.perf_counter()
+        _, mapping, clusters = reconcile_users(df_users)
+        indexed_s = time.perf_counter() - t0
+
+        pairwise_s, same = '-', '-'
+        if n <= args.verify_upto:
+            t0 = time.perf_counter()
+            _, mapping_ref, clusters_ref = reconcile_users(df_users, indexed=False)
+            pairwise_s = f"{time.perf_counter() - t0:.2f}"
+            same = 'yes' if mapping == mapping_ref and clusters == clusters_ref else 'NO'
+        print(f"{n:>10} {len(clusters):>10} {indexed_s:>10.2f} {pairwise_s:>11} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
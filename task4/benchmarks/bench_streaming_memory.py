@@ -0,0 +1,71 @@
+"""Peak memory of whole-file vs streamed orders processing.
+
+    python benchmarks/bench_streaming_memory.py --orders 250000 1000000 4000000
+
+For each size a synthetic dataset is written to --work-dir. Then
+process_dataset_folder runs on it in a fresh child process, once loading
+orders.parquet whole and once with --batch-size. The child's peak RSS is
+reported. The streamed peak should stay roughly flat as the order count
+grows, while the whole-file peak grows with it.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+
+def run_child(data_dir, out_dir, batch_size):
+    """Process one dataset in a child process; returns (seconds, peak RSS in MB)."""
+    code = (
+        "import sys, io, contextlib; sys.path.insert(0, %r)\n"
+        "from process_data import process_dataset_folder\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    process_dataset_folder(%r, %r, batch_size=%r)\n"
+    ) % (os.path.dirname(HERE), data_dir, out_dir, batch_size)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code])
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - t0
+    if proc.returncode:
+        raise RuntimeError(f"child failed for {data_dir} (batch_size={batch_size})")
+    # ru_maxrss is in kilobytes on Linux
+    return seconds, usage.ru_maxrss / 1024
+
+
+def main():
+    from synthetic import write_dataset
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[250000, 1000000, 4000000])
+    parser.add_argument('--batch-size', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    print(f"{'orders':>10} {'whole_s':>8} {'whole_MB':>9} {'stream_s':>9} {'stream_MB':>10} {'same':>5}")
+    for n in args.orders:
+        data_dir = os.path.join(args.work_dir, f"DATA_{n}")
+        if not os.path.exists(os.path.join(data_dir, 'orders.parquet')):
+            write_dataset(data_dir, n, n_users=args.users)
+        whole_out = os.path.join(args.work_dir, 'out_whole')
+        stream_out = os.path.join(args.work_dir, 'out_stream')
+        whole_s, whole_mb = run_child(data_dir, whole_out, None)
+        stream_s, stream_mb = run_child(data_dir, stream_out, args.batch_size)
+
+        name = os.path.basename(data_dir)
+        same = all(
+            open(os.path.join(whole_out, name + suffix), 'rb').read()
+            == open(os.path.join(stream_out, name + suffix), 'rb').read()
+            for suffix in ('_daily_revenue.csv', '_top5_days.csv')
+        )
+        print(f"{n:>10} {whole_s:>8.1f} {whole_mb:>9.0f} {stream_s:>9.1f} {stream_mb:>10.0f} {'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark layout-grouped timestamp parsing against the per-row path.
+
+    python benchmarks/bench_timestamps.py --rows 500000
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import make_timestamps
+from timestamps import TimestampParser, parse_timestamp_series_slow
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    raw = make_timestamps(args.rows)
+
+    t0 = time.perf_counter()
+    slow = parse_timestamp_series_slow(raw)
+    slow_s = time.perf_counter() - t0
+
+    ts_parser = TimestampParser()
+    t0 = time.perf_counter()
+    fast = ts_parser.parse(raw)
+    fast_s = time.perf_counter() - t0
+
+    same = slow.isna().equals(fast.isna()) and (slow.dropna() == fast.dropna()).all()
+    print(f"rows:            {args.rows:,}")
+    print(f"per-row path:    {slow_s:.2f}s")
+    print(f"layout-grouped:  {fast_s:.2f}s ({slow_s / fast_s:.1f}x)")
+    print(f"same results:    {'yes' if same else 'NO'}")
+    print()
+    print(f"{'format':<28} {'rows':>9} {'seconds':>8}")
+    for fmt, st in ts_parser.pop_stats().items():
+        print(f"{fmt:<28} {st['rows']:>9} {st['seconds']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Exact top-k vs a full sort, and Space-Saving accuracy vs counter budget.
+
+    python benchmarks/bench_topk.py --groups 1000000 --stream 5000000
+
+Part one: the top --k of --groups grouped sums (think revenue per book per
+day), through sort_values().head(), through topk.top_k, and as a merge of
+per-partition TopKs. All three must agree.
+
+Part two: a Zipf-distributed weighted stream (books sold, say) fed in
+batches to SpaceSaving sketches of several sizes. For each it reports how
+many of the true top --k it finds, the largest error bound, and whether
+every true total lies inside its reported [count - error, count].
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from topk import SpaceSaving, TopK, top_k
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def bench_exact(n_groups, k, partitions, rng):
+    sums = pd.Series(rng.integers(0, 10 ** 7, n_groups), index=np.arange(n_groups)) / 100
+    sort_s, expected = timed(lambda: list(sums.sort_values(ascending=False, kind='stable').head(k).items()))
+    heap_s, heap = timed(lambda: top_k(sums, k))
+
+    def merged():
+        result = TopK(k)
+        for part in np.array_split(np.arange(n_groups), partitions):
+            result.merge(TopK.from_series(sums.iloc[part], k))
+        return result.items()
+    merge_s, merge = timed(merged)
+    print(f"{'groups':>10} {'k':>4} {'sort_s':>8} {'heap_s':>8} {'merge_s':>8} {'same':>5}")
+    print(f"{n_groups:>10} {k:>4} {sort_s:>8.3f} {heap_s:>8.3f} {merge_s:>8.3f} "
+          f"{'yes' if expected == heap == merge else 'NO':>5}")
+
+
+def bench_sketch(n_stream, n_keys, k, capacities, batch, rng):
+    keys = rng.zipf(1.2, n_stream) % n_keys
+    weights = rng.integers(1, 5, n_stream)
+    truth = pd.Series(weights).groupby(keys).sum()
+    true_top = set(truth.nlargest(k).index.tolist())
+    print(f"\n{'stream':>10} {'keys':>8} {'capacity':>9} {'seconds':>8} {f'top{k}_found':>10} {'max_error':>10} {'bounds_ok':>10}")
+    for capacity in capacities:
+        sketch = SpaceSaving(capacity)
+        t0 = time.perf_counter()
+        for start in range(0, n_stream, batch):
+            sketch.update_many(keys[start:start + batch], weights[start:start + batch])
+        seconds = time.perf_counter() - t0
+        top = sketch.top(k)
+        found = len(true_top & {key for key, _, _ in top})
+        bounds_ok = all(count - error <= truth[key] <= count for key, count, error in sketch.top(capacity))
+        print(f"{n_stream:>10} {truth.size:>8} {capacity:>9} {seconds:>8.2f} {found:>10} "
+              f"{max(error for _, _, error in top):>10} {'yes' if bounds_ok else 'NO':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=1000000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--partitions', type=int, default=16)
+    parser.add_argument('--stream', type=int, default=5000000)
+    parser.add_argument('--keys', type=int, default=1000000)
+    parser.add_argument('--capacities', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--batch-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    bench_exact(args.groups, args.k, args.partitions, rng)
+    bench_sketch(args.stream, args.keys, args.k, args.capacities, args.batch_size, rng)
+
+
+if __name__ == "__main__":
+    main()
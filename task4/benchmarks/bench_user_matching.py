@@ -0,0 +1,79 @@
+"""Exact vs fuzzy user matching on synthetic users with messy duplicates.
+
+    python benchmarks/bench_user_matching.py --sizes 10000 100000 1000000
+
+Users come from synthetic.make_users(messy=True): duplicates retype their
+phone, name, address and email in other formats, and housemates share an
+address and phone without being the same customer. Each size is
+reconciled with the exact rule and with user_matching.FuzzyMatcher under
+each --blocking, and scored against the true customers by pairs: a pair of
+rows put in one cluster is a true positive when both rows are the same
+customer. Prints users/s, candidate pairs scored, clusters, precision and
+recall.
+"""
+import os
+import sys
+import time
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import numpy as np
+import pandas as pd
+
+from synthetic import make_users
+from user_matching import BLOCKINGS, FuzzyMatcher, canonical_users
+from user_reconciliation import normalize_match_fields, prepare_users, reconcile_users
+
+
+def same_group_pairs(*labels):
+    """Row pairs sharing every one of the label arrays."""
+    sizes = pd.DataFrame({i: label for i, label in enumerate(labels)}).value_counts().to_numpy(dtype=np.int64)
+    return int((sizes * (sizes - 1) // 2).sum())
+
+
+def evaluate(clusters, truth):
+    predicted = same_group_pairs(clusters)
+    actual = same_group_pairs(truth)
+    correct = same_group_pairs(clusters, truth)
+    precision = correct / predicted if predicted else 1.0
+    recall = correct / actual if actual else 1.0
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dup-rate', type=float, default=0.05)
+    parser.add_argument('--blocking', choices=BLOCKINGS, nargs='+', default=list(BLOCKINGS))
+    parser.add_argument('--threshold', type=float, default=0.8, help='name / address token Jaccard threshold')
+    parser.add_argument('--min-fields', type=int, default=3)
+    parser.add_argument('--window', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'users':>9} {'method':>13} {'seconds':>8} {'users/s':>9} {'candidates':>11} {'clusters':>9} "
+          f"{'precision':>9} {'recall':>7}")
+    for n in args.sizes:
+        users, truth = make_users(n, dup_rate=args.dup_rate, messy=True, with_truth=True)
+        methods = [('exact', None)] + [
+            (f'fuzzy-{blocking}', FuzzyMatcher(args.min_fields, args.threshold, args.threshold, blocking,
+                                               args.window))
+            for blocking in args.blocking]
+        for label, matcher in methods:
+            t0 = time.perf_counter()
+            df, _, clusters = reconcile_users(users, matcher=matcher)
+            seconds = time.perf_counter() - t0
+            if matcher is None:
+                candidates = '-'
+            else:
+                norm = normalize_match_fields(prepare_users(users))
+                candidates = len(matcher.candidates(canonical_users(norm)))
+            precision, recall = evaluate(df['cluster_id'].to_numpy(), truth)
+            print(f"{n:>9} {label:>13} {seconds:>8.2f} {n / seconds:>9.0f} {candidates:>11} {len(clusters):>9} "
+                  f"{precision:>9.4f} {recall:>7.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Incremental reconciliation through user_store vs rebuilding every cluster.
+
+    python benchmarks/bench_user_store.py --users 1000000 --delta 10000 --changed 1000
+
+Builds a store from --users synthetic users, then applies one day's delta:
+--delta users that weren't there before (some re-registering existing
+customers) plus --changed existing users with a new email. The delta is
+applied twice, as the full users table (store.reconcile) and as only the
+delta rows (store.update), and both are checked against reconcile_users
+on the full table: the clusters must be the same.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import pandas as pd
+
+from synthetic import make_users
+from user_reconciliation import reconcile_users
+from user_store import UserClusterStore
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def same_clusters(a, b):
+    """True if the two user_id -> cluster_id mappings group users the same way."""
+    df = pd.DataFrame({'a': pd.Series(a), 'b': pd.Series(b)})
+    return (df['a'].notna().all() and df['b'].notna().all()
+            and (df.groupby('a')['b'].nunique() == 1).all() and (df.groupby('b')['a'].nunique() == 1).all())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--delta', type=int, default=10000, help='new users in the delta')
+    parser.add_argument('--changed', type=int, default=1000, help='existing users whose email changes')
+    parser.add_argument('--dup-rate', type=float, default=0.05)
+    parser.add_argument('--work-dir', type=str, default='./bench_data')
+    args = parser.parse_args()
+
+    users = make_users(args.users + args.delta, dup_rate=args.dup_rate)
+    base, new = users.iloc[:args.users], users.iloc[args.users:]
+    changed = base.sample(args.changed, random_state=1)
+    changed = changed.assign(email='new.' + changed['email'])
+    delta = pd.concat([new, changed], ignore_index=True)
+    today = pd.concat([base.drop(index=changed.index), delta], ignore_index=True)
+
+    store_dir = os.path.join(args.work_dir, 'user_store')
+    shutil.rmtree(store_dir, ignore_errors=True)
+    bootstrap = {}
+    for mode in ('full', 'delta'):
+        path = os.path.join(store_dir, f'{mode}.sqlite')
+        bootstrap[mode], _ = timed(lambda: UserClusterStore(path).reconcile(base))
+    size = os.path.getsize(os.path.join(store_dir, 'full.sqlite')) / 2 ** 20
+
+    rebuild_s, (_, expected, _) = timed(lambda: reconcile_users(today))
+    full_store = UserClusterStore(os.path.join(store_dir, 'full.sqlite'))
+    full_s, (_, mapping, _) = timed(lambda: full_store.reconcile(today))
+    delta_store = UserClusterStore(os.path.join(store_dir, 'delta.sqlite'))
+    delta_s, reassigned = timed(lambda: delta_store.update(delta))
+    # the delta store's view of everyone, read back without changing anything
+    _, delta_mapping, _ = delta_store.reconcile(today)
+
+    print(f"store bootstrap ({args.users} users): {bootstrap['full']:.2f}s, {size:.1f} MB")
+    print(f"delta: {args.delta} new + {args.changed} changed users; {full_store.stats['relinked']} relinked, "
+          f"{len(reassigned)} cluster ids new or reassigned")
+    print(f"\n{'method':<28} {'seconds':>8} {'same_clusters':>14}")
+    print(f"{'reconcile_users (rebuild)':<28} {rebuild_s:>8.2f} {'-':>14}")
+    print(f"{'store.reconcile (full csv)':<28} {full_s:>8.2f} {'yes' if same_clusters(mapping, expected) else 'NO':>14}")
+    print(f"{'store.update (delta only)':<28} {delta_s:>8.2f} "
+          f"{'yes' if same_clusters(delta_mapping, expected) else 'NO':>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Check the columnar aggregations against the row-by-row loops they replaced.
+
+    python benchmarks/check_aggregations.py --data-root ./data
+
+Orders from every DATA* folder are joined to their books and users, then
+author sales, author-set sales and cluster spending are computed both ways
+and compared exactly, ties and order included; author sales also through
+OrderTotals fed in three batches. Each dataset is checked a
+second time with every book's author list reversed, so list order and
+sorted author-set order disagree.
+"""
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregations import OrderTotals, quantity_by_author, quantity_by_author_set, spending_by_cluster
+from books import AuthorIndex, read_yaml_list
+from pipeline import extract_authors_from_book
+from prices import parse_price_series
+from user_reconciliation import reconcile_users
+
+
+def loop_author_sales(df_orders):
+    author_sales = defaultdict(int)
+    for _, order in df_orders.iterrows():
+        authors = order.get('authors', [])
+        quantity = order.get('quantity', 1)
+        if isinstance(authors, list) and authors:
+            for author in authors:
+                if author and author != 'Unknown Author':
+                    author_sales[author] += quantity
+    return author_sales
+
+
+def loop_author_set_sales(df_orders):
+    author_set_sales = defaultdict(int)
+    for _, row in df_orders.iterrows():
+        quantity = int(row.get('quantity', 0) or 0)
+        author_set = row.get('author_set', ())
+        if author_set:
+            author_set_sales[author_set] += quantity
+    return author_set_sales
+
+
+def loop_cluster_spending(df_orders):
+    cluster_spending = defaultdict(float)
+    for _, order in df_orders.iterrows():
+        cluster_id = order.get('cluster_id')
+        paid_price = order.get('paid_price', 0.0)
+        if cluster_id and pd.notna(paid_price):
+            cluster_spending[cluster_id] += paid_price
+    return cluster_spending
+
+
+def load_orders(data_dir, reverse_authors=False):
+    books = read_yaml_list(os.path.join(data_dir, 'books.yaml'))
+    df_books = pd.DataFrame([{'book_id': str(b.get('id')),
+                              'authors': extract_authors_from_book(b)} for b in books])
+    if reverse_authors:
+        df_books['authors'] = [a[::-1] for a in df_books['authors']]
+    author_index = AuthorIndex(df_books['authors'])
+    df_books['author_set_id'] = author_index.book_set_ids
+    df_orders = pd.read_parquet(os.path.join(data_dir, 'orders.parquet'))
+    df_orders['book_id'] = df_orders['book_id'].astype(str)
+    df_orders['user_id'] = df_orders['user_id'].astype(str)
+    df_orders['paid_price'] = (df_orders['quantity'] * parse_price_series(df_orders['unit_price'])).round(2)
+    _, mapping, _ = reconcile_users(pd.read_csv(os.path.join(data_dir, 'users.csv'), dtype=str))
+    df_orders['cluster_id'] = df_orders['user_id'].map(mapping).fillna(df_orders['user_id'])
+    df_orders = df_orders.merge(df_books, on='book_id', how='left')
+    df_orders['author_set_id'] = df_orders['author_set_id'].fillna(AuthorIndex.NO_SET).astype('int64')
+    df_orders['author_set'] = df_orders['authors'].apply(lambda a: tuple(sorted(a)) if isinstance(a, list) and a else ())
+    return df_orders, author_index
+
+
+def totals_in_batches(df_orders, author_index, n_batches):
+    totals = OrderTotals(author_index.author_sets)
+    step = -(-len(df_orders) // n_batches)
+    for start in range(0, len(df_orders), step):
+        totals.update(df_orders.iloc[start:start + step].assign(date=None))
+    return totals
+
+
+def check_dataset(label, df_orders, author_index):
+    checks = [
+        ('author sales', loop_author_sales, quantity_by_author),
+        ('author-set sales', loop_author_set_sales,
+         lambda df: quantity_by_author_set(df, author_index.author_sets)),
+        ('cluster spending', loop_cluster_spending, spending_by_cluster),
+        ('author sales/3', loop_author_sales, lambda df: totals_in_batches(df, author_index, 3).author_quantity()),
+    ]
+    ok = True
+    for name, loop_fn, columnar_fn in checks:
+        t0 = time.perf_counter()
+        expected = list(loop_fn(df_orders).items())
+        loop_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        actual = list(columnar_fn(df_orders).items())
+        columnar_s = time.perf_counter() - t0
+        same = expected == actual
+        ok &= same
+        print(f"{label:<9} {name:<17} groups={len(actual):<6} loop={loop_s:.3f}s "
+              f"columnar={columnar_s:.3f}s {'OK' if same else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-root', type=str, default='./data')
+    args = parser.parse_args()
+
+    failed = False
+    for entry in sorted(os.listdir(args.data_root)):
+        data_dir = os.path.join(args.data_root, entry)
+        if not (os.path.isdir(data_dir) and entry.upper().startswith('DATA')):
+            continue
+        for reverse_authors in (False, True):
+            df_orders, author_index = load_orders(data_dir, reverse_authors)
+            label = entry + (' rev' if reverse_authors else '')
+            failed |= not check_dataset(label, df_orders, author_index)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Check both front ends against the golden outputs in benchmarks/golden/.
+
+    python benchmarks/check_golden.py --data-root ./data
+    python benchmarks/check_golden.py --update      # after an intended change
+
+Every DATA* folder is run through process_data.process_dataset_folder
+(whole-file CSV, streamed CSV, Parquet, the polars engine and lean memory
+mode) and through the dashboard's VerifiedDataProcessor. Their summaries
+must equal the golden ones (paths, parse cache and timestamp stats left
+out) and the CSV tables must hash to the golden sha256s. Streamed runs add up total_revenue batch by batch and
+the polars engine sums it in polars, so that one value is compared to
+within float rounding.
+"""
+import os
+import sys
+import json
+import math
+import shutil
+import hashlib
+import argparse
+import tempfile
+import contextlib
+import io
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from pipeline import OUTPUT_TABLES
+from process_data import process_dataset_folder
+
+GOLDEN_DIR = os.path.join(HERE, 'golden')
+VOLATILE_KEYS = ('parse_cache', 'timestamp_formats')
+# where the tables went and in which format differ by mode, not by result
+OUTPUT_KEYS = ('output_format',)
+CLI_MODES = {
+    'csv': {},
+    'csv streamed': {'batch_size': 999},
+    'parquet': {'output_format': 'parquet'},
+    'csv polars': {'engine': 'polars'},
+    'csv lean': {'lean_memory': True},
+}
+
+
+def stable(summary):
+    return {k: v for k, v in summary.items()
+            if k not in VOLATILE_KEYS + OUTPUT_KEYS and not k.endswith('_path')}
+
+
+def table_hashes(out_dir, name):
+    hashes = {}
+    for table in OUTPUT_TABLES:
+        with open(os.path.join(out_dir, f"{name}_{table}.csv"), 'rb') as f:
+            hashes[table] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def run_dataset(data_dir, work_dir):
+    """{mode: (stable summary, csv table hashes or None)} for one DATA folder."""
+    from bookstore_analytics import VerifiedDataProcessor
+
+    name = os.path.basename(os.path.normpath(data_dir))
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for mode, kwargs in CLI_MODES.items():
+            out_dir = os.path.join(work_dir, mode.replace(' ', '_'))
+            summary = process_dataset_folder(data_dir, out_dir, **kwargs)
+            hashes = table_hashes(out_dir, name) if kwargs.get('output_format', 'csv') == 'csv' else None
+            results[mode] = (stable(summary), hashes)
+        summary = VerifiedDataProcessor().process_dataset_folder(data_dir, os.path.join(work_dir, 'dashboard'))
+        results['dashboard'] = (stable(summary), None)
+    return results
+
+
+def same_summary(expected, actual, mode):
+    if mode.endswith(('streamed', 'polars')):
+        expected, actual = dict(expected), dict(actual)
+        if not math.isclose(expected.pop('total_revenue'), actual.pop('total_revenue'), rel_tol=1e-12):
+            return False
+    return expected == actual
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-root', type=str, default='./data')
+    parser.add_argument('--update', action='store_true', help='rewrite the golden files from this run')
+    args = parser.parse_args()
+
+    datasets = [os.path.join(args.data_root, e) for e in sorted(os.listdir(args.data_root))
+                if os.path.isdir(os.path.join(args.data_root, e)) and e.upper().startswith('DATA')]
+    work_dir = tempfile.mkdtemp(prefix='golden_')
+    failed = False
+    try:
+        for data_dir in datasets:
+            name = os.path.basename(data_dir)
+            results = run_dataset(data_dir, os.path.join(work_dir, name))
+            golden_path = os.path.join(GOLDEN_DIR, f"{name}.json")
+            if args.update:
+                os.makedirs(GOLDEN_DIR, exist_ok=True)
+                golden = {'cli': results['csv'][0], 'dashboard': results['dashboard'][0],
+                          'tables': results['csv'][1]}
+                with open(golden_path, 'w', encoding='utf-8') as f:
+                    json.dump(golden, f, indent=2, ensure_ascii=False)
+                print(f"{name}: golden outputs written")
+                continue
+
+            with open(golden_path, encoding='utf-8') as f:
+                golden = json.load(f)
+            for mode, (summary, hashes) in results.items():
+                expected = golden['dashboard' if mode == 'dashboard' else 'cli']
+                problems = []
+                if not same_summary(expected, summary, mode):
+                    problems.append('summary')
+                if hashes is not None:
+                    problems += [t for t in OUTPUT_TABLES if hashes[t] != golden['tables'][t]]
+                failed |= bool(problems)
+                print(f"{name:<6} {mode:<13} {'OK' if not problems else 'MISMATCH: ' + ', '.join(problems)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Check that the CLI and the dashboard keep each other's incremental state.
+
+    python benchmarks/check_incremental.py --data-root ./data
+
+Runs process_data.py's run_datasets into a fresh output folder, then the
+dashboard's background job (refresh_dataset_job) for every dataset it
+reports stale, then both again. After that nothing may be stale for
+either front end: the CLI reuses every dataset, the dashboard's
+stale_datasets() is empty, and the CLI summaries still list their tables.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+import io
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from process_data import run_datasets
+
+
+def cli_run(datasets, out_dir):
+    """{data_dir: reused} for an incremental CLI run."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {d: reused for d, _, _, reused in run_datasets(datasets, out_dir, incremental=True)}
+
+
+def dashboard_run(processor):
+    """Datasets the dashboard found stale, after reprocessing them as its jobs do."""
+    from bookstore_analytics import refresh_dataset_job
+
+    stale = processor.stale_datasets()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for d in stale:
+            refresh_dataset_job(d, processor.output_dir, lambda step, fraction: None)
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-root', type=str, default='./data')
+    args = parser.parse_args()
+
+    from bookstore_analytics import DASHBOARD_DIR, VerifiedDataProcessor
+
+    data_root = os.path.abspath(args.data_root)
+    work_dir = tempfile.mkdtemp(prefix='incremental_')
+    out_dir = os.path.join(work_dir, 'output')
+    processor = VerifiedDataProcessor(output_dir=os.path.join(out_dir, os.path.basename(DASHBOARD_DIR)),
+                                      data_root=data_root)
+    datasets = processor.list_datasets()
+    failed = False
+    try:
+        first = cli_run(datasets, out_dir)
+        dashboard_run(processor)
+        second = cli_run(datasets, out_dir)
+        stale = dashboard_run(processor)
+        checks = {
+            'cli first run processes all': not any(first.values()),
+            'cli reuses all after dashboard': all(second.values()) and len(second) == len(datasets),
+            'dashboard reuses all after cli': not stale,
+        }
+        for d in datasets:
+            name = os.path.basename(d)
+            with open(os.path.join(out_dir, f"{name}_summary.json"), encoding='utf-8') as f:
+                summary = json.load(f)
+            checks[f'{name} cli summary keeps its tables'] = 'orders_enriched_path' in summary
+        for label, ok in checks.items():
+            failed |= not ok
+            print(f"{label:<40} {'OK' if ok else 'FAIL'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
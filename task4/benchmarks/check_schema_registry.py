@@ -0,0 +1,97 @@
+"""Check that column roles found by value sampling give the same outputs as
+the names pick_col knows.
+
+    python benchmarks/check_schema_registry.py --data-root ./data
+
+Every DATA* folder is copied with its orders columns renamed to names no
+candidate list matches (user_id -> buyer, book_id -> item_ref, ...) and
+both copies are run through process_data.process_dataset_folder. The
+renamed feed must resolve every role by its values and produce the same
+summary and CSV tables; a second run of it must take its roles from the
+schema registry.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+import io
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from books import CACHE_SUBDIR
+from check_golden import stable, table_hashes
+from process_data import process_dataset_folder
+from schema_registry import registry_path
+
+VENDOR_NAMES = {'user_id': 'buyer', 'book_id': 'item_ref', 'quantity': 'n', 'unit_price': 'cost',
+                'timestamp': 'placed'}
+
+
+def vendor_copy(data_dir, work_dir):
+    """data_dir under work_dir with the orders columns renamed."""
+    name = os.path.basename(os.path.normpath(data_dir))
+    copy_dir = os.path.join(work_dir, 'vendor', name)
+    os.makedirs(copy_dir)
+    for fn in ('users.csv', 'books.yaml'):
+        shutil.copy(os.path.join(data_dir, fn), copy_dir)
+    df_orders = pd.read_parquet(os.path.join(data_dir, 'orders.parquet'))
+    df_orders.rename(columns=VENDOR_NAMES).to_parquet(os.path.join(copy_dir, 'orders.parquet'))
+    return copy_dir
+
+
+def run(data_dir, out_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = process_dataset_folder(data_dir, out_dir)
+    name = os.path.basename(os.path.normpath(data_dir))
+    return stable(summary), table_hashes(out_dir, name)
+
+
+def sampled_orders_entries(out_dir):
+    with open(registry_path(os.path.join(out_dir, CACHE_SUBDIR)), encoding='utf-8') as f:
+        schemas = json.load(f)['schemas']
+    return [record for record in schemas.values()
+            if record['kind'] == 'orders' and 'sampled' in record['sources'].values()]
+
+
+def check_dataset(data_dir, work_dir):
+    name = os.path.basename(os.path.normpath(data_dir))
+    expected = run(data_dir, os.path.join(work_dir, 'named'))
+    copy_dir = vendor_copy(data_dir, work_dir)
+    out_dir = os.path.join(work_dir, 'vendor_out')
+    ok = True
+    for attempt in ('sampled', 'registry'):
+        actual = run(copy_dir, out_dir)
+        same = actual == expected
+        ok &= same
+        print(f"{name:<6} {attempt:<9} {'OK' if same else 'MISMATCH'}")
+    entries = sampled_orders_entries(out_dir)
+    resolved = len(entries) == 1 and entries[0]['roles'] == {
+        'user_id': 'buyer', 'quantity': 'n', 'unit_price': 'cost', 'timestamp_raw': 'placed', 'book_id': 'item_ref'}
+    print(f"{name:<6} {'roles':<9} {'OK' if resolved else 'MISMATCH'}")
+    return ok and resolved
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-root', type=str, default='./data')
+    args = parser.parse_args()
+
+    failed = False
+    for entry in sorted(os.listdir(args.data_root)):
+        data_dir = os.path.join(args.data_root, entry)
+        if not (os.path.isdir(data_dir) and entry.upper().startswith('DATA')):
+            continue
+        with tempfile.TemporaryDirectory() as work_dir:
+            failed |= not check_dataset(data_dir, work_dir)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
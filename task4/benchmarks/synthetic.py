@@ -0,0 +1,220 @@
+"""Synthetic bookstore data for the benchmark scripts.
+
+    python benchmarks/synthetic.py --orders 1000000 --users 50000 --books 5000 --out bench_data/DATA_1M
+
+The same seed always gives the same files: users.csv with duplicate
+registrations (dup_rate), orders.parquet with messy price strings and
+mixed timestamp layouts, and a Ruby-style books.yaml.
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+FIRST_NAMES = ['Hoyt', 'Marco', 'Denny', 'Zackary', 'Carolyne', 'Travis', 'Yong', 'Heath',
+               'Gino', 'Haydee', 'Vannessa', 'Asa', 'Jeffrey', 'Benjamin', 'Era', 'Lonnie']
+LAST_NAMES = ['Carter', 'Kulas', 'Goyette', 'Heller', 'West', 'Moore', 'Wyman', 'Stiedemann',
+              'Welch', 'Larson', 'Price', 'Rogahn', 'Cassin', 'Mills', 'Hodkiewicz', 'Hilpert']
+STREETS = ['Ashlyn Wells', 'Bechtelar Ferry', 'Mohr Rapids', 'Bogan Valley', 'Arnoldo Keys',
+           'Volkman Gateway']
+DOMAINS = ['harber.example', 'murray-cronin.test', 'wuckert.test', 'hessel.test']
+
+
+def make_users(n, dup_rate=0.05, seed=42, messy=False, with_truth=False):
+    """users.csv-shaped frame where roughly dup_rate of the rows re-register an
+    earlier user with one of name/email/phone/address changed or blanked.
+
+    messy=True also writes the duplicates' untouched fields in other
+    formats (see messy_fields) and gives some users a housemate: a new
+    user at the same address with the same phone, the near-miss a fuzzy
+    matcher must not merge. with_truth=True returns (users, entity), entity
+    being the real customer behind each row.
+    """
+    rng = np.random.default_rng(seed)
+    n_base = max(1, int(round(n * (1 - dup_rate))))
+    first = rng.choice(FIRST_NAMES, n_base)
+    last = rng.choice(LAST_NAMES, n_base)
+    serial = np.arange(n_base)
+    names = pd.Series(first).str.cat(pd.Series(last), sep=' ').str.cat(
+        pd.Series(serial).astype(str), sep=' ')
+    emails = pd.Series(serial).astype(str).radd('user').str.cat(
+        pd.Series(rng.choice(DOMAINS, n_base)), sep='@')
+    phones = pd.Series(rng.integers(2000000000, 9999999999, n_base)).astype(str)
+    phones = '(' + phones.str[:3] + ') ' + phones.str[3:6] + '-' + phones.str[6:]
+    addresses = ('Apt. ' + pd.Series(rng.integers(1, 999, n_base)).astype(str) + ' '
+                 + pd.Series(serial).astype(str) + ' '
+                 + pd.Series(rng.choice(STREETS, n_base)))
+    base = pd.DataFrame({'name': names, 'address': addresses, 'phone': phones, 'email': emails})
+    if messy:
+        # housemates: every 20th user shares the address and phone of the next one
+        home = np.arange(0, n_base - 1, 20)
+        base.loc[home, ['address', 'phone']] = base.loc[home + 1, ['address', 'phone']].to_numpy()
+
+    n_dup = n - n_base
+    source = rng.integers(0, n_base, n_dup)
+    dup = base.iloc[source].reset_index(drop=True)
+    changed = rng.integers(0, 4, n_dup)
+    for k, col in enumerate(['name', 'address', 'phone', 'email']):
+        rows = np.flatnonzero(changed == k)
+        dup.loc[rows, col] = np.where(rng.random(len(rows)) < 0.5, '', 'changed ' + dup.loc[rows, col])
+
+    if messy:
+        dup = messy_fields(dup, np.random.default_rng(seed + 1))
+
+    users = pd.concat([base, dup], ignore_index=True)
+    order = rng.permutation(len(users))
+    users = users.iloc[order].reset_index(drop=True)
+    users.insert(0, 'id', (40000 + np.arange(len(users))).astype(str))
+    if with_truth:
+        return users, np.concatenate([serial, source])[order]
+    return users
+
+
+PHONE_FORMATS = ['({a}) {b}-{c}', '{a}-{b}-{c}', '{a}.{b}.{c}', '+1 {a} {b} {c}', '{a}{b}{c}', '1-{a}-{b}-{c}']
+
+
+def messy_fields(users, rng):
+    """users with each non-empty field rewritten, with probability one
+    half, the way people retype it: another phone layout, a title before
+    the name, 'Apt.' spelled out or dropped to '#', email case or a
+    '+tag'. None of it changes who the user is."""
+    users = users.copy()
+    n = len(users)
+
+    def pick(col):
+        return np.flatnonzero((users[col] != '').to_numpy() & ~users[col].str.startswith('changed').to_numpy()
+                              & (rng.random(n) < 0.5))
+
+    rows = pick('phone')
+    digits = users.loc[rows, 'phone'].str.replace(r'\D', '', regex=True)
+    layouts = rng.choice(PHONE_FORMATS, len(rows))
+    users.loc[rows, 'phone'] = [f.format(a=d[:3], b=d[3:6], c=d[6:]) for f, d in zip(layouts, digits)]
+
+    rows = pick('name')
+    titles = rng.choice(['Dr. ', 'Mr. ', 'Ms. ', ''], len(rows))
+    names = users.loc[rows, 'name']
+    users.loc[rows, 'name'] = np.where(rng.random(len(rows)) < 0.5, titles + names, names.str.upper())
+
+    rows = pick('address')
+    spelled = rng.choice(['apt ', 'Apartment ', 'APT ', 'Unit '], len(rows))
+    users.loc[rows, 'address'] = spelled + users.loc[rows, 'address'].str.replace('Apt. ', '', regex=False)
+
+    rows = pick('email')
+    emails = users.loc[rows, 'email']
+    tagged = emails.str.replace('@', '+books@', regex=False)
+    users.loc[rows, 'email'] = np.where(rng.random(len(rows)) < 0.5, emails.str.upper(), tagged)
+    return users
+
+
+PRICE_TEMPLATES = ['${p}', '$ {p}', '{p}$', '{p} $', 'USD {p}', 'USD{p}', '{p} USD', '{p}USD',
+                   '€{p}', '€ {p}', '{p}€', '{p} €', 'EUR {p}', 'EUR{p}', '{p} EUR', '{p}EUR',
+                   '${d}¢{c}', '€{d}¢{c}', '{d}$ {c}¢', '{d}€{c}¢', '{d}.', '{d},{c}']
+
+
+def make_prices(n, n_distinct=5000, seed=42):
+    """unit_price-shaped strings: n_distinct messy formats repeated over n rows."""
+    rng = np.random.default_rng(seed)
+    dollars = rng.integers(5, 100, n_distinct)
+    cents = rng.choice([0, 25, 50, 75, 99], n_distinct)
+    templates = rng.choice(PRICE_TEMPLATES, n_distinct)
+    distinct = [t.format(p=f"{d}.{c:02d}", d=d, c=f"{c:02d}")
+                for t, d, c in zip(templates, dollars, cents)]
+    return pd.Series(np.asarray(distinct, dtype=object)[rng.integers(0, n_distinct, n)])
+
+
+TIMESTAMP_FORMATS = ['%m/%d/%y %I:%M:%S %p', '%H:%M;%d-%b-%Y', '%H:%M:%S,%Y-%m-%d', '%Y-%m-%d %H:%M:%S',
+                     '%I:%M:%S %p,%d-%B-%Y', '%H:%M:%S, %Y-%m-%d', '%H:%M:%S %m/%d/%y', '%d-%b-%Y, %H:%M',
+                     '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%d.%m.%Y %H:%M:%S', '%a %b %d %H:%M:%S %Y',
+                     '%m/%d/%y;%I:%M:%S %p', '%I:%M:%S %p; %d-%b-%Y']
+
+
+def make_timestamps(n, seed=42):
+    """timestamp-shaped strings in the mixed layouts the cleaners handle,
+    including "A.M."/"P.M." spellings."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01T00:00:00')
+    moments = pd.to_datetime(start + rng.integers(0, 2 * 365 * 86400, n).astype('timedelta64[s]'))
+    fmt = rng.integers(0, len(TIMESTAMP_FORMATS), n)
+    out = pd.Series(index=range(n), dtype=object)
+    for k, f in enumerate(TIMESTAMP_FORMATS):
+        rows = np.flatnonzero(fmt == k)
+        out.iloc[rows] = moments[rows].strftime(f)
+    dotted = rng.random(n) < 0.3
+    out[dotted] = out[dotted].str.replace('AM', 'A.M.').str.replace('PM', 'P.M.')
+    return out
+
+
+GENRES = ['Classic', 'Short story', 'Biography/Autobiography', 'Fantasy', 'Horror', 'Poetry']
+
+
+def make_books(n, seed=42):
+    """books.yaml-shaped records with ":"-prefixed keys and 1-3 authors each."""
+    rng = np.random.default_rng(seed)
+    authors = [f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES]
+    books = []
+    for k in range(n):
+        picked = rng.choice(authors, rng.integers(1, 4), replace=False)
+        books.append({':id': 10000 + k, ':title': f"Book {k}", ':author': ', '.join(picked),
+                      ':genre': str(rng.choice(GENRES)), ':year': int(rng.integers(1850, 2024))})
+    return books
+
+
+def make_orders(n, user_ids, book_ids, seed=42):
+    """orders.parquet-shaped frame referencing the given users and books."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(n, dtype=np.int64) + 60000,
+        'user_id': rng.choice(np.asarray(user_ids, dtype=np.int64), n),
+        'book_id': rng.choice(np.asarray(book_ids, dtype=np.int64), n),
+        'quantity': rng.integers(1, 5, n).astype(np.int32),
+        'unit_price': make_prices(n, seed=seed),
+        'timestamp': make_timestamps(n, seed=seed),
+        'shipping': np.where(rng.random(n) < 0.5, 'NULL', ''),
+    })
+
+
+def write_dataset(folder, n_orders, n_users=10000, n_books=1000, chunk=250000, row_group_size=100000, seed=42,
+                  dup_rate=0.05):
+    """Write users.csv / orders.parquet / books.yaml into folder. Orders are
+    generated and written chunk by chunk so the generator itself stays small."""
+    import yaml
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(folder, exist_ok=True)
+    users = make_users(n_users, dup_rate=dup_rate, seed=seed)
+    users.to_csv(os.path.join(folder, 'users.csv'), index=False)
+    books = make_books(n_books, seed=seed)
+    with open(os.path.join(folder, 'books.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(books, f, sort_keys=False, allow_unicode=True)
+
+    book_ids = [b[':id'] for b in books]
+    writer = None
+    for k, start in enumerate(range(0, n_orders, chunk)):
+        orders = make_orders(min(chunk, n_orders - start), users['id'].astype(int), book_ids, seed=seed + k)
+        orders['id'] += start
+        table = pa.Table.from_pandas(orders, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(os.path.join(folder, 'orders.parquet'), table.schema)
+        writer.write_table(table, row_group_size=row_group_size)
+    if writer is not None:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', type=str, required=True, help='folder to write the dataset into')
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--dup-rate', type=float, default=0.05, help='share of users.csv rows that re-register a user')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    write_dataset(args.out, args.orders, n_users=args.users, n_books=args.books, seed=args.seed,
+                  dup_rate=args.dup_rate)
+    print(f"Wrote {args.orders:,} orders, {args.users:,} users, {args.books:,} books to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""books.yaml ingestion shared by process_data.py and bookstore_analytics.py.
+
+The catalogues are Ruby-style YAML (``:id:``, ``:author:`` ...). They are
+parsed with libyaml's CSafeLoader when PyYAML was built with it, and the
+leading ':' is stripped from every key so the columns come out as id,
+title, author, ...
+
+load_books also keeps a Parquet sidecar of the normalized table, authors
+lists included. Its file name is built from the YAML file's sha256,
+SIDECAR_VERSION and the version the caller gives its author extractor
+(e.g. pipeline.AUTHORS_VERSION), so a later run over the same catalogue
+with the same parsing reads the sidecar and skips YAML parsing. Without pyarrow, or with no cache_dir, the
+YAML is simply parsed every time.
+
+AuthorIndex numbers the authors and the sorted author sets of a catalogue,
+so orders can carry an integer author_set_id and the author metrics become
+integer groupbys.
+"""
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from manifest import file_sha256
+from outputs import to_arrow_table
+
+try:
+    YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    YAML_LOADER = yaml.SafeLoader
+
+# bump when normalization changes so older sidecars are ignored
+SIDECAR_VERSION = 1
+# sidecars live in this folder inside the output directory
+CACHE_SUBDIR = '.cache'
+
+
+def normalize_key(key):
+    """':author' -> 'author'."""
+    return str(key).lstrip(':')
+
+
+def read_yaml_list(path):
+    """The list of book dicts in a books.yaml, keys normalized."""
+    with open(path, "r", encoding="utf-8") as f:
+        obj = yaml.load(f, Loader=YAML_LOADER)
+    books = []
+    if isinstance(obj, list):
+        books = obj
+    elif isinstance(obj, dict) and "books" in obj and isinstance(obj["books"], list):
+        books = obj["books"]
+    elif isinstance(obj, dict):
+        vals = list(obj.values())
+        if all(isinstance(v, dict) for v in vals):
+            books = vals
+    return [{normalize_key(k): v for k, v in book.items()} if isinstance(book, dict) else book
+            for book in books]
+
+
+def sidecar_path(cache_dir, yaml_path, authors_version):
+    key = f"{SIDECAR_VERSION}\n{authors_version}\n{file_sha256(yaml_path)}"
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"books-{digest}.parquet")
+
+
+def books_frame(books_list, extract_authors):
+    for book in books_list:
+        book['authors'] = extract_authors(book)
+    return pd.DataFrame(books_list)
+
+
+def load_books(yaml_path, extract_authors, authors_version, cache_dir=None):
+    """Normalized books DataFrame with an `authors` list column.
+
+    authors_version names extract_authors' parsing (bump it whenever that
+    changes); sidecars written under another version are not read.
+    Returns (df_books, source) where source is 'sidecar' or 'yaml'.
+    """
+    path = None
+    if cache_dir:
+        try:
+            import pyarrow  # noqa: F401 -- sidecars need a parquet engine
+            path = sidecar_path(cache_dir, yaml_path, authors_version)
+        except ImportError:
+            path = None
+    if path and os.path.exists(path):
+        try:
+            df_books = pd.read_parquet(path, dtype_backend='numpy_nullable')
+            df_books['authors'] = [list(a) for a in df_books['authors']]
+            return df_books, 'sidecar'
+        except Exception:
+            pass  # unreadable sidecar: parse the YAML and rewrite it
+
+    df_books = books_frame(read_yaml_list(yaml_path), extract_authors)
+    if path:
+        try:
+            import pyarrow.parquet as pq
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + '.tmp'
+            pq.write_table(to_arrow_table(df_books), tmp)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # read-only cache dir: run without a sidecar
+    return df_books, 'yaml'
+
+
+class AuthorIndex:
+    """Integer ids for the authors and author sets of a books table.
+
+    Both are numbered in order of first appearance in the catalogue:
+    authors[i] is the name of author id i, author_sets[k] the sorted tuple
+    of author set id k. book_set_ids gives every book's author_set_id, or
+    NO_SET when its authors value is not a non-empty list.
+    """
+
+    NO_SET = -1
+
+    def __init__(self, authors_lists):
+        author_ids = {}
+        set_ids = {}
+        book_set_ids = []
+        book_author_ids = []
+        for authors in authors_lists:
+            if not authors or not isinstance(authors, list):
+                book_set_ids.append(self.NO_SET)
+                continue
+            book_author_ids.extend(author_ids.setdefault(a, len(author_ids)) for a in authors)
+            book_set_ids.append(set_ids.setdefault(tuple(sorted(authors)), len(set_ids)))
+        self.authors = list(author_ids)
+        self.author_sets = list(set_ids)
+        self.book_set_ids = np.asarray(book_set_ids, dtype=np.int64)
+        # every (book, author) pair, as author ids
+        self.book_author_ids = np.asarray(book_author_ids, dtype=np.int64)
+        # object array so a take by set id yields tuples; the extra () at the
+        # end is what NO_SET (-1) picks up
+        self.set_tuples = np.empty(len(self.author_sets) + 1, dtype=object)
+        for k, author_set in enumerate(self.author_sets + [()]):
+            self.set_tuples[k] = author_set
+
+    def catalog_counts(self):
+        """Number of books listing each author, in author id order."""
+        counts = np.bincount(self.book_author_ids, minlength=len(self.authors))
+        return pd.Series(counts, index=pd.Index(self.authors, dtype=object))
+
+    def author_set_column(self, set_ids):
+        """author_set tuples for an array of author_set_ids."""
+        return self.set_tuples[np.asarray(set_ids, dtype=np.int64)]
@@ -3,179 +3,48 @@ import re
 import json
 import math
 import pandas as pd
-from collections import defaultdict
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
-import yaml
-import shutil
 from datetime import datetime
 
+from jobs import JobRunner
+from manifest import (INPUT_FILES, check_dataset, invalidate_manifest, manifest_path, summary_path, write_manifest,
+                      written_by_other)
+from parse_cache import order_parse_caches
+from pipeline import Pipeline
+
 # FIX: Use absolute paths for Streamlit Cloud
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_ROOT = os.path.join(BASE_DIR, 'data')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
+# the dashboard's own summaries, manifests and jobs: process_data.py writes
+# different summaries (tables, catalogue author ranking) into OUTPUT_DIR
+DASHBOARD_DIR = os.path.join(OUTPUT_DIR, 'dashboard')
+DEFAULT_BOOK_PRICE = 25.0
+# bump whenever a change alters the dashboard summaries, so incremental
+# runs don't reuse summaries of an older version
+PROCESSOR_VERSION = 'bookstore_analytics/4'
+# bump whenever extract_authors_from_book changes, so books sidecars
+# holding the old authors lists are not read
+AUTHORS_VERSION = 'bookstore_analytics.extract_authors_from_book/1'
 
 class VerifiedDataProcessor:
     """VERIFIED: Proper data processing that addresses Pavel's concerns"""
     
-    def __init__(self, eur_rate=1.2):
+    def __init__(self, eur_rate=1.2, output_dir=DASHBOARD_DIR, data_root=DATA_ROOT):
         self.eur_rate = eur_rate
+        self.output_dir = output_dir
+        self.data_root = data_root
         self.debug_log = []
+        # shared by every dataset this processor handles
+        self.parse_caches = order_parse_caches(eur_rate, price_fallback=DEFAULT_BOOK_PRICE)
     
     def log_debug(self, message):
         """Log debug messages"""
         self.debug_log.append(message)
         print(f"🔍 VERIFIED: {message}")
     
-    def force_clean_output(self):
-        """Completely clean output directory to force regeneration"""
-        self.log_debug("Cleaning output directory...")
-        if os.path.exists(OUTPUT_DIR):
-            shutil.rmtree(OUTPUT_DIR)
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    def read_parquet_with_hint(self, path):
-        try:
-            df = pd.read_parquet(path)
-            self.log_debug(f"Loaded parquet: {path} with {len(df)} rows")
-            return df
-        except Exception as e:
-            self.log_debug(f"ERROR reading {path}: {e}")
-            raise
-    
-    def read_yaml_list(self, path):
-        with open(path, "r", encoding="utf-8") as f:
-            obj = yaml.safe_load(f)
-        self.log_debug(f"Loaded YAML: {path}")
-        
-        if isinstance(obj, list):
-            return obj
-        if isinstance(obj, dict) and "books" in obj and isinstance(obj["books"], list):
-            return obj["books"]
-        if isinstance(obj, dict):
-            vals = list(obj.values())
-            if all(isinstance(v, dict) for v in vals):
-                return vals
-        return []
-    
-    def extract_single_price_from_mess(self, price_text):
-        """
-        VERIFIED: Extract reasonable prices from messy data
-        """
-        if pd.isna(price_text):
-            return 25.0  # Reasonable default book price
-            
-        text = str(price_text).strip()
-        if not text:
-            return 25.0
-        
-        # Find all potential price patterns
-        price_patterns = [
-            r'\b\d+\.\d{2}\b',  # "27.00", "45.99"
-            r'\b\d+\b',         # "27", "45" 
-            r'[€$]\s*(\d+\.?\d*)',  # "$27.00", "€45.99"
-            r'(\d+)¢',          # "27¢", "50¢"
-        ]
-        
-        all_prices = []
-        for pattern in price_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                try:
-                    if isinstance(match, tuple):
-                        match = match[0] if match else None
-                    
-                    if match:
-                        price = float(match)
-                        # Reasonable book price range
-                        if 5 <= price <= 100:
-                            all_prices.append(price)
-                except (ValueError, TypeError):
-                    continue
-        
-        if all_prices:
-            # Use median to avoid outliers
-            all_prices.sort()
-            median_price = all_prices[len(all_prices) // 2]
-            return median_price
-        else:
-            # Fallback to reasonable default
-            return 25.0
-
-    def clean_timestamp_str(self, s):
-        if pd.isna(s):
-            return s
-        if not isinstance(s, str):
-            return s
-        t = s.strip()
-        t = re.sub(r"\bA\.?M\.?\b", "AM", t, flags=re.IGNORECASE)
-        t = re.sub(r"\bP\.?M\.?\b", "PM", t, flags=re.IGNORECASE)
-        t = re.sub(r"\bM\.$", "", t)
-        t = t.replace(",", " ")
-        t = re.sub(r"\s+", " ", t).strip()
-        return t
-
-    def parse_timestamp_series(self, srs):
-        s_clean = srs.astype(object).apply(self.clean_timestamp_str)
-        parsed = pd.to_datetime(s_clean, errors="coerce", dayfirst=False)
-        return parsed
-
-    class UnionFind:
-        def __init__(self):
-            self.parent = {}
-        def find(self, x):
-            if x not in self.parent:
-                self.parent[x] = x
-            if self.parent[x] != x:
-                self.parent[x] = self.find(self.parent[x])
-            return self.parent[x]
-        def union(self, a, b):
-            ra, rb = self.find(a), self.find(b)
-            if ra == rb:
-                return
-            self.parent[rb] = ra
-
-    def reconcile_users(self, df_users):
-        df = df_users.copy().fillna("").astype(str)
-        if 'user_id' not in df.columns:
-            if 'id' in df.columns:
-                df = df.rename(columns={'id': 'user_id'})
-            else:
-                df = df.reset_index().rename(columns={'index': 'user_id'})
-        for c in ['name','email','phone','address']:
-            if c not in df.columns:
-                df[c] = ''
-        ids = df['user_id'].tolist()
-        records = df[['name','email','phone','address']].map(lambda x: str(x).strip().lower()).to_dict(orient='records')
-        uf = self.UnionFind()
-        n = len(ids)
-        for i in range(n):
-            for j in range(i+1, n):
-                matches = 0
-                for k in ['name','email','phone','address']:
-                    if records[i][k] != '' and records[i][k] == records[j][k]:
-                        matches += 1
-                if matches >= 3:
-                    uf.union(ids[i], ids[j])
-        mapping = {}
-        clusters = defaultdict(list)
-        for uid in ids:
-            root = uf.find(uid)
-            mapping[uid] = root
-            clusters[root].append(uid)
-        df['cluster_id'] = df['user_id'].map(mapping)
-        return df, mapping, clusters
-
-    def pick_col(self, cols, candidates):
-        for c in candidates:
-            if c in cols: return c
-        lower = {col.lower(): col for col in cols}
-        for c in candidates:
-            if c.lower() in lower:
-                return lower[c.lower()]
-        return None
-
     def extract_authors_from_book(self, book):
         """Proper author extraction"""
         author_fields = ['author', 'authors', 'writer', 'writers', 'by', 'author_name']
@@ -207,244 +76,102 @@ class VerifiedDataProcessor:
         
         return ['Unknown Author']
 
-    def process_dataset_folder(self, data_dir, out_dir):
+    def process_dataset_folder(self, data_dir, out_dir, progress=None):
         """VERIFIED: Process data addressing Pavel's concerns"""
-        dataset_name = os.path.basename(os.path.normpath(data_dir))
-        self.log_debug(f"🔄 Processing dataset: {dataset_name}")
-        os.makedirs(out_dir, exist_ok=True)
-
-        users_path = os.path.join(data_dir, 'users.csv')
-        orders_path = os.path.join(data_dir, 'orders.parquet')
-        books_path = os.path.join(data_dir, 'books.yaml')
-
-        if not all(os.path.exists(p) for p in [users_path, orders_path, books_path]):
-            st.error(f"❌ Missing data files in {dataset_name}")
+        pipeline = Pipeline(self.eur_rate, self.parse_caches, price_fallback=DEFAULT_BOOK_PRICE,
+                            extract_authors=self.extract_authors_from_book, authors_version=AUTHORS_VERSION,
+                            author_ranking='sales',
+                            write_tables=False, log=self.log_debug, progress=progress)
+        try:
+            run = pipeline.run(data_dir, out_dir)
+        except FileNotFoundError:
+            st.error(f"❌ Missing data files in {os.path.basename(os.path.normpath(data_dir))}")
             return None
-
-        # Load data
-        df_users = pd.read_csv(users_path, dtype=str)
-        df_orders = self.read_parquet_with_hint(orders_path)
-        books_list = self.read_yaml_list(books_path)
-        
-        self.log_debug(f"Loaded {len(df_users)} users, {len(df_orders)} orders, {len(books_list)} books")
-
-        # Process books
-        for book in books_list:
-            book['authors'] = self.extract_authors_from_book(book)
-        
-        df_books = pd.DataFrame(books_list)
-
-        # Normalize orders columns
-        ord_cols = df_orders.columns.tolist()
-        user_col = self.pick_col(ord_cols, ['user_id','user','customer_id','customer','userId','id'])
-        qty_col = self.pick_col(ord_cols, ['quantity','qty','count'])
-        price_col = self.pick_col(ord_cols, ['unit_price','price','unitprice','amount'])
-        ts_col = self.pick_col(ord_cols, ['timestamp','order_ts','created_at','order_date','date','time'])
-        book_col = self.pick_col(ord_cols, ['book_id','isbn','sku','product_id','book'])
-
-        rename_map = {}
-        if user_col and user_col != 'user_id': rename_map[user_col] = 'user_id'
-        if qty_col and qty_col != 'quantity': rename_map[qty_col] = 'quantity'
-        if price_col and price_col != 'unit_price': rename_map[price_col] = 'unit_price'
-        if ts_col and ts_col != 'timestamp_raw': rename_map[ts_col] = 'timestamp_raw'
-        if book_col and book_col != 'book_id': rename_map[book_col] = 'book_id'
-        if rename_map:
-            df_orders = df_orders.rename(columns=rename_map)
-
-        # Process quantities and prices
-        if 'quantity' not in df_orders.columns:
-            df_orders['quantity'] = 1
-        else:
-            df_orders['quantity'] = pd.to_numeric(df_orders['quantity'], errors='coerce').fillna(0).astype(int)
-
-        # VERIFIED: Use proper price extraction
-        if 'unit_price' in df_orders.columns:
-            df_orders['unit_price_clean'] = df_orders['unit_price'].apply(self.extract_single_price_from_mess)
-        else:
-            df_orders['unit_price_clean'] = 25.0
-
-        df_orders['unit_price_usd'] = df_orders['unit_price_clean']
-        
-        # Calculate revenue with proper prices
-        df_orders['paid_price'] = df_orders['quantity'] * df_orders['unit_price_usd']
-        df_orders['paid_price'] = pd.to_numeric(df_orders['paid_price'], errors='coerce').fillna(0.0)
-        
-        total_revenue = df_orders['paid_price'].sum()
-        self.log_debug(f"Total revenue: ${total_revenue:,.2f}")
-        
-        df_orders['paid_price'] = df_orders['paid_price'].round(2)
-
-        # Process timestamps
-        if 'timestamp_raw' in df_orders.columns:
-            df_orders['timestamp_parsed'] = self.parse_timestamp_series(df_orders['timestamp_raw'])
-        else:
-            df_orders['timestamp_parsed'] = pd.NaT
-
-        df_orders['date'] = df_orders['timestamp_parsed'].dt.date
-
-        # Reconcile users
-        df_users_proc, mapping, clusters = self.reconcile_users(df_users)
-
-        if 'user_id' in df_orders.columns:
-            df_orders['user_id'] = df_orders['user_id'].astype(str)
-            df_orders['cluster_id'] = df_orders['user_id'].map(mapping).fillna(df_orders['user_id'])
-        else:
-            df_orders['cluster_id'] = None
-
-        # Merge with books
-        book_cols = df_books.columns.tolist()
-        book_id_books = self.pick_col(book_cols, ['book_id','id','isbn','sku','book_id','product_id'])
-        if book_id_books and book_id_books != 'book_id':
-            df_books = df_books.rename(columns={book_id_books: 'book_id'})
-        if 'book_id' in df_books.columns:
-            df_books['book_id'] = df_books['book_id'].astype(str)
-
-        if 'book_id' in df_orders.columns and 'book_id' in df_books.columns:
-            df_orders['book_id'] = df_orders['book_id'].astype(str)
-            df_orders = df_orders.merge(df_books[['book_id','authors']], on='book_id', how='left', suffixes=('', '_from_books'))
-        else:
-            df_orders['authors'] = [[] for _ in range(len(df_orders))]
-
-        df_orders['author_set'] = df_orders['authors'].apply(lambda a: tuple(sorted(a)) if isinstance(a, list) and a else ())
-
-        # Daily revenue
-        daily_rev = df_orders.groupby('date', dropna=False)['paid_price'].sum().reset_index()
-        daily_rev = daily_rev[daily_rev['paid_price'] > 0]
-        daily_rev = daily_rev.sort_values('date')
-
-        # Top revenue days
-        top5_days = []
-        if not daily_rev.empty:
-            top_days = daily_rev.nlargest(5, 'paid_price')
-            for _, day in top_days.iterrows():
-                top5_days.append({
-                    'date': str(day['date']),
-                    'paid_price': round(day['paid_price'], 2)
-                })
-
-        # Popular authors by ACTUAL SALES (not just catalog)
-        author_sales = defaultdict(int)
-        for _, order in df_orders.iterrows():
-            authors = order.get('authors', [])
-            quantity = order.get('quantity', 1)
-            if isinstance(authors, list) and authors:
-                for author in authors:
-                    if author and author != 'Unknown Author':
-                        author_sales[author] += quantity
-        
-        popular_authors = []
-        if author_sales:
-            max_sales = max(author_sales.values())
-            popular_authors = [author for author, sales in author_sales.items() if sales == max_sales]
-            self.log_debug(f"Most popular author by sales: {popular_authors[0]} with {max_sales} books sold")
-        else:
-            # Fallback to catalog authors
-            catalog_author_counts = defaultdict(int)
-            for authors in df_books['authors']:
-                if isinstance(authors, list):
-                    for author in authors:
-                        if author != 'Unknown Author':
-                            catalog_author_counts[author] += 1
-            
-            if catalog_author_counts:
-                max_count = max(catalog_author_counts.values())
-                popular_authors = [author for author, count in catalog_author_counts.items() if count == max_count]
-
-        # Customer spending
-        cluster_spending = defaultdict(float)
-        for _, order in df_orders.iterrows():
-            cluster_id = order.get('cluster_id')
-            paid_price = order.get('paid_price', 0.0)
-            if cluster_id and pd.notna(paid_price):
-                cluster_spending[cluster_id] += paid_price
-        
-        top_customer_ids = []
-        top_customer_total = 0.0
-        if cluster_spending:
-            top_cluster = max(cluster_spending.items(), key=lambda x: x[1])
-            top_cluster_id, top_total = top_cluster
-            top_customer_ids = clusters.get(top_cluster_id, [top_cluster_id])
-            top_customer_total = round(top_total, 2)
-            self.log_debug(f"Top customer spent: ${top_customer_total:,.2f}")
-
-        # Unique metrics
-        unique_real_users = len(clusters)
-        
-        all_author_sets = set()
-        for authors in df_books['authors']:
-            if authors and isinstance(authors, list):
-                all_author_sets.add(tuple(sorted(authors)))
-        unique_author_sets = len(all_author_sets)
+        summary = run.summary
 
         # VERIFIED: Final output
-        print(f"\n✅ VERIFIED RESULTS FOR {dataset_name}:")
-        print(f"   Total Revenue: ${total_revenue:,.2f}")
-        print(f"   Unique Users: {unique_real_users}")
-        print(f"   Author Sets: {unique_author_sets}")
-        print(f"   Popular Author: {popular_authors[0] if popular_authors else 'None'}")
-        print(f"   Top Customer Spending: ${top_customer_total:,.2f}")
-        
-        top_days_display = [f"${day['paid_price']:,.2f}" for day in top5_days[:3]]
+        print(f"\n✅ VERIFIED RESULTS FOR {summary['dataset']}:")
+        print(f"   Total Revenue: ${summary['total_revenue']:,.2f}")
+        print(f"   Unique Users: {summary['unique_real_users']}")
+        print(f"   Author Sets: {summary['unique_author_sets']}")
+        print(f"   Popular Author: {summary['most_popular_authors'][0] if summary['most_popular_authors'] else 'None'}")
+        print(f"   Top Customer Spending: ${summary['top_customer_total_spent']:,.2f}")
+
+        top_days_display = [f"${day['paid_price']:,.2f}" for day in summary['top5_days'][:3]]
         print(f"   Top Days: {top_days_display}")
-
-        # Save files
-        out_prefix = os.path.join(out_dir, f"{dataset_name}")
-        
-        try:
-            summary = {
-                'dataset': dataset_name,
-                'total_revenue': float(total_revenue),
-                'top5_days': top5_days,
-                'unique_real_users': int(unique_real_users),
-                'unique_author_sets': int(unique_author_sets),
-                'most_popular_authors': popular_authors,
-                'top_customer_user_ids': top_customer_ids,
-                'top_customer_total_spent': float(top_customer_total),
-            }
-            
-            with open(out_prefix + "_summary.json", "w", encoding="utf-8") as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
-                
-        except Exception as e:
-            st.error(f"Error saving {dataset_name}: {e}")
-
         return summary
 
-    def process_all_data(self):
-        """Process all datasets"""
-        self.force_clean_output()
-        
-        if not os.path.exists(DATA_ROOT):
-            st.error(f"❌ Data directory not found: {DATA_ROOT}")
+    def list_datasets(self):
+        """DATA* folders under data_root, sorted"""
+        if not os.path.exists(self.data_root):
             return []
-
         datasets = []
-        for entry in sorted(os.listdir(DATA_ROOT)):
-            p = os.path.join(DATA_ROOT, entry)
+        for entry in sorted(os.listdir(self.data_root)):
+            p = os.path.join(self.data_root, entry)
             if os.path.isdir(p) and entry.upper().startswith('DATA'):
                 datasets.append(p)
-        
-        if not datasets:
-            st.error("❌ No DATA folders found")
-            return []
+        return datasets
 
-        all_summaries = []
-        for i, d in enumerate(datasets):
-            with st.spinner(f"Processing {os.path.basename(d)}... ({i+1}/{len(datasets)})"):
-                try:
-                    summary = self.process_dataset_folder(d, OUTPUT_DIR)
-                    if summary:
-                        all_summaries.append(summary)
-                except Exception as e:
-                    st.error(f"❌ ERROR processing {d}: {e}")
-                    continue
+    def manifest_params(self):
+        return {'eur_rate': self.eur_rate, 'book_price_fallback': DEFAULT_BOOK_PRICE}
 
-        return all_summaries
+    def check_datasets(self, datasets):
+        """Split datasets into ({data_dir: stored summary} for unchanged ones,
+        {data_dir: manifest} for the rest)"""
+        fresh, manifests = {}, {}
+        for d in datasets:
+            try:
+                summary, manifest = check_dataset(d, self.output_dir, PROCESSOR_VERSION, self.manifest_params())
+            except OSError:
+                continue
+            if summary is not None:
+                fresh[d] = summary
+            manifests[d] = manifest
+        return fresh, manifests
+
+    def stale_datasets(self):
+        """Datasets whose inputs, parameters or outputs changed since they were processed;
+        outputs another processor wrote into output_dir are left alone"""
+        fresh, manifests = self.check_datasets(self.list_datasets())
+        return [d for d in manifests if d not in fresh and not self.foreign_outputs(d)]
+
+    def foreign_outputs(self, data_dir):
+        """True when output_dir holds this dataset's outputs from another processor (e.g. process_data.py)"""
+        return written_by_other(self.output_dir, os.path.basename(os.path.normpath(data_dir)), PROCESSOR_VERSION)
+
+    def record_manifest(self, manifest):
+        path = summary_path(self.output_dir, manifest['dataset'])
+        if os.path.exists(path):
+            write_manifest(self.output_dir, manifest, [path])
+
+def refresh_dataset_job(data_dir, out_dir, progress):
+    """JobRunner target: reprocess one dataset and record its manifest"""
+    processor = VerifiedDataProcessor(output_dir=out_dir)
+    if processor.foreign_outputs(data_dir):
+        raise RuntimeError(f"{os.path.basename(data_dir)} in {out_dir} was written by another processor")
+    _, manifests = processor.check_datasets([data_dir])
+    if data_dir in manifests:
+        invalidate_manifest(out_dir, manifests[data_dir])
+    summary = processor.process_dataset_folder(data_dir, out_dir, progress)
+    if not summary:
+        raise RuntimeError(f"No summary produced for {os.path.basename(data_dir)}")
+    if data_dir in manifests:
+        processor.record_manifest(manifests[data_dir])
+    return summary
+
+@st.cache_resource
+def job_runner():
+    """One job runner per server process, shared by every session"""
+    return JobRunner(DASHBOARD_DIR, refresh_dataset_job)
 
 class RobustBookstoreDashboard:
     def __init__(self):
         self.processor = VerifiedDataProcessor()
-        self.output_dir = OUTPUT_DIR
+        self.output_dir = DASHBOARD_DIR
+        # imported here: its st.cache_data loaders log warnings when defined
+        # outside a Streamlit run, and scripts import this module for the processor
+        from dashboard_data import DashboardData
+        self.data = DashboardData(DASHBOARD_DIR)
     
     def setup_page(self):
         st.set_page_config(
@@ -594,44 +321,104 @@ class RobustBookstoreDashboard:
         """, unsafe_allow_html=True)
     
     def ensure_data_exists(self):
-        """Make sure data is processed before showing dashboard - with proper error handling"""
+        """Make sure there are outputs to show; missing, invalid or stale datasets
+        are reprocessed in the background while the current outputs are served"""
         try:
             if not os.path.exists(self.output_dir):
                 os.makedirs(self.output_dir, exist_ok=True)
             
-            # Check if summary files exist and are valid
-            summary_files = [f for f in os.listdir(self.output_dir) if f.endswith('_summary.json')]
+            datasets = self.processor.list_datasets()
+            if not datasets:
+                st.error(f"❌ No DATA folders found in {self.processor.data_root}")
+                return False
+            
+            # Check that summary files exist and are valid (cached on file mtime)
+            to_refresh = []
+            for d in datasets:
+                name = os.path.basename(d)
+                try:
+                    data = self.data.summary(name)
+                    # Check if required fields exist
+                    if data is not None and 'total_revenue' not in data:
+                        st.warning(f"Invalid data in {name}_summary.json, reprocessing...")
+                        to_refresh.append(d)
+                except (json.JSONDecodeError, KeyError):
+                    st.warning(f"Corrupted data in {name}_summary.json, reprocessing...")
+                    to_refresh.append(d)
+            
+            # Only datasets whose inputs changed since the last run are recomputed
+            stale = self.stale_datasets(datasets)
+            to_refresh += [d for d in stale if d not in to_refresh]
+            
+            # never overwrite what another processor wrote
+            foreign = [d for d in to_refresh if self.processor.foreign_outputs(d)]
+            for d in foreign:
+                st.warning(f"{os.path.basename(d)} in {self.output_dir} was written by another processor; not reprocessing it")
             
-            if not summary_files:
+            # jobs run in the background; the current outputs are served meanwhile
+            runner = job_runner()
+            for d in to_refresh:
+                if d not in foreign:
+                    runner.submit(d, key=self.input_key(d))
+            self.render_job_status(runner)
+            
+            if not self.data.dataset_names():
                 st.info("🔄 Processing data for the first time... This may take a moment.")
-                summaries = self.processor.process_all_data()
-                return bool(summaries)
-            else:
-                # Validate that the files contain proper data
-                for summary_file in summary_files:
-                    file_path = os.path.join(self.output_dir, summary_file)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                        # Check if required fields exist
-                        if 'total_revenue' not in data:
-                            st.warning(f"Invalid data in {summary_file}, reprocessing...")
-                            return self.force_reprocess()
-                    except (json.JSONDecodeError, KeyError):
-                        st.warning(f"Corrupted data in {summary_file}, reprocessing...")
-                        return self.force_reprocess()
-                
-                return True
+                return False
+            return True
                 
         except Exception as e:
             st.error(f"Error ensuring data exists: {e}")
             return False
     
+    def render_job_status(self, runner):
+        """Progress of the background jobs, polled every couple of seconds;
+        the page reruns once they are all done, to show the new outputs"""
+        def job_status():
+            statuses = runner.statuses()
+            active = [s for s in statuses.values() if s['state'] in ('queued', 'running')]
+            for job in active:
+                step = f" – {job['stage']}" if job['stage'] else ""
+                st.progress(min(1.0, job['progress']), text=f"🔄 Updating {job['dataset']} ({job['state']}{step})")
+            for job in statuses.values():
+                if job['state'] == 'failed':
+                    st.error(f"❌ Reprocessing {job['dataset']} failed: {job['error']}")
+            was_active = st.session_state.get('jobs_active', False)
+            st.session_state['jobs_active'] = bool(active)
+            if was_active and not active:
+                st.rerun()
+        
+        if hasattr(st, 'fragment'):
+            st.fragment(job_status, run_every=2)()
+        else:
+            # Streamlit without fragments: no polling, refresh by hand
+            job_status()
+            if runner.active() and st.button("🔄 Check again"):
+                st.rerun()
+    
+    def input_key(self, data_dir):
+        """Sizes and mtimes of a dataset's input files"""
+        from dashboard_data import file_token
+        return tuple(file_token(os.path.join(data_dir, fn)) for fn in INPUT_FILES)
+    
+    def stale_datasets(self, datasets):
+        """processor.stale_datasets, only rechecked when an input file, manifest
+        or summary of one of the datasets changed on disk"""
+        from dashboard_data import cached_stale_datasets, file_token
+        paths = []
+        for d in datasets:
+            name = os.path.basename(d)
+            paths += [os.path.join(d, fn) for fn in INPUT_FILES]
+            paths += [manifest_path(self.output_dir, name), summary_path(self.output_dir, name)]
+        return cached_stale_datasets(self.processor, tuple((p, file_token(p)) for p in paths))
+    
     def force_reprocess(self):
-        """Force reprocessing of all data"""
+        """Reprocess every dataset in the background, whatever its manifest says"""
         try:
-            summaries = self.processor.process_all_data()
-            return bool(summaries)
+            runner = job_runner()
+            submitted = [d for d in self.processor.list_datasets()
+                         if not self.processor.foreign_outputs(d) and runner.submit(d, force=True)]
+            return bool(submitted)
         except Exception as e:
             st.error(f"Error during reprocessing: {e}")
             return False
@@ -641,27 +428,24 @@ class RobustBookstoreDashboard:
         datasets = {}
         
         for dataset in ["DATA1", "DATA2", "DATA3"]:
-            summary_file = os.path.join(self.output_dir, f"{dataset}_summary.json")
+            try:
+                summary_data = self.data.summary(dataset)
+            except Exception as e:
+                st.error(f"❌ Error loading {dataset}: {e}")
+                continue
             
-            if os.path.exists(summary_file):
-                try:
-                    with open(summary_file, "r", encoding="utf-8") as f:
-                        summary_data = json.load(f)
-                    
-                    # Validate the loaded data has required fields
-                    required_fields = ['total_revenue', 'unique_real_users', 'unique_author_sets']
-                    if all(field in summary_data for field in required_fields):
-                        datasets[dataset] = {
-                            "summary": summary_data
-                        }
-                    else:
-                        st.warning(f"Missing required fields in {dataset}, skipping...")
-                        
-                except Exception as e:
-                    st.error(f"❌ Error loading {dataset}: {e}")
-                    continue
-            else:
+            if summary_data is None:
                 st.warning(f"Summary file not found for {dataset}")
+                continue
+            
+            # Validate the loaded data has required fields
+            required_fields = ['total_revenue', 'unique_real_users', 'unique_author_sets']
+            if all(field in summary_data for field in required_fields):
+                datasets[dataset] = {
+                    "summary": summary_data
+                }
+            else:
+                st.warning(f"Missing required fields in {dataset}, skipping...")
         
         return datasets
     
@@ -738,12 +522,17 @@ class RobustBookstoreDashboard:
         st.markdown('<div class="main-header">📊 Bookstore Analytics Dashboard</div>', unsafe_allow_html=True)
         st.markdown('<div class="subheader">Dark Theme - Professional Business Intelligence</div>', unsafe_allow_html=True)
         
+        if st.sidebar.button("🔄 Reprocess all datasets"):
+            if self.force_reprocess():
+                st.sidebar.success("Reprocessing started in the background")
+        
         # Ensure data exists with proper loading state
         with st.spinner("🔄 Loading and validating data..."):
             data_ready = self.ensure_data_exists()
         
         if not data_ready:
-            st.error("❌ Failed to load or process data. Please check the data files and try again.")
+            if not job_runner().active():
+                st.error("❌ Failed to load or process data. Please check the data files and try again.")
             return
         
         # Load data
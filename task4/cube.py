@@ -0,0 +1,193 @@
+"""Pre-aggregated revenue cube over the enriched orders.
+
+The day cube holds one row per (date, book_id, cluster_id, author_set_id)
+with the quantity sold, the paid_price in integer cents and the number of
+orders. author_set_id follows from book_id, so it adds no rows; it is
+there so author questions need no books lookup. The month and year cubes
+roll the day cube up over time (month is 'YYYY-MM').
+
+CubeBuilder folds the orders in batch by batch, like
+aggregations.OrderTotals, and writes the cubes as Parquet next to the
+other outputs:
+
+  <dataset>_cube_day.parquet     date, book_id, cluster_id, author_set_id, quantity, paid_cents, orders
+  <dataset>_cube_month.parquet   month, ...
+  <dataset>_cube_year.parquet    year, ...
+  <dataset>_cube_authors.parquet author_set_id, author (one row per author of each set)
+
+RevenueCube reads them back and answers slice/dice questions without
+touching the orders:
+
+    cube = RevenueCube('output/DATA1')
+    cube.query(by=['month'], where={'year': 2024})
+    cube.query(by=['weekday'])
+    cube.query(by=['author'], where={'month': ['2024-11', '2024-12']})
+
+Each query reads the coarsest cube that has the dimensions it needs.
+Per-author figures count every order once for each of its book's
+authors, like the author rankings do.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregations import to_cents
+from outputs import read_table, table_path, write_table
+
+CUBE_LEVELS = ('day', 'month', 'year')
+CUBE_TABLES = tuple(f'cube_{level}' for level in CUBE_LEVELS) + ('cube_authors',)
+CUBE_KEYS = ('book_id', 'cluster_id', 'author_set_id')
+MEASURES = ('quantity', 'paid_cents', 'orders')
+DIMENSIONS = ('date', 'weekday', 'month', 'year', 'book_id', 'cluster_id', 'author_set_id', 'author')
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+# partial cubes kept before they are folded together
+COMPACT_EVERY = 8
+
+
+def cube_files(dataset_name):
+    return [f"{dataset_name}_{table}.parquet" for table in CUBE_TABLES]
+
+
+def month_labels(dates):
+    """'YYYY-MM' per datetime (None for NaT); formats each distinct month once."""
+    codes, months = pd.factorize(dates.to_numpy().astype('datetime64[M]'))
+    labels = np.array([str(m)[:7] for m in months] + [None], dtype=object)
+    return labels[codes]
+
+
+def _group(df, keys):
+    """Sum the measures of df per keys (missing keys kept as their own group)."""
+    return (df.groupby(list(keys), dropna=False, sort=False, observed=True)[list(MEASURES)]
+            .sum().reset_index())
+
+
+class CubeBuilder:
+    """The day cube of all the orders passed to update()."""
+
+    def __init__(self):
+        self.partials = []
+
+    def update(self, df_orders):
+        batch = pd.DataFrame({
+            'date': df_orders['timestamp_parsed'].dt.normalize(),
+            'book_id': df_orders['book_id'],
+            'cluster_id': df_orders['cluster_id'],
+            'author_set_id': df_orders['author_set_id'],
+            'quantity': df_orders['quantity'].to_numpy(dtype=np.int64),
+            'paid_cents': to_cents(df_orders['paid_price'].fillna(0.0)),
+            'orders': np.ones(len(df_orders), dtype=np.int64),
+        })
+        partial = _group(batch, ('date',) + CUBE_KEYS)
+        # plain string keys, so partials from batches with other categories concat cleanly
+        for col in ('book_id', 'cluster_id'):
+            partial[col] = partial[col].astype(object).where(partial[col].notna(), None)
+        self.partials.append(partial)
+        if len(self.partials) >= COMPACT_EVERY:
+            self.partials = [self.day()]
+
+    def day(self):
+        if not self.partials:
+            columns = ('date',) + CUBE_KEYS + MEASURES
+            return pd.DataFrame({col: pd.Series(dtype=object) for col in columns})
+        if len(self.partials) == 1:
+            return self.partials[0]
+        return _group(pd.concat(self.partials, ignore_index=True), ('date',) + CUBE_KEYS)
+
+    def levels(self):
+        """{level: cube}, each sorted by time then keys (tight Parquet row-group stats)."""
+        day = self.day()
+        day['date'] = pd.to_datetime(day['date'])
+        month = day.assign(month=month_labels(day['date'])).drop(columns='date')
+        year = day.assign(year=day['date'].dt.year.astype('Int64')).drop(columns='date')
+        cubes = {
+            'day': day,
+            'month': _group(month, ('month',) + CUBE_KEYS),
+            'year': _group(year, ('year',) + CUBE_KEYS),
+        }
+        return {level: cube.sort_values([cube.columns[0], 'book_id', 'cluster_id'], na_position='last',
+                                         ignore_index=True)
+                for level, cube in cubes.items()}
+
+    def write(self, out_prefix, author_sets):
+        """Write the cube tables; author_sets maps author_set_id to author tuples.
+        Returns {table: path}."""
+        paths = {}
+        for level, cube in self.levels().items():
+            paths[f'cube_{level}'] = write_table(cube, out_prefix, f'cube_{level}', 'parquet')
+        authors = pd.DataFrame([(set_id, author) for set_id, author_set in enumerate(author_sets)
+                                for author in author_set], columns=['author_set_id', 'author'])
+        paths['cube_authors'] = write_table(authors, out_prefix, 'cube_authors', 'parquet')
+        return paths
+
+
+class RevenueCube:
+    """Slice/dice queries over the cube tables written for one dataset.
+
+    Cube tables are read on first use and kept, so repeated queries only
+    pay for the filter and the group-by.
+    """
+
+    def __init__(self, out_prefix):
+        self.out_prefix = out_prefix
+        self._tables = {}
+
+    @classmethod
+    def exists(cls, out_prefix):
+        return all(os.path.exists(table_path(out_prefix, table, 'parquet')) for table in CUBE_TABLES)
+
+    def table(self, name):
+        if name not in self._tables:
+            df = read_table(self.out_prefix, name)
+            if df is None:
+                raise FileNotFoundError(f"{table_path(self.out_prefix, name, 'parquet')} not found; "
+                                        "run process_data.py first")
+            if name == 'cube_day':
+                df['date'] = pd.to_datetime(df['date'])
+            self._tables[name] = df
+        return self._tables[name]
+
+    def level_for(self, dims):
+        if {'date', 'weekday'} & dims:
+            return 'day'
+        if 'month' in dims:
+            return 'month'
+        return 'year'
+
+    def query(self, by=(), where=None):
+        """quantity, paid_price and orders per combination of the `by`
+        dimensions, over the rows matching `where`.
+
+        where maps dimensions to a value or to a list of allowed values;
+        dates may be given as 'YYYY-MM-DD' strings. With no `by`, one row
+        of totals.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        where = dict(where or {})
+        unknown = (set(by) | set(where)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions {sorted(unknown)}, expected some of {DIMENSIONS}")
+
+        df = self.table('cube_' + self.level_for(set(by) | set(where)))
+        needed = set(by) | set(where)
+        if 'weekday' in needed:
+            weekday = df['date'].dt.weekday.fillna(-1).astype(int)
+            df = df.assign(weekday=pd.Categorical.from_codes(weekday, categories=WEEKDAYS, ordered=True))
+        if 'author' in needed:
+            df = df.merge(self.table('cube_authors'), on='author_set_id', how='inner')
+        if 'year' in needed and 'year' not in df.columns:
+            df = df.assign(year=df['month'].str[:4].astype('Int64') if 'month' in df.columns
+                           else df['date'].dt.year)
+
+        for dim, value in where.items():
+            values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            if dim == 'date':
+                values = pd.to_datetime(values)
+            df = df[df[dim].isin(values)]
+
+        if by:
+            result = df.groupby(by, sort=True, observed=True)[list(MEASURES)].sum().reset_index()
+        else:
+            result = pd.DataFrame({m: [df[m].sum()] for m in MEASURES})
+        result['paid_price'] = result.pop('paid_cents') / 100
+        return result
@@ -0,0 +1,107 @@
+"""Cached, lazily loaded access to the processed outputs for both dashboards.
+
+app_streamlit.py and bookstore_analytics.py read the files in the output
+directory through DashboardData instead of opening them on every rerun.
+Each loader is wrapped in st.cache_data (summaries, tables) or
+st.cache_resource (the revenue cube, which keeps its tables in memory)
+and keyed on the file's size and mtime. A rerun re-reads only the files
+that changed on disk, and fresh outputs from a reprocess show up on the
+next rerun without clearing any cache.
+
+Nothing is read before a page asks for it. lazy_tabs makes st.tabs run
+only the selected tab's body, so a dataset's daily revenue and cube are
+loaded when its tab is opened.
+"""
+import os
+import json
+
+import streamlit as st
+
+from cube import CUBE_TABLES, RevenueCube
+from outputs import OUTPUT_FORMATS, read_table, table_path
+
+
+def file_token(path):
+    """(size, mtime_ns) of path, or None if it is missing: the cache key for its contents."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def table_token(out_prefix, name):
+    return tuple(file_token(table_path(out_prefix, name, fmt)) for fmt in OUTPUT_FORMATS)
+
+
+@st.cache_data(show_spinner=False)
+def load_summary(path, token):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@st.cache_data(show_spinner=False)
+def load_table(out_prefix, name, columns, token):
+    return read_table(out_prefix, name, columns=list(columns) if columns else None)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_cube(out_prefix, token):
+    return RevenueCube(out_prefix)
+
+
+@st.cache_data(show_spinner=False)
+def cached_stale_datasets(_processor, token):
+    """_processor.stale_datasets(); token must cover every file it looks at."""
+    return _processor.stale_datasets()
+
+
+class DashboardData:
+    """The outputs of one output directory, read through the caches above."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def prefix(self, dataset):
+        return os.path.join(self.output_dir, dataset)
+
+    def dataset_names(self):
+        """DATA* datasets with a summary file, sorted."""
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(f[:-len('_summary.json')] for f in os.listdir(self.output_dir)
+                      if f.endswith('_summary.json') and f.upper().startswith('DATA'))
+
+    def summary(self, dataset):
+        """The dataset's summary dict, None if it has none (raises on a corrupt file)."""
+        path = self.prefix(dataset) + '_summary.json'
+        token = file_token(path)
+        if token is None:
+            return None
+        return load_summary(path, token)
+
+    def daily_revenue(self, dataset):
+        """date / paid_price frame (a copy, safe to modify), None if not written."""
+        prefix = self.prefix(dataset)
+        return load_table(prefix, 'daily_revenue', ('date', 'paid_price'), table_token(prefix, 'daily_revenue'))
+
+    def cube(self, dataset):
+        """The dataset's RevenueCube, None if its cube tables are missing."""
+        prefix = self.prefix(dataset)
+        tokens = tuple(file_token(table_path(prefix, table, 'parquet')) for table in CUBE_TABLES)
+        if None in tokens:
+            return None
+        return load_cube(prefix, tokens)
+
+
+def lazy_tabs(names, key):
+    """st.tabs that only runs the selected tab's body (check tab_open).
+    Streamlit versions without lazy tabs fall back to running them all."""
+    try:
+        return st.tabs(names, key=key, on_change='rerun')
+    except TypeError:
+        return st.tabs(names)
+
+
+def tab_open(tab):
+    return getattr(tab, 'open', None) is not False
@@ -0,0 +1,221 @@
+"""Background reprocessing jobs with per-dataset file locks and status files.
+
+JobRunner runs dataset jobs on a small thread pool, so the ETL never runs
+inside a Streamlit script run. Each job:
+  * holds <out_dir>/.jobs/<dataset>.lock (flock / msvcrt lock) while it
+    runs. A dataset whose lock is held by another job, another dashboard
+    process or process_data.py (which waits for the lock) is skipped, so
+    it is never reprocessed twice at once. The OS drops the lock if the
+    process dies.
+  * keeps <out_dir>/.jobs/<dataset>.json up to date: state (queued,
+    running, done, failed, skipped), current stage, progress 0..1,
+    timestamps and the error. Any process can poll it.
+
+Outputs are replaced atomically (outputs.write_json_atomic), so readers
+keep seeing the last good summary until a job's new one is complete.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from outputs import write_json_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOBS_SUBDIR = '.jobs'
+ACTIVE_STATES = ('queued', 'running')
+# progress is written to the status file in steps of at least this much
+PROGRESS_STEP = 0.02
+
+
+def jobs_dir(out_dir):
+    return os.path.join(out_dir, JOBS_SUBDIR)
+
+
+def status_path(out_dir, dataset_name):
+    return os.path.join(jobs_dir(out_dir), f"{dataset_name}.json")
+
+
+def read_status(out_dir, dataset_name):
+    try:
+        with open(status_path(out_dir, dataset_name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def pid_alive(pid):
+    if fcntl is None:  # no cheap check on Windows: trust the status file
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DatasetLock:
+    """Exclusive lock on <out_dir>/.jobs/<dataset>.lock. As a context
+    manager it waits for the lock (the CLI does that); jobs use
+    acquire(), which gives up at once."""
+
+    def __init__(self, out_dir, dataset_name):
+        self.path = os.path.join(jobs_dir(out_dir), f"{dataset_name}.lock")
+        self._fd = None
+
+    def acquire(self, blocking=False):
+        """True if the lock was taken, False if someone else holds it."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        if not self.acquire(blocking=True):
+            raise OSError(f"Could not lock {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def held_elsewhere(self):
+        """True if another job holds the lock right now."""
+        if not self.acquire():
+            return True
+        self.release()
+        return False
+
+
+class JobStatus:
+    """The status file of one job, rewritten as the job moves along."""
+
+    def __init__(self, out_dir, dataset_name):
+        self.path = status_path(out_dir, dataset_name)
+        self.data = {'dataset': dataset_name, 'state': 'queued', 'stage': None, 'progress': 0.0,
+                     'pid': os.getpid(), 'submitted': time.time(), 'started': None, 'finished': None,
+                     'error': None}
+        self.save()
+
+    def update(self, **fields):
+        self.data.update(fields)
+        self.save()
+
+    def progress(self, stage, fraction):
+        """Pipeline progress callback; only writes when the stage changes or
+        progress moved by PROGRESS_STEP."""
+        if stage != self.data['stage'] or fraction - self.data['progress'] >= PROGRESS_STEP or fraction >= 1:
+            self.update(stage=stage, progress=round(fraction, 3))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_json_atomic(self.path, self.data)
+
+
+class JobRunner:
+    """Runs target(data_dir, out_dir, progress) for datasets in the background.
+
+    target reprocesses one dataset into out_dir, calling progress(stage,
+    fraction) as it goes; it runs with the dataset's lock held.
+    """
+
+    def __init__(self, out_dir, target, max_workers=1):
+        self.out_dir = out_dir
+        self.target = target
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reprocess')
+        self._lock = threading.Lock()
+        self._futures = {}
+        # dataset -> key of the inputs its last job failed on, so a broken
+        # dataset isn't resubmitted on every page load
+        self._failed = {}
+
+    def submit(self, data_dir, key=None, force=False):
+        """Queue a job for data_dir; False if one is already queued or
+        running (here or in another process), or if the last job failed
+        on the same inputs key (unless force)."""
+        name = os.path.basename(os.path.normpath(data_dir))
+        with self._lock:
+            future = self._futures.get(name)
+            if future is not None and not future.done():
+                return False
+            if not force and key is not None and self._failed.get(name) == key:
+                return False
+            if DatasetLock(self.out_dir, name).held_elsewhere():
+                return False
+            status = JobStatus(self.out_dir, name)
+            self._futures[name] = self._pool.submit(self._run, data_dir, name, status, key)
+            return True
+
+    def _run(self, data_dir, name, status, key):
+        lock = DatasetLock(self.out_dir, name)
+        if not lock.acquire():
+            status.update(state='skipped', finished=time.time(), error='another job holds the lock')
+            return
+        try:
+            status.update(state='running', started=time.time())
+            self.target(data_dir, self.out_dir, status.progress)
+        except Exception as e:
+            self._failed[name] = key
+            status.update(state='failed', finished=time.time(), error=str(e))
+        else:
+            self._failed.pop(name, None)
+            status.update(state='done', stage=None, progress=1.0, finished=time.time())
+        finally:
+            lock.release()
+
+    def statuses(self):
+        """{dataset: status dict} for every job that wrote a status file.
+        A job left 'running' by a process that died (its lock is free and
+        no job of ours runs it) is reported as failed."""
+        result = {}
+        if not os.path.isdir(jobs_dir(self.out_dir)):
+            return result
+        for f in sorted(os.listdir(jobs_dir(self.out_dir))):
+            if not f.endswith('.json'):
+                continue
+            status = read_status(self.out_dir, f[:-len('.json')])
+            if status is None:
+                continue
+            name = status['dataset']
+            with self._lock:
+                ours = name in self._futures and not self._futures[name].done()
+            if status['state'] in ACTIVE_STATES and self._interrupted(status, ours):
+                status = dict(status, state='failed', error='job was interrupted')
+            result[name] = status
+        return result
+
+    def _interrupted(self, status, ours):
+        if status['pid'] == os.getpid():
+            return not ours
+        if status['state'] == 'running':
+            return not DatasetLock(self.out_dir, status['dataset']).held_elsewhere()
+        return not pid_alive(status['pid'])
+
+    def active(self):
+        """Status dicts of the queued and running jobs."""
+        return [s for s in self.statuses().values() if s['state'] in ACTIVE_STATES]
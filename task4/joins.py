@@ -0,0 +1,70 @@
+"""Order-side joins shared by process_data.py and bookstore_analytics.py.
+
+Orders repeat the same user and book ids many times. Each key column is
+factorized once, so str() and the hash lookups run once per distinct id,
+not once per row. Rows are then filled by a positional take
+(Index.get_indexer on the distinct keys). user_id, cluster_id and book_id
+come back as Categoricals over the string keys: same values, and the same
+CSV text, as the old astype(str) + map/merge columns.
+"""
+import numpy as np
+import pandas as pd
+
+MISSING = -1
+
+
+def encode_keys(values):
+    """(codes, categories) for a key column; categories are the distinct
+    values as strings, codes are -1 for missing values."""
+    codes, uniques = pd.factorize(values)
+    # distinct values can share a string form (1 and '1'); merge those
+    str_codes, keys = pd.factorize(pd.Index(uniques, dtype=object).astype(str))
+    return take(str_codes, codes, MISSING), pd.Index(keys, dtype=object)
+
+
+def take(values, codes, fill):
+    """values[codes] with fill wherever codes is -1."""
+    out = np.empty(len(values) + 1, dtype=values.dtype)
+    out[:-1] = values
+    out[-1] = fill
+    return out[codes]
+
+
+def as_categorical(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+
+def attach_clusters(df_orders, mapping):
+    """Stringified user_id plus cluster_id (the user's cluster, or the user
+    id itself when the user isn't in mapping)."""
+    user_codes, user_keys = encode_keys(df_orders['user_id'])
+    clusters = pd.Series(user_keys, dtype=object).map(mapping)
+    clusters = clusters.fillna(pd.Series(user_keys, dtype=object))
+    cluster_codes, cluster_keys = pd.factorize(clusters)
+    df_orders['user_id'] = as_categorical(user_codes, user_keys)
+    df_orders['cluster_id'] = as_categorical(take(cluster_codes, user_codes, MISSING), cluster_keys)
+    return df_orders
+
+
+def join_books(df_orders, df_books, author_index):
+    """Add the book's authors list and author_set_id to every order.
+
+    Equivalent to a left merge on the stringified book_id. When df_books
+    repeats a book_id (a merge would then duplicate orders) the merge
+    itself is used.
+    """
+    book_index = pd.Index(df_books['book_id'].astype(str), dtype=object)
+    if not book_index.is_unique:
+        df_orders['book_id'] = df_orders['book_id'].astype(str)
+        book_authors = df_books[['book_id', 'authors']].assign(author_set_id=author_index.book_set_ids)
+        df_orders = df_orders.merge(book_authors, on='book_id', how='left')
+        df_orders['author_set_id'] = df_orders['author_set_id'].fillna(author_index.NO_SET).astype('int64')
+        return df_orders
+
+    book_codes, book_keys = encode_keys(df_orders['book_id'])
+    positions = take(book_index.get_indexer(book_keys), book_codes, MISSING)
+    authors = df_books['authors'].to_numpy(dtype=object)
+    df_orders['book_id'] = as_categorical(book_codes, book_keys)
+    df_orders['authors'] = take(authors, positions, np.nan)
+    df_orders['author_set_id'] = take(author_index.book_set_ids, positions, author_index.NO_SET)
+    return df_orders
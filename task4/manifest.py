@@ -0,0 +1,141 @@
+"""Per-dataset manifests for incremental processing.
+
+After a dataset is processed, a ``<DATASET>_manifest.json`` file is written
+next to its outputs. It records:
+  * the processor that produced them and that processor's version
+  * the parameters the run used (EUR rate, ...)
+  * the size, mtime and sha256 of users.csv / orders.parquet / books.yaml
+  * the output files that were written
+
+On the next run a dataset is reused as long as its processor, parameters and
+input hashes all match and every recorded output is still on disk. Before a
+dataset is processed again its manifest is invalidated (recorded with no
+outputs), so a run that dies halfway never leaves a manifest vouching for
+partly rewritten outputs. File
+hashes are only recomputed when a file's size or mtime changed. If only the
+mtime changed (e.g. after a touch or a re-checkout), the content is still
+the same and the dataset is reused.
+"""
+import os
+import json
+import hashlib
+
+from outputs import write_json_atomic
+
+MANIFEST_VERSION = 1
+INPUT_FILES = ('users.csv', 'orders.parquet', 'books.yaml')
+HASH_CHUNK = 1 << 20
+
+
+def manifest_path(out_dir, dataset_name):
+    return os.path.join(out_dir, f"{dataset_name}_manifest.json")
+
+
+def summary_path(out_dir, dataset_name):
+    return os.path.join(out_dir, f"{dataset_name}_summary.json")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_fingerprint(path, previous=None):
+    """Size, mtime and sha256 of one file; the hash is reused from previous
+    when size and mtime are unchanged."""
+    st = os.stat(path)
+    entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if previous and previous.get('size') == entry['size'] and previous.get('mtime_ns') == entry['mtime_ns']:
+        entry['sha256'] = previous['sha256']
+    else:
+        entry['sha256'] = file_sha256(path)
+    return entry
+
+
+def load_manifest(out_dir, dataset_name):
+    try:
+        with open(manifest_path(out_dir, dataset_name), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('manifest_version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def processor_name(processor):
+    """'process_data/5' -> 'process_data'."""
+    return processor.split('/', 1)[0]
+
+
+def written_by_other(out_dir, dataset_name, processor):
+    """True when the dataset's outputs in out_dir were recorded by a
+    different processor (any version of processor itself doesn't count)."""
+    previous = load_manifest(out_dir, dataset_name)
+    return (previous is not None and isinstance(previous.get('processor'), str)
+            and processor_name(previous['processor']) != processor_name(processor))
+
+
+def dataset_manifest(data_dir, processor, params, previous=None):
+    """Manifest describing the current inputs of data_dir (no outputs yet)."""
+    dataset_name = os.path.basename(os.path.normpath(data_dir))
+    previous_inputs = (previous or {}).get('inputs', {})
+    return {
+        'manifest_version': MANIFEST_VERSION,
+        'dataset': dataset_name,
+        'processor': processor,
+        'params': params,
+        'inputs': {fn: file_fingerprint(os.path.join(data_dir, fn), previous_inputs.get(fn))
+                   for fn in INPUT_FILES},
+        'outputs': [],
+    }
+
+
+def same_inputs(a, b):
+    return (a['processor'] == b['processor'] and a['params'] == b['params']
+            and {fn: e['sha256'] for fn, e in a['inputs'].items()}
+            == {fn: e['sha256'] for fn, e in b['inputs'].items()})
+
+
+def check_dataset(data_dir, out_dir, processor, params):
+    """Return (summary, manifest) for data_dir.
+
+    summary is the stored ``*_summary.json`` when the dataset is unchanged
+    since the last run and its outputs are intact, otherwise None. manifest
+    describes the current inputs. Pass it to write_manifest once the
+    dataset has been processed again.
+    """
+    dataset_name = os.path.basename(os.path.normpath(data_dir))
+    previous = load_manifest(out_dir, dataset_name)
+    manifest = dataset_manifest(data_dir, processor, params, previous)
+    if previous is None or not same_inputs(previous, manifest):
+        return None, manifest
+    outputs = previous.get('outputs', [])
+    if not outputs or not all(os.path.exists(os.path.join(out_dir, fn)) for fn in outputs):
+        return None, manifest
+    try:
+        with open(summary_path(out_dir, dataset_name), 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None, manifest
+    if manifest['inputs'] != previous['inputs']:
+        # content unchanged but mtimes moved: remember them to skip rehashing
+        write_manifest(out_dir, manifest, outputs)
+    return summary, manifest
+
+
+def write_manifest(out_dir, manifest, outputs):
+    """Record the outputs (paths or file names inside out_dir) and save."""
+    manifest = dict(manifest, outputs=sorted({os.path.basename(p) for p in outputs}))
+    write_json_atomic(manifest_path(out_dir, manifest['dataset']), manifest)
+    return manifest
+
+
+def invalidate_manifest(out_dir, manifest):
+    """Record manifest with no outputs before rewriting its dataset's
+    outputs; write_manifest once they are all written makes it valid again."""
+    os.makedirs(out_dir, exist_ok=True)
+    return write_manifest(out_dir, manifest, [])
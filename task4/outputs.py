@@ -0,0 +1,127 @@
+"""Writing and reading the per-dataset output tables.
+
+Tables are written as CSV (the default) or as Parquet. The Parquet files
+are zstd-compressed, keep their dtypes and carry row-group statistics:
+  * book_id / cluster_id / user_id are dictionary-encoded
+  * authors / author_set are list<string>
+  * date is a date32 column
+
+read_table prefers the Parquet file when one exists and reads only the
+requested columns. JSON outputs (summaries, manifests) go through
+write_json_atomic so a reader never sees a half-written file.
+"""
+import os
+import json
+
+import pandas as pd
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+DICTIONARY_COLUMNS = ('book_id', 'cluster_id', 'user_id')
+LIST_COLUMNS = ('authors', 'author_set')
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+
+def table_path(out_prefix, name, fmt):
+    return f"{out_prefix}_{name}.{fmt}"
+
+
+def to_arrow_table(df):
+    """Arrow table for df with the typed columns described above."""
+    import pyarrow as pa
+
+    arrays = {}
+    for col in df.columns:
+        s = df[col]
+        if col in LIST_COLUMNS:
+            values = [list(v) if isinstance(v, (list, tuple)) else None for v in s.tolist()]
+            arrays[col] = pa.array(values, type=pa.list_(pa.string()))
+        elif col == 'date':
+            dates = pd.to_datetime(s, errors='coerce').dt.date
+            arrays[col] = pa.array(dates, from_pandas=True, type=pa.date32())
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            arrays[col] = pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0, type=pa.int32()),
+                pa.array(s.cat.categories.astype(str), type=pa.string()))
+        elif col in DICTIONARY_COLUMNS:
+            values = s.where(s.isna(), s.astype(str))
+            arrays[col] = pa.array(values, from_pandas=True, type=pa.string()).dictionary_encode()
+        else:
+            try:
+                arrays[col] = pa.array(s, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # mixed-type object column (e.g. yaml fields holding ints and strings)
+                arrays[col] = pa.array(s.where(s.isna(), s.astype(str)), from_pandas=True, type=pa.string())
+    return pa.table(arrays)
+
+
+class TableWriter:
+    """Write one output table, either in one go or batch by batch.
+
+    Opening a writer removes the same table in the other format, so a
+    reader never picks up a stale file from an earlier run.
+    """
+
+    def __init__(self, out_prefix, name, fmt='csv'):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {fmt!r}, expected one of {OUTPUT_FORMATS}")
+        self.fmt = fmt
+        self.path = table_path(out_prefix, name, fmt)
+        self.rows = 0
+        self._parquet = None
+        for other in OUTPUT_FORMATS:
+            if other != fmt and os.path.exists(table_path(out_prefix, name, other)):
+                os.remove(table_path(out_prefix, name, other))
+
+    def write(self, df):
+        if self.fmt == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow.parquet as pq
+            table = to_arrow_table(df)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema, compression=PARQUET_COMPRESSION,
+                                                 write_statistics=True)
+            self._parquet.write_table(table.cast(self._parquet.schema), row_group_size=PARQUET_ROW_GROUP_SIZE)
+        self.rows += len(df)
+
+    def close(self, empty=None):
+        """Finish the file; empty is written when no batch came in."""
+        if self.rows == 0:
+            self.write(pd.DataFrame() if empty is None else empty)
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        return self.path
+
+
+def write_table(df, out_prefix, name, fmt='csv'):
+    writer = TableWriter(out_prefix, name, fmt)
+    writer.write(df)
+    return writer.close()
+
+
+def write_json_atomic(path, data):
+    """Write data as JSON to a temp file next to path, then rename it over
+    path: readers see the old file or the new one, never half of one."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def read_table(out_prefix, name, columns=None):
+    """Read an output table, Parquet first; None if neither file exists."""
+    parquet = table_path(out_prefix, name, 'parquet')
+    if os.path.exists(parquet):
+        return pd.read_parquet(parquet, columns=columns)
+    csv = table_path(out_prefix, name, 'csv')
+    if os.path.exists(csv):
+        return pd.read_csv(csv, usecols=columns)
+    return None
@@ -0,0 +1,176 @@
+"""Memoized column parsing keyed by distinct raw values.
+
+Order feeds repeat the same few thousand price strings millions of times.
+ParseCache factorizes a column, parses only the distinct values it has not
+seen yet (in one batch call, or in chunks) and broadcasts the results back
+to the rows through a typed lookup table.
+A parser that labels its values (timestamps.TimestampParser.parse_labeled)
+gets its statistics recorded per row, cached values included, rather than
+per distinct value it was handed.
+Parsed values are kept in a bounded LRU so one cache can be shared by every
+dataset in a run.
+"""
+from collections import OrderedDict
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from prices import DEFAULT_EUR_RATE, parse_price_series
+from timestamps import TimestampParser
+
+DEFAULT_MAXSIZE = 100000
+
+
+class ParseCache:
+    def __init__(self, parse_batch, maxsize=DEFAULT_MAXSIZE):
+        """parse_batch takes a Series of raw values and returns a Series of
+        parsed values of the same length."""
+        self.parse_batch = parse_batch
+        # labels of the cached values, for parsers that keep per-row stats
+        self._labels = {} if hasattr(parse_batch, 'parse_labeled') else None
+        self._na_label = None
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._values = OrderedDict()
+        self._na_value = None
+
+    def __len__(self):
+        return len(self._values)
+
+    def parse(self, srs, chunk_size=None):
+        """Parsed values for srs. With chunk_size, distinct values are
+        handed to parse_batch that many at a time, which bounds the
+        parser's temporary memory on high-cardinality columns."""
+        codes, uniques = pd.factorize(srs)
+        cache = self._values
+        # iterated lazily, so distinct values aren't all boxed into a list at once
+        hit = np.fromiter((raw in cache for raw in uniques), dtype=bool, count=len(uniques))
+        todo = np.flatnonzero(~hit)
+        self.hits += len(uniques) - len(todo)
+        self.misses += len(todo)
+
+        hit_rows = np.flatnonzero(hit)
+        hit_values = []
+        for raw in uniques[hit_rows]:
+            cache.move_to_end(raw)
+            hit_values.append(cache[raw])
+        # read before inserting, which may evict them
+        hit_labels = None if self._labels is None else np.fromiter(
+            (self._labels[raw] for raw in uniques[hit_rows]), dtype=object, count=len(hit_rows))
+        parsed = new_labels = None
+        seconds = {}
+        if len(todo):
+            step = chunk_size or len(todo)
+            batches = [uniques[todo[k:k + step]] for k in range(0, len(todo), step)]
+            if self._labels is None:
+                parsed = np.concatenate([self.parse_batch(pd.Series(batch)).to_numpy() for batch in batches])
+            else:
+                results = [self.parse_batch.parse_labeled(pd.Series(batch)) for batch in batches]
+                parsed = np.concatenate([values.to_numpy() for values, _, _ in results])
+                new_labels = np.concatenate([labels for _, labels, _ in results])
+                for _, _, spent in results:
+                    for key, t in spent.items():
+                        seconds[key] = seconds.get(key, 0.0) + t
+            self._insert(uniques[todo], parsed, new_labels)
+
+        if self._na_value is None:
+            # the result for missing values; a probe, so it is kept out of the parser's stats
+            probe = pd.Series([None], dtype=object)
+            if self._labels is None:
+                self._na_value = self.parse_batch(probe).to_numpy()[0]
+            else:
+                values, labels, _ = self.parse_batch.parse_labeled(probe)
+                self._na_value, self._na_label = values.to_numpy()[0], labels[0]
+        if self._labels is not None:
+            self._record_rows(codes, len(uniques), hit_rows, hit_labels, todo, new_labels, seconds)
+        # a typed table rather than one object array of every value; its
+        # dtype is the one np.array would pick for all the values together
+        known = np.array(hit_values + [self._na_value])
+        dtypes = [known.dtype] if parsed is None else [known.dtype, parsed.dtype]
+        table = np.empty(len(uniques) + 1, dtype=np.result_type(*dtypes))
+        table[hit_rows] = known[:-1]
+        if parsed is not None:
+            table[todo] = parsed
+        # code -1 (missing) picks up the trailing NA result
+        table[-1] = known[-1]
+        return pd.Series(table[codes], index=srs.index)
+
+    def _record_rows(self, codes, n_uniques, hit_rows, hit_labels, todo, new_labels, seconds):
+        """Hand the parser each distinct value's label weighted by the rows
+        holding it, so its stats count rows whatever was cached."""
+        labels = np.empty(n_uniques + 1, dtype=object)
+        labels[hit_rows] = hit_labels
+        if new_labels is not None:
+            labels[todo] = new_labels
+        labels[-1] = self._na_label
+        # code -1 (missing) is counted in the trailing slot, like the lookup table
+        weights = np.bincount(np.where(codes < 0, n_uniques, codes), minlength=n_uniques + 1)
+        self.parse_batch.record(labels, weights, seconds)
+
+    def _insert(self, keys, values, labels=None):
+        """Cache newly parsed values, evicting the least recently used.
+        When the new values alone fill the cache, only the ones that would
+        survive eviction are inserted."""
+        cache = self._values
+        if len(keys) >= self.maxsize:
+            self.evictions += len(cache) + len(keys) - self.maxsize
+            cache.clear()
+            if self._labels is not None:
+                self._labels.clear()
+            start = len(keys) - self.maxsize
+            keys, values = keys[start:], values[start:]
+            labels = None if labels is None else labels[start:]
+        for raw, v in zip(keys, values):
+            cache[raw] = v
+        if labels is not None:
+            self._labels.update(zip(keys, labels))
+        while len(cache) > self.maxsize:
+            raw, _ = cache.popitem(last=False)
+            if self._labels is not None:
+                del self._labels[raw]
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'size': len(self._values),
+            'maxsize': self.maxsize,
+        }
+
+
+def stats_delta(before, after):
+    """Counters accumulated between two stats() snapshots."""
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'evictions': after['evictions'] - before['evictions'],
+    }
+
+
+def sum_stats(deltas):
+    """Add up stats_delta() results, e.g. from several datasets."""
+    total = {'hits': 0, 'misses': 0, 'evictions': 0}
+    for delta in deltas:
+        for key in total:
+            total[key] += delta.get(key, 0)
+    lookups = total['hits'] + total['misses']
+    total['hit_rate'] = round(total['hits'] / lookups, 4) if lookups else 0.0
+    return total
+
+
+def order_parse_caches(eur_rate=DEFAULT_EUR_RATE, price_fallback=float("nan"), maxsize=DEFAULT_MAXSIZE):
+    """One cache per parsed orders column, to be shared across datasets."""
+    return {
+        'unit_price': ParseCache(partial(parse_price_series, eur_rate=eur_rate, fallback=price_fallback), maxsize),
+        'timestamp': ParseCache(TimestampParser(), maxsize),
+    }
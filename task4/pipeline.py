@@ -0,0 +1,722 @@
+"""The ETL pipeline behind process_data.py (CLI) and bookstore_analytics.py
+(Streamlit dashboard).
+
+A Pipeline takes one DATA folder through six stages:
+
+  load       users.csv, books.yaml and orders.parquet (whole or in batches)
+  normalize  order columns, quantities, prices and timestamps; book ids
+  reconcile  user deduplication into clusters
+  join       cluster ids and book authors onto the orders
+  aggregate  revenue, author and customer totals -> summary metrics;
+             the revenue cube (cube.py) when tables are written
+  write      output tables, cube tables and <dataset>_summary.json
+
+Each stage has start(run), run once in stage order; process(run, df_orders),
+run on the whole orders table or on every streamed batch; and finish(run),
+run once after the orders. Pipeline.run returns the DatasetRun; its
+profile (profiling.PipelineProfile) has per-stage wall time, rows in/out
+and peak RSS growth, and is also written to <dataset>_profile.json.
+
+The two front ends only differ in options: the dashboard falls back to a
+typical book price for unparseable prices, uses its own author extractor,
+ranks authors by books sold instead of by catalogue entries and writes no
+tables besides the summary.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregations import UNKNOWN_AUTHOR, OrderTotals, quantity_by_author, to_cents, top_ties
+from books import CACHE_SUBDIR, AuthorIndex, load_books
+from cube import CubeBuilder, cube_files
+from joins import attach_clusters, join_books
+from manifest import INPUT_FILES
+from outputs import (OUTPUT_FORMATS, PARQUET_ROW_GROUP_SIZE, TableWriter, table_path, write_json_atomic,
+                     write_table)
+from parse_cache import order_parse_caches, stats_delta
+from profiling import PipelineProfile
+from schema_registry import SAMPLE_ROWS, SchemaRegistry, column_layout, pick_col, registry_path
+from timestamps import CLEAN, FALLBACK
+from topk import SpaceSaving, top_k
+from user_reconciliation import reconcile_users
+from user_store import UserClusterStore, user_store_path
+
+OUTPUT_TABLES = ['orders_enriched', 'users_reconciled', 'books_processed', 'daily_revenue', 'top5_days']
+AUTHOR_RANKINGS = ('catalog', 'sales')
+ENGINES = ('pandas', 'polars')
+# narrower order columns of the lean_memory mode (same CSV text)
+LEAN_DATE = 'date32[pyarrow]'
+# lean_memory streams orders in batches of this many rows unless told otherwise:
+# only streamed runs keep the frames under profiling.MEMORY_TARGET_RATIO
+LEAN_BATCH_SIZE = 100000
+LEAN_DATE_PARTS = {'year': 'Int16', 'month': 'Int8', 'day': 'Int8'}
+TOP_K = 5
+
+
+def output_files(dataset_name, output_format='csv'):
+    return ([f"{dataset_name}_{t}.{output_format}" for t in OUTPUT_TABLES] + cube_files(dataset_name)
+            + [f"{dataset_name}_summary.json"])
+
+
+def read_parquet_with_hint(path):
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        msg = str(e)
+        if "pyarrow" in msg or "fastparquet" in msg or "parquet" in msg.lower():
+            raise ImportError(
+                "Reading parquet failed. Install a parquet engine locally (pyarrow):\n"
+                "  pip install pyarrow\n\n"
+                f"Original error: {e}"
+            )
+        raise
+
+
+def parquet_num_rows(path):
+    """Row count from the Parquet footer, None without pyarrow."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def parquet_data_bytes(path):
+    """Uncompressed size of the data in a Parquet file, from its footer
+    (the file size without pyarrow)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return os.path.getsize(path)
+    metadata = pq.ParquetFile(path).metadata
+    return sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+
+
+def input_size_mb(run):
+    """Raw size of a dataset's inputs: users.csv and books.yaml on disk,
+    orders.parquet uncompressed."""
+    size = sum(os.path.getsize(run.input_path(f)) for f in INPUT_FILES if f != 'orders.parquet')
+    return (size + parquet_data_bytes(run.input_path('orders.parquet'))) / (1024 * 1024)
+
+
+def iter_parquet_batches(path, batch_size):
+    """Yield orders.parquet as DataFrames of at most batch_size rows, one
+    row group slice at a time, so the whole file is never in memory."""
+    try:
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+    except ImportError as e:
+        raise ImportError(
+            "Streaming parquet needs pyarrow:\n"
+            "  pip install pyarrow\n\n"
+            f"Original error: {e}"
+        )
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def narrow_int(values, dtype=np.int32):
+    """values as dtype when every value fits, else unchanged."""
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        return values
+    return values.astype(dtype)
+
+
+# bump whenever extract_authors_from_book changes, so books sidecars
+# (books.load_books) holding the old authors lists are not read
+AUTHORS_VERSION = 'pipeline.extract_authors_from_book/1'
+
+
+def extract_authors_from_book(book):
+    """Extract authors from book data - handle different field names and formats"""
+    # Try different possible author field names
+    author_fields = [':author', 'author', 'authors', 'writer', 'writers']
+
+    for field in author_fields:
+        if field in book:
+            authors_data = book[field]
+            if isinstance(authors_data, str):
+                # Handle string formats
+                if ',' in authors_data:
+                    return [a.strip() for a in authors_data.split(',') if a.strip()]
+                elif '&' in authors_data:
+                    return [a.strip() for a in authors_data.split('&') if a.strip()]
+                elif ';' in authors_data:
+                    return [a.strip() for a in authors_data.split(';') if a.strip()]
+                else:
+                    return [authors_data.strip()]
+            elif isinstance(authors_data, list):
+                return [str(a).strip() for a in authors_data if str(a).strip()]
+            elif authors_data:
+                return [str(authors_data).strip()]
+
+    # If no author field found, try to extract from other fields
+    for key, value in book.items():
+        if 'author' in key.lower() and isinstance(value, str):
+            return [value.strip()]
+
+    return [UNKNOWN_AUTHOR]
+
+
+class DatasetRun:
+    """Everything one dataset picks up on its way through a Pipeline."""
+
+    def __init__(self, data_dir, out_dir, log=print):
+        self.data_dir = data_dir
+        self.out_dir = out_dir
+        self.dataset_name = os.path.basename(os.path.normpath(data_dir))
+        self.out_prefix = os.path.join(out_dir, self.dataset_name)
+        self.log = log
+        self.profile = None
+        self.summary = {}
+        self.rows = 0
+        # orders in the input, when known before they are read (for progress)
+        self.total_rows = None
+        self.total_revenue = 0.0
+        self.df_users = self.df_orders = self.df_books = None
+
+    def input_path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    @property
+    def timings(self):
+        """{stage name: seconds}"""
+        return self.profile.timings()
+
+
+class Stage:
+    """Base class: a stage only overrides the hooks it needs."""
+
+    name = None
+
+    def start(self, run):
+        pass
+
+    def process(self, run, df_orders):
+        return df_orders
+
+    def finish(self, run):
+        pass
+
+
+class LoadStage(Stage):
+    name = 'load'
+
+    def __init__(self, extract_authors, batch_size=None, authors_version=AUTHORS_VERSION):
+        self.extract_authors = extract_authors
+        self.batch_size = batch_size
+        self.authors_version = authors_version
+
+    def start(self, run):
+        if not all(os.path.exists(run.input_path(f)) for f in INPUT_FILES):
+            raise FileNotFoundError(f"Dataset {run.dataset_name} missing one of users.csv / orders.parquet / books.yaml")
+        if run.profile.memory:
+            run.profile.record_input(input_size_mb(run))
+        run.df_users = pd.read_csv(run.input_path('users.csv'), dtype=str)
+        orders = self.load_orders(run)
+        # normalized books with an authors list per book (from the sidecar when the yaml is unchanged)
+        run.df_books, books_source = load_books(run.input_path('books.yaml'), self.extract_authors,
+                                                self.authors_version, os.path.join(run.out_dir, CACHE_SUBDIR))
+
+        run.log(f" users: {run.df_users.shape}")
+        run.log(f" orders: {orders}")
+        run.log(f" books: {run.df_books.shape} from {books_source}")
+        run.log(f" sample authors: {run.df_books['authors'].head(3).tolist() if 'authors' in run.df_books.columns else []}")
+
+    def load_orders(self, run):
+        """Read orders.parquet (unless streaming); returns how, for the log."""
+        if self.batch_size:
+            run.total_rows = parquet_num_rows(run.input_path('orders.parquet'))
+            return f"streaming in batches of {self.batch_size:,} rows"
+        run.df_orders = read_parquet_with_hint(run.input_path('orders.parquet'))
+        run.total_rows = len(run.df_orders)
+        return run.df_orders.shape
+
+    def order_frames(self, run):
+        """The orders to push through the stages: the whole table, or its batches."""
+        if self.batch_size:
+            yield from iter_parquet_batches(run.input_path('orders.parquet'), self.batch_size)
+        else:
+            df_orders, run.df_orders = run.df_orders, None
+            yield df_orders
+
+    def finish(self, run):
+        if self.batch_size:
+            run.log(f" orders: {run.rows:,} rows streamed")
+
+
+class NormalizeStage(Stage):
+    name = 'normalize'
+
+    # distinct raw values parsed at a time in lean mode
+    LEAN_PARSE_CHUNK = 65536
+
+    def __init__(self, parse_caches, price_fallback, lean=False, schema_registry=None):
+        self.parse_caches = parse_caches
+        self.price_fallback = price_fallback
+        self.lean = lean
+        self.parse_chunk = self.LEAN_PARSE_CHUNK if lean else None
+        self.schema_registry = schema_registry
+
+    def start(self, run):
+        run.cache_before = {name: cache.stats() for name, cache in self.parse_caches.items()}
+        run.schemas = self.schema_registry or SchemaRegistry(registry_path(os.path.join(run.out_dir, CACHE_SUBDIR)))
+        run.order_schemas = {}
+        books = run.schemas.resolve('books', column_layout(run.df_books.dtypes.items()))
+        run.df_books = run.df_books.rename(columns=books.renames()).astype(books.casts)
+        run.log(f" schema: {books.describe()}")
+        run.author_index = AuthorIndex(run.df_books['authors'] if 'authors' in run.df_books.columns else [])
+
+    def order_schema(self, run, layout, sample):
+        """schema_registry.ResolvedSchema of an orders layout, resolved once
+        per run (streamed batches normally share one)."""
+        key = tuple(map(tuple, layout))
+        if key not in run.order_schemas:
+            schema = run.schemas.resolve('orders', layout, sample, lambda: known_ids(run))
+            run.order_schemas[key] = schema
+            run.log(f" schema: {schema.describe()}")
+        return run.order_schemas[key]
+
+    def process(self, run, df_orders):
+        schema = self.order_schema(run, column_layout(df_orders.dtypes.items()),
+                                   lambda: df_orders.head(SAMPLE_ROWS))
+        casts = schema.casts
+        if self.lean and 'quantity' in casts and np.dtype(schema.source_dtype('quantity')).itemsize <= 4:
+            casts = dict(casts, quantity='int32')
+        # renames and the casts the layout allows in one pass
+        df_orders = df_orders.rename(columns=schema.renames()).astype(casts)
+
+        # ensure numeric quantity
+        if 'quantity' not in df_orders.columns:
+            df_orders['quantity'] = 1
+        elif 'quantity' not in casts:
+            df_orders['quantity'] = pd.to_numeric(df_orders['quantity'], errors='coerce').fillna(0).astype(int)
+            if self.lean:
+                df_orders['quantity'] = narrow_int(df_orders['quantity'])
+        elif self.lean and df_orders['quantity'].dtype != np.int32:
+            df_orders['quantity'] = narrow_int(df_orders['quantity'])
+
+        # price normalization
+        if 'unit_price' in df_orders.columns:
+            with run.profile.part(self.name, 'prices'):
+                df_orders['unit_price_clean'] = self.parse_caches['unit_price'].parse(df_orders['unit_price'],
+                                                                                      self.parse_chunk)
+        else:
+            df_orders['unit_price_clean'] = 0.0 if pd.isna(self.price_fallback) else self.price_fallback
+
+        # shares unit_price_clean's buffer until either is modified (copy-on-write)
+        df_orders['unit_price_usd'] = df_orders['unit_price_clean']
+        paid_price = pd.to_numeric(df_orders['quantity'] * df_orders['unit_price_usd'], errors='coerce').fillna(0.0)
+        run.total_revenue += float(paid_price.sum())
+        df_orders['paid_price'] = paid_price.round(2)
+
+        # timestamps
+        if 'timestamp_raw' in df_orders.columns:
+            with run.profile.part(self.name, 'timestamps'):
+                df_orders['timestamp_parsed'] = self.parse_caches['timestamp'].parse(df_orders['timestamp_raw'],
+                                                                                     self.parse_chunk)
+        else:
+            df_orders['timestamp_parsed'] = pd.NaT
+
+        timestamps = df_orders['timestamp_parsed'].dt
+        if self.lean:
+            # 4-byte Arrow dates instead of a Python date object per row
+            df_orders['date'] = timestamps.normalize().astype(LEAN_DATE)
+            for part, dtype in LEAN_DATE_PARTS.items():
+                df_orders[part] = getattr(timestamps, part).astype(dtype)
+        else:
+            df_orders['date'] = timestamps.date
+            df_orders['year'] = timestamps.year
+            df_orders['month'] = timestamps.month
+            df_orders['day'] = timestamps.day
+        return df_orders
+
+    def finish(self, run):
+        run.timestamp_formats = self.parse_caches['timestamp'].parse_batch.pop_stats()
+        run.parse_cache = {name: stats_delta(run.cache_before[name], cache.stats())
+                           for name, cache in self.parse_caches.items()}
+        fallback_rows = run.timestamp_formats.get(FALLBACK, {}).get('rows', 0)
+        layouts = [fmt for fmt in run.timestamp_formats if fmt not in (CLEAN, FALLBACK)]
+        ts_seconds = sum(st['seconds'] for st in run.timestamp_formats.values())
+        run.log(f" timestamps: {len(layouts)} layouts, {fallback_rows} rows on the slow path, {ts_seconds:.3f}s")
+        run.log(f" total revenue: ${run.total_revenue:,.2f}")
+
+
+def known_ids(run):
+    """{'user_id' / 'book_id': set of ids as strings} orders can refer to,
+    for finding id columns by their values."""
+    ids = {}
+    user_col = pick_col(run.df_users.columns, ['user_id', 'id'])
+    if user_col:
+        ids['user_id'] = set(run.df_users[user_col].dropna().astype(str))
+    if 'book_id' in run.df_books.columns:
+        ids['book_id'] = set(run.df_books['book_id'].dropna().astype(str))
+    return ids
+
+
+class ReconcileStage(Stage):
+    name = 'reconcile'
+
+    def __init__(self, matcher=None, store=False, users_delta=None):
+        self.matcher = matcher
+        self.store = store
+        self.users_delta = users_delta
+
+    def start(self, run):
+        if self.store:
+            store = UserClusterStore(user_store_path(run.out_dir, run.dataset_name))
+            delta_path = run.input_path(self.users_delta) if self.users_delta else None
+            if delta_path and os.path.exists(delta_path) and not store.is_empty():
+                # only the changed rows are matched; everyone else keeps their stored cluster
+                store.update(pd.read_csv(delta_path, dtype=str))
+                run.df_users, run.mapping, run.clusters = store.assign(run.df_users)
+            else:
+                run.df_users, run.mapping, run.clusters = store.reconcile(run.df_users)
+            run.log(f" user store: {store.stats['new']} new, {store.stats['changed']} changed, "
+                    f"{store.stats['removed']} removed, {store.stats['relinked']} users relinked")
+        else:
+            run.df_users, run.mapping, run.clusters = reconcile_users(run.df_users, matcher=self.matcher)
+
+
+class JoinStage(Stage):
+    name = 'join'
+
+    def __init__(self, lean=False):
+        self.lean = lean
+
+    def process(self, run, df_orders):
+        if 'user_id' in df_orders.columns:
+            df_orders = attach_clusters(df_orders, run.mapping)
+        else:
+            df_orders['cluster_id'] = None
+
+        # join orders with books to get authors and the integer author set id
+        if 'book_id' in df_orders.columns and 'book_id' in run.df_books.columns:
+            df_orders = join_books(df_orders, run.df_books, run.author_index)
+        else:
+            df_orders['authors'] = [[] for _ in range(len(df_orders))]
+            df_orders['author_set_id'] = run.author_index.NO_SET
+
+        if self.lean:
+            df_orders['author_set_id'] = df_orders['author_set_id'].astype(np.int32)
+        df_orders['author_set'] = run.author_index.author_set_column(df_orders['author_set_id'])
+        return df_orders
+
+
+class AggregateStage(Stage):
+    name = 'aggregate'
+
+    def __init__(self, author_ranking='catalog', heavy_hitters=0, cube=False):
+        self.author_ranking = author_ranking
+        self.heavy_hitters = heavy_hitters
+        self.cube = cube
+
+    def start(self, run):
+        run.totals = OrderTotals(run.author_index.author_sets)
+        run.sketches = {}
+        if self.heavy_hitters:
+            run.sketches = {kind: SpaceSaving(self.heavy_hitters) for kind in ('books', 'authors', 'customers')}
+        run.cube = CubeBuilder() if self.cube else None
+
+    def process(self, run, df_orders):
+        run.totals.update(df_orders)
+        self.update_rollups(run, df_orders)
+        return df_orders
+
+    def update_rollups(self, run, df_orders):
+        """Fold enriched orders into the heavy-hitter sketches and the cube."""
+        if run.sketches:
+            run.sketches['books'].update_many(df_orders['book_id'], df_orders['quantity'])
+            author_sales = quantity_by_author(df_orders)
+            run.sketches['authors'].update_many(author_sales.index, author_sales.to_numpy())
+            run.sketches['customers'].update_many(df_orders['cluster_id'], to_cents(df_orders['paid_price'].fillna(0.0)))
+        if run.cube is not None:
+            with run.profile.part(self.name, 'cube'):
+                run.cube.update(df_orders)
+
+    def finish(self, run):
+        totals = run.totals
+        run.daily_revenue = totals.daily_revenue().sort_values('date')
+
+        # earliest date first among equal revenues
+        top5 = pd.DataFrame(top_k(run.daily_revenue.set_index('date')['paid_price'], TOP_K),
+                            columns=['date', 'paid_price'])
+        top5['date'] = pd.to_datetime(top5['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+        top5_records = top5.to_dict(orient='records')
+
+        if self.author_ranking == 'sales':
+            most_popular_authors = popular_by_sales(run)
+        else:
+            most_popular_authors = popular_by_catalog(run)
+        most_popular_sets = [list(author_set) for author_set in top_ties(totals.author_set_quantity())]
+
+        # top customer by cluster spending
+        top_customers = top_k(totals.cluster_spending(), 1)
+        if top_customers:
+            top_cluster, top_total = top_customers[0]
+            top_customer_user_ids = run.clusters.get(top_cluster, [top_cluster])
+            run.log(f" top customer spent: ${top_total:,.2f}")
+        else:
+            top_cluster = None
+            top_total = 0.0
+            top_customer_user_ids = []
+
+        run.summary.update({
+            'dataset': run.dataset_name,
+            'total_revenue': float(run.total_revenue),
+            'top5_days': top5_records,
+            'unique_real_users': int(len(run.clusters)),
+            'unique_author_sets': int(len(run.author_index.author_sets)),
+            'most_popular_author_sets': most_popular_sets,
+            'most_popular_authors': most_popular_authors,
+            'top_customer_cluster_id': top_cluster,
+            'top_customer_user_ids': top_customer_user_ids,
+            'top_customer_total_spent': float(round(top_total, 2)),
+        })
+        if run.sketches:
+            run.summary['heavy_hitters'] = heavy_hitter_records(run.sketches, self.heavy_hitters)
+
+
+def heavy_hitter_records(sketches, capacity):
+    """Top books / authors / customers from the Space-Saving sketches; each
+    value may overstate the true total by up to its error."""
+    def records(kind, key_name, value_name, convert):
+        return [{key_name: key, value_name: convert(count), 'error': convert(error)}
+                for key, count, error in sketches[kind].top(TOP_K)]
+
+    return {
+        'capacity': capacity,
+        'books': records('books', 'book_id', 'quantity', int),
+        'authors': records('authors', 'author', 'quantity', int),
+        'customers': records('customers', 'cluster_id', 'paid_price', lambda cents: cents / 100),
+    }
+
+
+def popular_by_catalog(run):
+    """Authors listed on the most books; the first book's first author when
+    the catalogue names nobody."""
+    author_frequency = run.author_index.catalog_counts()
+    author_frequency = author_frequency[(author_frequency.index != '') & (author_frequency.index != UNKNOWN_AUTHOR)]
+    if not author_frequency.empty:
+        most_popular_authors = top_ties(author_frequency)
+        run.log(f"Most frequent authors: {most_popular_authors} (appears {int(author_frequency.max())} times)")
+        return most_popular_authors
+
+    if len(run.df_books) > 0 and 'authors' in run.df_books.columns:
+        first_book_authors = run.df_books.iloc[0]['authors']
+        if first_book_authors and isinstance(first_book_authors, list):
+            run.log(f"Using first author: {first_book_authors[:1]}")
+            return first_book_authors[:1]
+    return []
+
+
+def popular_by_sales(run):
+    """Authors with the most books sold; by catalogue when nothing sold."""
+    author_sales = run.totals.author_quantity()
+    if author_sales.empty:
+        return popular_by_catalog(run)
+    most_popular_authors = top_ties(author_sales)
+    run.log(f"Most popular author by sales: {most_popular_authors[0]} with {author_sales.max()} books sold")
+    return most_popular_authors
+
+
+class WriteStage(Stage):
+    name = 'write'
+
+    def __init__(self, output_format='csv', write_tables=True, lean=False):
+        self.output_format = output_format
+        self.write_tables = write_tables
+        self.lean = lean
+
+    def start(self, run):
+        run.orders_writer = None
+        if self.write_tables:
+            run.orders_writer = TableWriter(run.out_prefix, 'orders_enriched', self.output_format)
+
+    def process(self, run, df_orders):
+        if run.orders_writer is not None:
+            with run.profile.part(self.name, 'orders_enriched'):
+                # a row group at a time, so only that many rows are ever formatted at once
+                for start in range(0, max(len(df_orders), 1), PARQUET_ROW_GROUP_SIZE):
+                    rows = df_orders.iloc[start:start + PARQUET_ROW_GROUP_SIZE].copy()
+                    run.orders_writer.write(self.output_layout(rows))
+        return df_orders
+
+    def output_layout(self, df_orders):
+        """Fixed types/layouts, so every batch writes its columns the same way."""
+        for col in ('year', 'month', 'day'):
+            df_orders[col] = df_orders[col].astype(LEAN_DATE_PARTS[col] if self.lean else 'Int64')
+        if self.output_format == 'csv':
+            df_orders['timestamp_parsed'] = df_orders['timestamp_parsed'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+        return df_orders
+
+    def finish(self, run):
+        summary = run.summary
+        if self.write_tables:
+            fmt = self.output_format
+            with run.profile.part(self.name, 'orders_enriched'):
+                run.orders_writer.close()
+            tables = {
+                'users_reconciled': run.df_users,
+                'books_processed': run.df_books,
+                'daily_revenue': run.daily_revenue,
+                'top5_days': pd.DataFrame(summary['top5_days']),
+            }
+            for table, df in tables.items():
+                with run.profile.part(self.name, table):
+                    write_table(df, run.out_prefix, table, fmt)
+            # key names stay the same whatever the format; output_format says which one it is
+            summary['output_format'] = fmt
+            summary['daily_rev_path'] = table_path(run.out_prefix, 'daily_revenue', fmt)
+            for table in ('orders_enriched', 'users_reconciled', 'books_processed'):
+                summary[f'{table}_path'] = table_path(run.out_prefix, table, fmt)
+        if run.cube is not None:
+            # always Parquet: the cube is only read back through cube.RevenueCube
+            with run.profile.part(self.name, 'cube'):
+                paths = run.cube.write(run.out_prefix, run.author_index.author_sets)
+            for table, path in paths.items():
+                summary[f'{table}_path'] = path
+        summary['timestamp_formats'] = run.timestamp_formats
+        summary['parse_cache'] = run.parse_cache
+        # atomic, so the dashboards keep reading the previous summary until this one is complete
+        write_json_atomic(run.out_prefix + "_summary.json", summary)
+
+
+class Pipeline:
+    """Stages plus the options they run with; run() processes one DATA folder.
+
+    extract_authors turns a book into its authors list; authors_version
+    names that parsing for the books sidecar (books.load_books), so pass a
+    new one along with a different extractor.
+
+    user_matcher (a user_matching.FuzzyMatcher) replaces the exact 3-of-4
+    user matching with fuzzy matching on canonical keys. user_store=True
+    keeps the clusters in <out_dir>/.cache/<dataset>_users.sqlite
+    (user_store.py) and only re-matches new, changed and removed users;
+    users.csv is still read and digested in full on every run. With
+    users_delta, the name of a CSV of the new and changed users inside
+    the DATA folder, only those rows are digested and matched and the
+    rest of users.csv just looks up its stored clusters; a folder without
+    that file, or an empty store, gets the full reconcile.
+
+    parse_caches can be shared between pipelines so later datasets reuse
+    the parsed prices and timestamps of earlier ones.
+
+    engine='polars' runs the order stages as a lazy polars query plan
+    (polars_engine.py) with the same outputs.
+
+    lean_memory=True keeps the orders in narrower columns (int32 quantity
+    and author_set_id, Arrow date32 dates, Int16/Int8 year/month/day; the
+    CSV text is unchanged), parses distinct prices and timestamps in
+    bounded chunks and, unless batch_size is given (0 loads the orders
+    whole), streams them in batches of LEAN_BATCH_SIZE. memory_report=True
+    records how much memory the frames hold after each stage
+    (profiling.frame_memory_mb) and logs the peak against the raw input
+    size (input_size_mb) and whether it stayed under the target; peaks
+    inside a stage only show in the RSS figures.
+
+    The column roles of each orders / books layout are looked up in the
+    schema registry (schema_registry.py), <out_dir>/.cache/schema_registry.json
+    unless schema_registry names another file, and only inferred for
+    layouts it doesn't know yet.
+    """
+
+    def __init__(self, eur_rate=1.2, parse_caches=None, batch_size=None, output_format='csv',
+                 price_fallback=float('nan'), extract_authors=extract_authors_from_book,
+                 authors_version=AUTHORS_VERSION, author_ranking='catalog', write_tables=True, log=print, cprofile=False, heavy_hitters=0,
+                 progress=None, user_matcher=None, user_store=False, engine='pandas', lean_memory=False,
+                 memory_report=False, schema_registry=None, users_delta=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+        if author_ranking not in AUTHOR_RANKINGS:
+            raise ValueError(f"Unknown author ranking {author_ranking!r}, expected one of {AUTHOR_RANKINGS}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+        if lean_memory and engine != 'pandas':
+            raise ValueError("lean_memory narrows the pandas engine's columns; the polars engine keeps its own")
+        if user_matcher is not None and user_store:
+            raise ValueError("The user store keeps exact-match clusters; it can't be combined with a user_matcher")
+        if users_delta and not user_store:
+            raise ValueError("users_delta is folded into the user store; it needs user_store=True")
+        if parse_caches is None:
+            parse_caches = order_parse_caches(eur_rate, price_fallback=price_fallback)
+        if lean_memory and batch_size is None:
+            batch_size = LEAN_BATCH_SIZE
+        self.log = log
+        self.cprofile = cprofile
+        self.memory_report = memory_report
+        self.progress = progress
+        load, normalize, join, aggregate = LoadStage, NormalizeStage, JoinStage, AggregateStage
+        if engine == 'polars':
+            from polars_engine import POLARS_STAGES
+            load, normalize, join, aggregate = POLARS_STAGES
+        self.loader = load(extract_authors, batch_size, authors_version)
+        self.stages = [
+            self.loader,
+            normalize(parse_caches, price_fallback, lean_memory,
+                      SchemaRegistry(schema_registry) if schema_registry else None),
+            ReconcileStage(user_matcher, user_store, users_delta),
+            join(lean_memory),
+            aggregate(author_ranking, heavy_hitters, cube=write_tables),
+            WriteStage(output_format, write_tables, lean_memory),
+        ]
+
+    def run(self, data_dir, out_dir):
+        """Process one DATA folder; returns its DatasetRun (summary, profile, ...)."""
+        run = self.new_run(data_dir, out_dir)
+        self.run_stages(run, self.stages)
+
+        summary = run.summary
+        run.log(f" stages: {run.profile.report()}")
+        memory = run.profile.memory_report()
+        if memory is not None:
+            run.log(f" memory: raw inputs {memory['input_mb']:.1f} MB (loaded {memory['loaded_mb']:.1f} MB), "
+                    f"frames peak at {memory['data_peak_mb']:.1f} MB ({memory['data_peak_ratio']}x inputs, "
+                    f"{'within' if memory['within_target'] else 'over'} the {memory['target_ratio']:g}x target) "
+                    f"after {memory['data_peak_stage']}, peak RSS +{memory['rss_growth_mb']} MB")
+        run.profile.write(run.out_prefix, run.dataset_name, run.rows)
+        run.log(f"Finished {run.dataset_name}: real_users={summary['unique_real_users']}, "
+                f"author_sets={summary['unique_author_sets']}, popular_authors={summary['most_popular_authors']}")
+        return run
+
+    def new_run(self, data_dir, out_dir):
+        run = DatasetRun(data_dir, out_dir, self.log)
+        run.profile = PipelineProfile([stage.name for stage in self.stages], self.cprofile, self.memory_report)
+        run.log(f"Processing dataset: {run.dataset_name}")
+        os.makedirs(out_dir, exist_ok=True)
+        return run
+
+    def run_stages(self, run, stages):
+        """Push run through stages, a prefix of self.stages starting with
+        the loader (benchmarks stop early to time one stage on its own).
+
+        progress(step, fraction), when given, hears about each step before
+        it runs: stage starts up to 0.1, the orders up to 0.9 (by rows, when
+        the row count is known up front), stage finishes up to 1.0.
+        """
+        profile = run.profile
+        progress = self.progress or (lambda step, fraction: None)
+        for k, stage in enumerate(stages):
+            progress(stage.name, 0.1 * k / len(stages))
+            profile.measure(stage.name, stage.start, run)
+            profile.record_data(stage.name, run.df_users, run.df_books, run.df_orders)
+        progress('orders', 0.1)
+        frames = self.loader.order_frames(run)
+        while True:
+            df_orders = profile.measure(self.loader.name, next, frames, None)
+            if df_orders is None:
+                break
+            profile.record_data(self.loader.name, run.df_users, run.df_books, df_orders)
+            # the loader produces the orders frames the other stages process
+            for stage in stages[1:]:
+                df_orders = profile.measure(stage.name, stage.process, run, df_orders)
+                profile.record_data(stage.name, run.df_users, run.df_books, df_orders)
+            run.rows += len(df_orders)
+            if run.total_rows:
+                progress('orders', 0.1 + 0.8 * min(1.0, run.rows / run.total_rows))
+        for k, stage in enumerate(stages):
+            progress(stage.name, 0.9 + 0.1 * k / len(stages))
+            profile.measure(stage.name, stage.finish, run)
+        return run
@@ -0,0 +1,199 @@
+"""Lazy polars engine for the pipeline (Pipeline(engine='polars'),
+process_data.py --engine polars).
+
+The same stages as pipeline.py, but the orders go through them as one
+polars LazyFrame over orders.parquet instead of pandas frames:
+
+  load       pl.scan_parquet; nothing is read yet
+  normalize  quantity, price and timestamp expressions. Only the distinct
+             raw prices and timestamps are collected; the shared parse
+             caches parse them, so the values are the pandas engine's,
+             and they are joined back as lookup tables
+  join       cluster ids and author set ids joined from small key frames
+  aggregate  daily revenue, author set quantities and cluster spending as
+             group_bys filling the OrderTotals that AggregateStage.finish
+             reads; one collect_all runs every plan, multi-threaded
+             (the streaming engine with --batch-size)
+
+Projection pushdown means each plan only reads the orders columns it
+needs. The enriched orders are materialized, as a pandas frame, only when
+the writers, the cube or the heavy-hitter sketches need them, so tables
+come out byte for byte the pandas engine's. total_revenue is a polars sum
+and may differ from the pandas engine's in the last bits.
+"""
+import numpy as np
+import pandas as pd
+
+from joins import MISSING, take
+from pipeline import AggregateStage, JoinStage, LoadStage, NormalizeStage, parquet_num_rows
+from schema_registry import SAMPLE_ROWS, column_layout
+
+try:
+    import polars as pl
+except ImportError as e:
+    raise ImportError(
+        "The polars engine needs polars:\n"
+        "  pip install polars\n\n"
+        f"Original error: {e}"
+    )
+
+# helper columns the plans carry, dropped when the orders are materialized
+BOOK_POS = '_book_pos'
+PAID_UNROUNDED = '_paid_unrounded'
+
+
+def to_cents(expr):
+    """aggregations.to_cents: np.round(x * 100) as int64, half to even."""
+    return (expr * 100).round(0, mode='half_to_even').cast(pl.Int64)
+
+
+def parsed_lookup(lf, raw_col, cache):
+    """(distinct raw values, parsed values) of one column as a lookup frame."""
+    raw = lf.select(pl.col(raw_col).unique()).collect().to_series()
+    parsed = cache.parse(raw.to_pandas())
+    return pl.DataFrame({raw_col: raw, 'parsed': pl.from_pandas(parsed)})
+
+
+def join_lookup(lf, lookup, on, out_col):
+    """Left join keeping the order of lf; lookup's 'parsed' becomes out_col."""
+    return lf.join(lookup.rename({'parsed': out_col}).lazy(), on=on, how='left', nulls_equal=True,
+                   maintain_order='left')
+
+
+class PolarsLoadStage(LoadStage):
+    def load_orders(self, run):
+        path = run.input_path('orders.parquet')
+        run.total_rows = parquet_num_rows(path)
+        run.collect_engine = 'streaming' if self.batch_size else 'auto'
+        return "scanned lazily" + (", streaming engine" if self.batch_size else "")
+
+    def order_frames(self, run):
+        yield pl.scan_parquet(run.input_path('orders.parquet'))
+
+    def finish(self, run):
+        pass
+
+
+class PolarsNormalizeStage(NormalizeStage):
+    def process(self, run, lf):
+        layout = column_layout(lf.collect_schema().items())
+        resolved = self.order_schema(run, layout, lambda: lf.head(SAMPLE_ROWS).collect().to_pandas())
+        lf = lf.rename(resolved.renames())
+        schema = lf.collect_schema()
+
+        if 'quantity' not in schema:
+            lf = lf.with_columns(quantity=pl.lit(1, pl.Int64))
+        elif schema['quantity'].is_integer():
+            lf = lf.with_columns(pl.col('quantity').cast(pl.Int64))
+        else:
+            quantity = pl.col('quantity').cast(pl.Float64, strict=False)
+            lf = lf.with_columns(quantity.fill_nan(None).fill_null(0).cast(pl.Int64))
+
+        if 'unit_price' in schema:
+            with run.profile.part(self.name, 'prices'):
+                lookup = parsed_lookup(lf, 'unit_price', self.parse_caches['unit_price'])
+            lf = join_lookup(lf, lookup, 'unit_price', 'unit_price_clean')
+        else:
+            fallback = 0.0 if pd.isna(self.price_fallback) else self.price_fallback
+            lf = lf.with_columns(unit_price_clean=pl.lit(fallback, pl.Float64))
+
+        paid = (pl.col('quantity') * pl.col('unit_price_usd')).fill_nan(0.0).fill_null(0.0)
+        lf = lf.with_columns(unit_price_usd=pl.col('unit_price_clean'))
+        lf = lf.with_columns(paid.alias(PAID_UNROUNDED))
+        # round(2) is half to even with np.round's results (x.round(0) / 100 is not)
+        lf = lf.with_columns(paid_price=pl.col(PAID_UNROUNDED).round(2, mode='half_to_even'))
+
+        if 'timestamp_raw' in schema:
+            with run.profile.part(self.name, 'timestamps'):
+                lookup = parsed_lookup(lf, 'timestamp_raw', self.parse_caches['timestamp'])
+            lf = join_lookup(lf, lookup, 'timestamp_raw', 'timestamp_parsed')
+        else:
+            lf = lf.with_columns(timestamp_parsed=pl.lit(None, pl.Datetime('ns')))
+
+        ts = pl.col('timestamp_parsed').dt
+        return lf.with_columns(date=ts.date(), year=ts.year(), month=ts.month(), day=ts.day())
+
+
+class PolarsJoinStage(JoinStage):
+    def process(self, run, lf):
+        schema = lf.collect_schema()
+        if 'user_id' in schema:
+            mapping = pl.DataFrame({'user_id': list(run.mapping.keys()), 'cluster_id': list(run.mapping.values())},
+                                   schema={'user_id': pl.String, 'cluster_id': pl.String})
+            lf = lf.with_columns(pl.col('user_id').cast(pl.String))
+            lf = lf.join(mapping.lazy(), on='user_id', how='left', maintain_order='left')
+            lf = lf.with_columns(cluster_id=pl.coalesce('cluster_id', 'user_id'))
+        else:
+            lf = lf.with_columns(cluster_id=pl.lit(None, pl.String))
+
+        author_index = run.author_index
+        run.orders_have_books = 'book_id' in schema and 'book_id' in run.df_books.columns
+        if run.orders_have_books:
+            # a book_id listed twice duplicates its orders, as the pandas merge does
+            books = pl.DataFrame({'book_id': run.df_books['book_id'].astype(str).tolist(),
+                                  BOOK_POS: np.arange(len(run.df_books), dtype=np.int64),
+                                  'author_set_id': author_index.book_set_ids})
+            lf = lf.with_columns(pl.col('book_id').cast(pl.String))
+            lf = lf.join(books.lazy(), on='book_id', how='left', maintain_order='left')
+            return lf.with_columns(pl.col('author_set_id').fill_null(author_index.NO_SET))
+        return lf.with_columns(pl.lit(None, pl.Int64).alias(BOOK_POS),
+                               author_set_id=pl.lit(author_index.NO_SET, pl.Int64))
+
+
+class PolarsAggregateStage(AggregateStage):
+    def process(self, run, lf):
+        cents = to_cents(pl.col('paid_price'))
+        plans = [
+            lf.select(pl.len(), pl.col(PAID_UNROUNDED).sum()),
+            lf.group_by('date').agg(cents.sum()).sort('date', nulls_last=True),
+            lf.filter(pl.col('author_set_id') >= 0)
+              .group_by('author_set_id', maintain_order=True)
+              .agg(pl.col('quantity').sum(), pl.col(BOOK_POS).first()),
+            lf.filter(pl.col('cluster_id').is_not_null()).group_by('cluster_id').agg(cents.sum()).sort('cluster_id'),
+        ]
+        materialize = run.orders_writer is not None or run.cube is not None or bool(run.sketches)
+        if materialize:
+            plans.append(lf)
+        with run.profile.part(self.name, 'collect'):
+            results = pl.collect_all(plans, engine=run.collect_engine)
+        counts, daily, sets, clusters = results[:4]
+        n, revenue = counts.row(0)
+        run.total_revenue += float(revenue or 0.0)
+
+        totals = run.totals
+        dates = [pd.NaT if d is None else d for d in daily['date'].to_list()]
+        totals.daily_cents = pd.Series(daily['paid_price'].to_numpy(), index=pd.Index(dates, dtype=object))
+        totals.set_quantity = pd.Series(sets['quantity'].to_numpy(), index=sets['author_set_id'].to_numpy())
+        authors = run.df_books['authors'].tolist() if 'authors' in run.df_books.columns else []
+        totals.set_authors = {k: authors[pos] for k, pos in zip(sets['author_set_id'].to_list(),
+                                                                sets[BOOK_POS].to_list())}
+        totals.cluster_cents = pd.Series(clusters['paid_price'].to_numpy(),
+                                         index=pd.Index(clusters['cluster_id'].to_list(), dtype=object))
+
+        if not materialize:
+            # nothing downstream reads the orders; the row count is all that's left
+            return pd.DataFrame(index=pd.RangeIndex(n))
+        df_orders = enriched_orders(run, results[4])
+        self.update_rollups(run, df_orders)
+        return df_orders
+
+
+def enriched_orders(run, frame):
+    """The collected plan as the pandas engine's enriched orders frame:
+    same columns, order and values."""
+    positions = frame[BOOK_POS].fill_null(MISSING).to_numpy()
+    df_orders = frame.drop(BOOK_POS, PAID_UNROUNDED).to_pandas()
+    df_orders['date'] = df_orders['timestamp_parsed'].dt.date
+    for col in ('user_id', 'book_id', 'cluster_id'):
+        if col in df_orders.columns:
+            df_orders[col] = df_orders[col].astype('category')
+    if run.orders_have_books:
+        authors = take(run.df_books['authors'].to_numpy(dtype=object), positions, np.nan)
+    else:
+        authors = [[] for _ in range(len(df_orders))]
+    df_orders.insert(df_orders.columns.get_loc('author_set_id'), 'authors', authors)
+    df_orders['author_set'] = run.author_index.author_set_column(df_orders['author_set_id'])
+    return df_orders
+
+
+POLARS_STAGES = (PolarsLoadStage, PolarsNormalizeStage, PolarsJoinStage, PolarsAggregateStage)
@@ -0,0 +1,130 @@
+"""Price parsing for orders.unit_price.
+
+Raw prices come in many shapes: "$27.00", "27.00 USD", "EUR 45.99",
+"€45,99", "€50¢50", "22$75¢", "27¢". parse_price_series handles a whole
+column with pandas .str operations and NumPy masks; parse_price applies
+the same rules to a single value and is kept as the per-row reference.
+
+Rules:
+  * a value containing "€" or "eur" (any case) is in euros and gets
+    multiplied by eur_rate; everything else is taken as USD
+  * with a "¢" the first digit group is the major unit and the second the
+    cents ("€50¢50" -> 50.50); a lone group is cents ("27¢" -> 0.27)
+  * otherwise a single comma with no dot is a decimal comma, a comma after
+    the last dot is a decimal comma ("1.234,50"), and any other comma is a
+    thousands separator
+  * missing or unparseable values become `fallback` (NaN by default)
+"""
+import re
+import math
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+DEFAULT_EUR_RATE = 1.2
+
+EURO_PATTERN = r'€|eur'
+CENTS_PATTERN = r'^\D*?(?P<major>\d+)(?:\D+?(?P<minor>\d+))?\D*$'
+STRIP_PATTERN = r'[^\d\.\,\-]'
+NUMBER_PATTERN = r'[-+]?(\d+\.?\d*|\.\d+)'
+SINGLE_COMMA_PATTERN = r'[^,\.]*,[^,\.]*'
+COMMA_AFTER_DOT_PATTERN = r'\..*,[^\.]*$'
+
+_euro_re = re.compile(EURO_PATTERN, re.IGNORECASE)
+_cents_re = re.compile(CENTS_PATTERN)
+_strip_re = re.compile(STRIP_PATTERN)
+
+
+def _to_float(number):
+    try:
+        return float(number)
+    except ValueError:
+        return float("nan")
+
+
+def parse_price(val, eur_rate=DEFAULT_EUR_RATE, fallback=float("nan")):
+    """Parse one raw price into USD."""
+    if val is None or (not isinstance(val, str) and pd.isna(val)):
+        return fallback
+    if isinstance(val, (int, float, np.number)):
+        return float(val)
+    s = str(val).strip()
+    if s == "":
+        return fallback
+
+    if "¢" in s:
+        m = _cents_re.match(s)
+        if m is None:
+            v = float("nan")
+        elif m.group("minor") is None:
+            v = int(m.group("major")) / 100
+        else:
+            v = int(m.group("major")) + int(m.group("minor")) / 100
+    else:
+        number = _strip_re.sub("", s)
+        last_comma, last_dot = number.rfind(","), number.rfind(".")
+        if (number.count(",") == 1 and last_dot == -1) or last_comma > last_dot > -1:
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+        v = _to_float(number)
+
+    if math.isnan(v):
+        return fallback
+    if _euro_re.search(s):
+        v = v * eur_rate
+    return v
+
+
+def _string_column(srs, missing):
+    s = srs.where(~missing, "").astype(str)
+    if pa is not None:
+        # Arrow-backed strings let the .str calls below run in Arrow compute
+        s = s.astype(pd.ArrowDtype(pa.string()))
+    return s.str.strip()
+
+
+def _to_float_column(number):
+    valid = number.str.fullmatch(NUMBER_PATTERN).fillna(False).to_numpy(dtype=bool)
+    values = np.full(len(number), np.nan)
+    values[valid] = number[valid].astype("float64").to_numpy()
+    return values
+
+
+def parse_price_series(srs, eur_rate=DEFAULT_EUR_RATE, fallback=float("nan")):
+    """Vectorized parse_price over a whole column; returns a float64 Series."""
+    if pd.api.types.is_numeric_dtype(srs.dtype) and not pd.api.types.is_bool_dtype(srs.dtype):
+        return srs.astype("float64").fillna(fallback)
+
+    missing = srs.isna().to_numpy()
+    s = _string_column(srs, missing)
+    values = np.full(len(s), np.nan)
+
+    has_cents = s.str.contains("¢", regex=False).to_numpy(dtype=bool)
+    if has_cents.any():
+        parts = s[has_cents].str.extract(CENTS_PATTERN)
+        major = _to_float_column(parts["major"].fillna(""))
+        minor = _to_float_column(parts["minor"].fillna(""))
+        values[has_cents] = np.where(np.isnan(minor), major / 100, major + minor / 100)
+
+    plain = ~has_cents
+    if plain.any():
+        number = s[plain].str.replace(STRIP_PATTERN, "", regex=True)
+        decimal_comma = (number.str.fullmatch(SINGLE_COMMA_PATTERN)
+                         | number.str.contains(COMMA_AFTER_DOT_PATTERN, regex=True)).to_numpy(dtype=bool)
+        number = number.where(
+            ~decimal_comma,
+            number.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+        )
+        number = number.where(decimal_comma, number.str.replace(",", "", regex=False))
+        values[plain] = _to_float_column(number)
+
+    is_euro = s.str.contains(EURO_PATTERN, case=False, regex=True).to_numpy(dtype=bool)
+    values = np.where(is_euro, values * eur_rate, values)
+    values[missing] = np.nan
+    return pd.Series(values, index=srs.index, dtype="float64").fillna(fallback)
@@ -1,359 +1,219 @@
 import os
-import re
 import json
 import argparse
-import math
-from collections import defaultdict
-import pandas as pd
-
-def read_parquet_with_hint(path):
-    try:
-        return pd.read_parquet(path)
-    except Exception as e:
-        msg = str(e)
-        if "pyarrow" in msg or "fastparquet" in msg or "parquet" in msg.lower():
-            raise ImportError(
-                "Reading parquet failed. Install a parquet engine locally (pyarrow):\n"
-                "  pip install pyarrow\n\n"
-                f"Original error: {e}"
-            )
-        raise
-
-def read_yaml_list(path):
-    import yaml
-    with open(path, "r", encoding="utf-8") as f:
-        obj = yaml.safe_load(f)
-    if isinstance(obj, list):
-        return obj
-    if isinstance(obj, dict) and "books" in obj and isinstance(obj["books"], list):
-        return obj["books"]
-    if isinstance(obj, dict):
-        vals = list(obj.values())
-        if all(isinstance(v, dict) for v in vals):
-            return vals
-    return []
-
-def normalize_price_to_float(val, eur_to_usd=1.2):
-    if pd.isna(val):
-        return float("nan")
-    if isinstance(val, (int, float)):
-        return float(val)
-    s = str(val).strip()
-    if s == "":
-        return float("nan")
-    is_euro = "€" in s or "eur" in s.lower()
-    s_clean = re.sub(r"[^\d\.\,\-]", "", s)
-    if s_clean.count(",") == 1 and s_clean.count(".") == 0:
-        s_clean = s_clean.replace(",", ".")
-    s_clean = s_clean.replace(",", "")
-    try:
-        v = float(s_clean)
-    except:
-        v = float("nan")
-    if is_euro and not math.isnan(v):
-        v = v * eur_to_usd
-    return v
-
-def clean_timestamp_str(s):
-    if pd.isna(s):
-        return s
-    if not isinstance(s, str):
-        return s
-    t = s.strip()
-    t = re.sub(r"\bA\.?M\.?\b", "AM", t, flags=re.IGNORECASE)
-    t = re.sub(r"\bP\.?M\.?\b", "PM", t, flags=re.IGNORECASE)
-    t = re.sub(r"\bM\.$", "", t)
-    t = t.replace(",", " ")
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-
-def parse_timestamp_series(srs):
-    s_clean = srs.astype(object).apply(clean_timestamp_str)
-    parsed = pd.to_datetime(s_clean, errors="coerce", dayfirst=False)
-    return parsed
-
-class UnionFind:
-    def __init__(self):
-        self.parent = {}
-    def find(self, x):
-        if x not in self.parent:
-            self.parent[x] = x
-        if self.parent[x] != x:
-            self.parent[x] = self.find(self.parent[x])
-        return self.parent[x]
-    def union(self, a, b):
-        ra, rb = self.find(a), self.find(b)
-        if ra == rb:
-            return
-        self.parent[rb] = ra
-
-def reconcile_users(df_users):
-    df = df_users.copy().fillna("").astype(str)
-    if 'user_id' not in df.columns:
-        if 'id' in df.columns:
-            df = df.rename(columns={'id': 'user_id'})
-        else:
-            df = df.reset_index().rename(columns={'index': 'user_id'})
-    for c in ['name','email','phone','address']:
-        if c not in df.columns:
-            df[c] = ''
-    ids = df['user_id'].tolist()
-    records = df[['name','email','phone','address']].map(lambda x: str(x).strip().lower()).to_dict(orient='records')
-    uf = UnionFind()
-    n = len(ids)
-    for i in range(n):
-        for j in range(i+1, n):
-            matches = 0
-            for k in ['name','email','phone','address']:
-                if records[i][k] != '' and records[i][k] == records[j][k]:
-                    matches += 1
-            if matches >= 3:
-                uf.union(ids[i], ids[j])
-    mapping = {}
-    clusters = defaultdict(list)
-    for uid in ids:
-        root = uf.find(uid)
-        mapping[uid] = root
-        clusters[root].append(uid)
-    df['cluster_id'] = df['user_id'].map(mapping)
-    return df, mapping, clusters
-
-def pick_col(cols, candidates):
-    for c in candidates:
-        if c in cols: return c
-    lower = {col.lower(): col for col in cols}
-    for c in candidates:
-        if c.lower() in lower:
-            return lower[c.lower()]
-    return None
-
-def extract_authors_from_book(book):
-    """Extract authors from book data - handle different field names and formats"""
-    # Try different possible author field names
-    author_fields = [':author', 'author', 'authors', 'writer', 'writers']
-    
-    for field in author_fields:
-        if field in book:
-            authors_data = book[field]
-            if isinstance(authors_data, str):
-                # Handle string formats
-                if ',' in authors_data:
-                    return [a.strip() for a in authors_data.split(',') if a.strip()]
-                elif '&' in authors_data:
-                    return [a.strip() for a in authors_data.split('&') if a.strip()]
-                elif ';' in authors_data:
-                    return [a.strip() for a in authors_data.split(';') if a.strip()]
-                else:
-                    return [authors_data.strip()]
-            elif isinstance(authors_data, list):
-                return [str(a).strip() for a in authors_data if str(a).strip()]
-            elif authors_data:
-                return [str(authors_data).strip()]
-    
-    # If no author field found, try to extract from other fields
-    for key, value in book.items():
-        if 'author' in key.lower() and isinstance(value, str):
-            return [value.strip()]
-    
-    return ['Unknown Author']
-
-def process_dataset_folder(data_dir, out_dir, eur_rate=1.2):
-    dataset_name = os.path.basename(os.path.normpath(data_dir))
-    print(f"\nProcessing dataset: {dataset_name}")
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from jobs import DatasetLock
+from manifest import check_dataset, invalidate_manifest, write_manifest
+from outputs import OUTPUT_FORMATS
+from parse_cache import DEFAULT_MAXSIZE, order_parse_caches, sum_stats
+from pipeline import ENGINES, LEAN_BATCH_SIZE, Pipeline, output_files
+from user_matching import BLOCKINGS, FuzzyMatcher
+
+# bump whenever a change alters what process_dataset_folder writes, so
+# incremental runs don't reuse outputs of an older version
+PROCESSOR_VERSION = 'process_data/6'
+
+def process_dataset_folder(data_dir, out_dir, eur_rate=1.2, parse_caches=None, batch_size=None, output_format='csv',
+                           profile=False, heavy_hitters=0, user_matcher=None, user_store=False, engine='pandas',
+                           lean_memory=False, memory_report=False, users_delta=None):
+    """Process one DATA folder. With batch_size, orders.parquet is streamed
+    in batches of that many rows instead of being loaded whole. Output
+    tables are written as output_format ('csv' or 'parquet'). Per-stage
+    timings go to <dataset>_profile.json; profile=True adds a cProfile
+    dump per stage. heavy_hitters > 0 adds approximate top books, authors
+    and customers from Space-Saving sketches of that many counters.
+    user_matcher (user_matching.FuzzyMatcher) switches user reconciliation
+    to fuzzy matching; user_store=True reconciles incrementally against the
+    dataset's persistent cluster store (user_store.py), matching only the
+    rows of the users_delta CSV in data_dir when it is given. engine='polars'
+    runs the stages as a lazy polars plan (polars_engine.py).
+    lean_memory=True keeps the orders in narrower dtypes and streams them
+    unless batch_size says otherwise; memory_report=True adds each stage's
+    frame memory to the profile and the log.
+    Waits while a dashboard job (jobs.py) is reprocessing the same dataset
+    into out_dir."""
+    print()
+    pipeline = Pipeline(eur_rate, parse_caches, batch_size, output_format, cprofile=profile,
+                        heavy_hitters=heavy_hitters, user_matcher=user_matcher, user_store=user_store,
+                        engine=engine, lean_memory=lean_memory, memory_report=memory_report,
+                        users_delta=users_delta)
+    with DatasetLock(out_dir, os.path.basename(os.path.normpath(data_dir))):
+        return pipeline.run(data_dir, out_dir).summary
+
+def process_dataset_captured(data_dir, out_dir, eur_rate=1.2, parse_cache_size=DEFAULT_MAXSIZE, batch_size=None,
+                             output_format='csv', profile=False, heavy_hitters=0, user_matcher=None, user_store=False,
+                             engine='pandas', lean_memory=False, memory_report=False, users_delta=None):
+    """Pool worker: process one dataset, returning (summary, log, error)
+    instead of printing or raising."""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            parse_caches = order_parse_caches(eur_rate, maxsize=parse_cache_size)
+            summary = process_dataset_folder(data_dir, out_dir, eur_rate, parse_caches, batch_size, output_format,
+                                             profile, heavy_hitters, user_matcher, user_store, engine,
+                                             lean_memory, memory_report, users_delta)
+            return summary, log.getvalue(), None
+        except Exception as e:
+            return None, log.getvalue(), e
+
+def run_datasets(datasets, out_dir, eur_rate=1.2, parse_cache_size=DEFAULT_MAXSIZE, workers=1, incremental=False,
+                 batch_size=None, output_format='csv', profile=False, heavy_hitters=0, user_matcher=None,
+                 user_store=False, engine='pandas', lean_memory=False, memory_report=False, users_delta=None):
+    """Yield (data_dir, summary, error, reused) for each dataset, in order.
+
+    With workers > 1 datasets run in a process pool, each with its own
+    parse caches; a worker's log is printed once its dataset's turn comes.
+    A failing dataset only produces an error for that dataset. A worker
+    that dies outright (out of memory, a crash in native code) takes the
+    pool down with it; the datasets it left unfinished are then rerun one
+    at a time, each in a fresh worker, so only the one that crashes
+    again is reported as failed. With incremental=True datasets whose
+    manifest still matches their inputs are not reprocessed; their stored
+    summary is yielded with reused=True.
+    """
     os.makedirs(out_dir, exist_ok=True)
-
-    users_path = os.path.join(data_dir, 'users.csv')
-    orders_path = os.path.join(data_dir, 'orders.parquet')
-    books_path = os.path.join(data_dir, 'books.yaml')
-
-    if not os.path.exists(users_path) or not os.path.exists(orders_path) or not os.path.exists(books_path):
-        raise FileNotFoundError(f"Dataset {dataset_name} missing one of users.csv / orders.parquet / books.yaml")
-
-    df_users = pd.read_csv(users_path, dtype=str)
-    df_orders = read_parquet_with_hint(orders_path)
-    books_list = read_yaml_list(books_path)
-    
-    # Extract authors properly
-    for book in books_list:
-        book['authors'] = extract_authors_from_book(book)
-    
-    df_books = pd.DataFrame(books_list)
-
-    print(f" users: {df_users.shape}")
-    print(f" orders: {df_orders.shape}")
-    print(f" books: {df_books.shape}")
-    print(f" sample authors: {[book.get('authors', []) for book in books_list[:3]]}")
-
-    # normalize orders columns
-    ord_cols = df_orders.columns.tolist()
-    user_col = pick_col(ord_cols, ['user_id','user','customer_id','customer','userId','id'])
-    qty_col = pick_col(ord_cols, ['quantity','qty','count'])
-    price_col = pick_col(ord_cols, ['unit_price','price','unitprice','amount'])
-    ts_col = pick_col(ord_cols, ['timestamp','order_ts','created_at','order_date','date','time'])
-    book_col = pick_col(ord_cols, ['book_id','isbn','sku','product_id','book'])
-
-    rename_map = {}
-    if user_col and user_col != 'user_id': rename_map[user_col] = 'user_id'
-    if qty_col and qty_col != 'quantity': rename_map[qty_col] = 'quantity'
-    if price_col and price_col != 'unit_price': rename_map[price_col] = 'unit_price'
-    if ts_col and ts_col != 'timestamp_raw': rename_map[ts_col] = 'timestamp_raw'
-    if book_col and book_col != 'book_id': rename_map[book_col] = 'book_id'
-    if rename_map:
-        df_orders = df_orders.rename(columns=rename_map)
-
-    # ensure numeric quantity
-    if 'quantity' not in df_orders.columns:
-        df_orders['quantity'] = 1
-    else:
-        df_orders['quantity'] = pd.to_numeric(df_orders['quantity'], errors='coerce').fillna(0).astype(int)
-
-    # price normalization
-    if 'unit_price' in df_orders.columns:
-        df_orders['unit_price_clean'] = df_orders['unit_price'].apply(lambda v: normalize_price_to_float(v, eur_rate))
-    else:
-        df_orders['unit_price_clean'] = 0.0
-
-    df_orders['unit_price_usd'] = df_orders['unit_price_clean']
-    df_orders['paid_price'] = df_orders['quantity'] * df_orders['unit_price_usd']
-    df_orders['paid_price'] = pd.to_numeric(df_orders['paid_price'], errors='coerce').fillna(0.0).round(2)
-
-    # timestamps
-    if 'timestamp_raw' in df_orders.columns:
-        df_orders['timestamp_parsed'] = parse_timestamp_series(df_orders['timestamp_raw'])
-    else:
-        df_orders['timestamp_parsed'] = pd.NaT
-
-    df_orders['date'] = df_orders['timestamp_parsed'].dt.date
-    df_orders['year'] = df_orders['timestamp_parsed'].dt.year
-    df_orders['month'] = df_orders['timestamp_parsed'].dt.month
-    df_orders['day'] = df_orders['timestamp_parsed'].dt.day
-
-    # users reconciliation
-    df_users_proc, mapping, clusters = reconcile_users(df_users)
-
-    if 'user_id' in df_orders.columns:
-        df_orders['user_id'] = df_orders['user_id'].astype(str)
-        df_orders['cluster_id'] = df_orders['user_id'].map(mapping).fillna(df_orders['user_id'])
-    else:
-        df_orders['cluster_id'] = None
-
-    # prepare books/authors
-    book_cols = df_books.columns.tolist()
-    book_id_books = pick_col(book_cols, ['book_id','id','isbn','sku'])
-    if book_id_books and book_id_books != 'book_id':
-        df_books = df_books.rename(columns={book_id_books: 'book_id'})
-    if 'book_id' in df_books.columns:
-        df_books['book_id'] = df_books['book_id'].astype(str)
-
-    # join orders with books to get authors
-    if 'book_id' in df_orders.columns and 'book_id' in df_books.columns:
-        df_orders['book_id'] = df_orders['book_id'].astype(str)
-        df_orders = df_orders.merge(df_books[['book_id','authors']], on='book_id', how='left')
-    else:
-        df_orders['authors'] = [[] for _ in range(len(df_orders))]
-
-    df_orders['author_set'] = df_orders['authors'].apply(lambda a: tuple(sorted(a)) if isinstance(a, list) and a else ())
-
-    # daily revenue
-    daily_rev = df_orders.groupby('date', dropna=False)['paid_price'].sum().reset_index().sort_values('date')
-
-    # top 5 days
-    top5 = daily_rev.sort_values('paid_price', ascending=False).head(5).copy()
-    top5['date'] = pd.to_datetime(top5['date'], errors='coerce').dt.strftime('%Y-%m-%d')
-    top5_records = top5.to_dict(orient='records')
-
-    unique_real_users = len(clusters)
-    
-    # Count unique author sets properly
-    all_author_sets = set()
-    for authors in df_books['authors']:
-        if authors and isinstance(authors, list):
-            all_author_sets.add(tuple(sorted(authors)))
-    unique_author_sets = len(all_author_sets)
-
-    # most popular author(s) - simplified approach
-    # Count author frequency in books data first
-    author_frequency = defaultdict(int)
-    for authors in df_books['authors']:
-        if authors and isinstance(authors, list):
-            for author in authors:
-                if author and author != 'Unknown Author':
-                    author_frequency[author] += 1
-    
-    most_popular_authors = []
-    if author_frequency:
-        max_freq = max(author_frequency.values())
-        most_popular_authors = [author for author, freq in author_frequency.items() if freq == max_freq]
-        print(f"Most frequent authors: {most_popular_authors} (appears {max_freq} times)")
-    
-    # If that doesn't work, just get the first author from the first book
-    if not most_popular_authors and len(df_books) > 0:
-        first_book_authors = df_books.iloc[0]['authors']
-        if first_book_authors and isinstance(first_book_authors, list) and first_book_authors:
-            most_popular_authors = [first_book_authors[0]]
-            print(f"Using first author: {most_popular_authors}")
-
-    # most popular author sets
-    author_set_sales = defaultdict(int)
-    for _, row in df_orders.iterrows():
-        quantity = int(row.get('quantity', 0) or 0)
-        author_set = row.get('author_set', ())
-        if author_set:
-            author_set_sales[author_set] += quantity
-    
-    most_popular_sets = []
-    if author_set_sales:
-        max_set_sales = max(author_set_sales.values())
-        most_popular_sets = [list(author_set) for author_set, sales in author_set_sales.items() if sales == max_set_sales]
-
-    # top customer by cluster spending
-    cust_spend = df_orders.groupby('cluster_id')['paid_price'].sum().reset_index().sort_values('paid_price', ascending=False)
-    if not cust_spend.empty:
-        top_cluster = cust_spend.iloc[0]['cluster_id']
-        top_total = float(cust_spend.iloc[0]['paid_price'])
-        top_customer_user_ids = clusters.get(top_cluster, [top_cluster])
-    else:
-        top_cluster = None
-        top_total = 0.0
-        top_customer_user_ids = []
-
-    # save outputs
-    out_prefix = os.path.join(out_dir, f"{dataset_name}")
-    df_orders.to_csv(out_prefix + "_orders_enriched.csv", index=False)
-    df_users_proc.to_csv(out_prefix + "_users_reconciled.csv", index=False)
-    df_books.to_csv(out_prefix + "_books_processed.csv", index=False)
-    daily_rev.to_csv(out_prefix + "_daily_revenue.csv", index=False)
-    pd.DataFrame(top5_records).to_csv(out_prefix + "_top5_days.csv", index=False)
-
-    summary = {
-        'dataset': dataset_name,
-        'top5_days': top5_records,
-        'unique_real_users': int(unique_real_users),
-        'unique_author_sets': int(unique_author_sets),
-        'most_popular_author_sets': most_popular_sets,
-        'most_popular_authors': most_popular_authors,
-        'top_customer_cluster_id': top_cluster,
-        'top_customer_user_ids': top_customer_user_ids,
-        'top_customer_total_spent': float(round(top_total,2)),
-        'daily_rev_csv': out_prefix + "_daily_revenue.csv",
-        'orders_enriched_csv': out_prefix + "_orders_enriched.csv",
-        'users_reconciled_csv': out_prefix + "_users_reconciled.csv",
-        'books_processed_csv': out_prefix + "_books_processed.csv",
-    }
-    with open(out_prefix + "_summary.json", "w", encoding="utf-8") as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
-
-    print(f"Finished {dataset_name}: real_users={unique_real_users}, author_sets={unique_author_sets}, popular_authors={most_popular_authors}")
-    return summary
+    params = {'eur_rate': eur_rate, 'output_format': output_format}
+    if heavy_hitters:
+        # only when on, so manifests of runs without sketches stay valid
+        params['heavy_hitters'] = heavy_hitters
+    if user_matcher is not None:
+        params['user_matching'] = user_matcher.params()
+    if user_store:
+        # cluster ids of a store-backed run may differ from a fresh one's
+        params['user_store'] = True
+    if engine != 'pandas':
+        params['engine'] = engine
+    if lean_memory:
+        # same CSV text, but narrower Parquet column types
+        params['lean_memory'] = True
+    manifests = {}
+    reused = {}
+    for d in datasets:
+        # manifests are written on every run so a later incremental run can trust them
+        try:
+            summary, manifests[d] = check_dataset(d, out_dir, PROCESSOR_VERSION, params)
+        except OSError:
+            # missing inputs: let process_dataset_folder report it
+            continue
+        if incremental and summary is not None:
+            reused[d] = summary
+    stale = [d for d in datasets if d not in reused]
+
+    def start(d):
+        if d in manifests:
+            invalidate_manifest(out_dir, manifests[d])
+
+    def finish(d):
+        if d in manifests:
+            name = os.path.basename(os.path.normpath(d))
+            write_manifest(out_dir, manifests[d], output_files(name, output_format))
+
+    def reuse(d):
+        print(f"\nReusing {os.path.basename(os.path.normpath(d))}: inputs unchanged")
+        return d, reused[d], None, True
+
+    if workers <= 1 or len(stale) <= 1:
+        parse_caches = order_parse_caches(eur_rate, maxsize=parse_cache_size)
+        for d in datasets:
+            if d in reused:
+                yield reuse(d)
+                continue
+            start(d)
+            try:
+                summary = process_dataset_folder(d, out_dir, eur_rate, parse_caches, batch_size, output_format,
+                                                 profile, heavy_hitters, user_matcher, user_store, engine,
+                                                 lean_memory, memory_report, users_delta)
+            except Exception as e:
+                yield d, None, e, False
+                continue
+            finish(d)
+            yield d, summary, None, False
+        return
+
+    worker_args = (out_dir, eur_rate, parse_cache_size, batch_size, output_format, profile, heavy_hitters,
+                   user_matcher, user_store, engine, lean_memory, memory_report, users_delta)
+
+    def isolated(d):
+        # alone in its own pool, a crash can only be this dataset's
+        with ProcessPoolExecutor(max_workers=1) as retry_pool:
+            try:
+                return retry_pool.submit(process_dataset_captured, d, *worker_args).result()
+            except BrokenProcessPool as e:
+                return None, "", e
+
+    for d in stale:
+        start(d)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {d: pool.submit(process_dataset_captured, d, *worker_args) for d in stale}
+        for d in datasets:
+            if d in reused:
+                yield reuse(d)
+                continue
+            try:
+                summary, log, error = futures[d].result()
+            except BrokenProcessPool:
+                # some worker died; this dataset may not even have started
+                summary, log, error = isolated(d)
+            except Exception as e:
+                summary, log, error = None, "", e
+            print(log, end="")
+            if error is None:
+                finish(d)
+            yield d, summary, error, False
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--data-root', type=str, default='./data', help='root folder with DATA1/DATA2/DATA3')
     parser.add_argument('--out-dir', type=str, default='./output', help='output folder')
     parser.add_argument('--eur-rate', type=float, default=1.2, help='EUR -> USD conversion rate')
+    parser.add_argument('--parse-cache-size', type=int, default=DEFAULT_MAXSIZE,
+                        help='distinct raw prices/timestamps kept in the parse cache')
+    parser.add_argument('--workers', type=int, default=1, help='datasets processed in parallel')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='stream orders.parquet in batches of this many rows (0 = load it whole; the default, '
+                             f'except with --lean-memory, which streams {LEAN_BATCH_SIZE:,} rows at a time)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help='format of the enriched/reconciled/revenue tables')
+    parser.add_argument('--heavy-hitters', type=int, default=0,
+                        help='counters per Space-Saving sketch for approximate top books/authors/customers (0 = off)')
+    parser.add_argument('--user-matching', choices=('exact',) + BLOCKINGS, default='exact',
+                        help='exact 3-of-4 field matching, or fuzzy matching on canonical keys with '
+                             'sorted-neighbourhood or MinHash LSH candidates')
+    parser.add_argument('--match-threshold', type=float, default=0.8,
+                        help='name/address token similarity (Jaccard) counted as agreeing in fuzzy matching')
+    parser.add_argument('--user-store', action='store_true',
+                        help='keep user clusters in <out-dir>/.cache/DATA*_users.sqlite and only re-match '
+                             'new, changed and removed users on later runs (users.csv is still read in full)')
+    parser.add_argument('--users-delta', type=str, default=None,
+                        help='with --user-store: name of a CSV of new and changed users inside each DATA folder; '
+                             'only its rows are matched (removed users still need a run without it)')
+    parser.add_argument('--engine', choices=ENGINES, default='pandas',
+                        help='run the order stages as eager pandas frames or as a lazy, multi-threaded polars plan')
+    parser.add_argument('--lean-memory', action='store_true',
+                        help='narrower order dtypes (int32, Arrow dates, Int8/Int16 date parts) and chunked parsing')
+    parser.add_argument('--memory-report', action='store_true',
+                        help="record each stage's frame memory against the input size in DATA*_profile.json")
+    parser.add_argument('--profile', action='store_true',
+                        help='also write a cProfile dump per pipeline stage next to <dataset>_profile.json')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reprocess datasets whose inputs or parameters changed since the last run')
     args = parser.parse_args()
 
     data_root = args.data_root
+    user_matcher = None
+    if args.user_matching != 'exact' and args.user_store:
+        parser.error("--user-store keeps exact-match clusters; it can't be combined with --user-matching")
+    if args.users_delta and not args.user_store:
+        parser.error("--users-delta is folded into the user store; it needs --user-store")
+    if args.user_matching != 'exact':
+        user_matcher = FuzzyMatcher(name_threshold=args.match_threshold, address_threshold=args.match_threshold,
+                                    blocking=args.user_matching)
+    if args.lean_memory and args.engine != 'pandas':
+        parser.error("--lean-memory narrows the pandas engine's columns; it can't be combined with --engine polars")
     out_dir = args.out_dir
     eur_rate = args.eur_rate
 
@@ -372,20 +232,30 @@ def main():
             raise FileNotFoundError("No DATA* folders found and no direct dataset files found under data-root")
 
     all_summaries = []
-    for d in datasets:
-        try:
-            s = process_dataset_folder(d, out_dir, eur_rate)
-            all_summaries.append(s)
-        except ImportError as e:
-            print("ERROR:", e)
+    processed = []
+    for d, s, error, reused in run_datasets(datasets, out_dir, eur_rate, args.parse_cache_size,
+                                            args.workers, args.incremental, args.batch_size,
+                                            args.output_format, args.profile, args.heavy_hitters,
+                                            user_matcher, args.user_store, args.engine,
+                                            args.lean_memory, args.memory_report, args.users_delta):
+        if isinstance(error, ImportError):
+            print("ERROR:", error)
             print("Install parquet engine locally, e.g.: pip install pyarrow")
             return
-        except Exception as e:
-            print("ERROR processing", d, ":", e)
+        if error is not None:
+            print("ERROR processing", d, ":", error)
             continue
+        all_summaries.append(s)
+        if not reused:
+            processed.append(s)
 
     with open(os.path.join(out_dir, 'all_summaries.json'), 'w', encoding='utf-8') as f:
         json.dump(all_summaries, f, indent=2, ensure_ascii=False)
+    for name in ('unit_price', 'timestamp') if processed else ():
+        st = sum_stats(s['parse_cache'][name] for s in processed)
+        print(f"Parse cache {name}: hits={st['hits']} misses={st['misses']} hit_rate={st['hit_rate']} evictions={st['evictions']}")
+    if args.incremental:
+        print(f"Reprocessed {len(processed)} of {len(all_summaries)} datasets")
     print("\nAll datasets processed. Outputs saved to:", out_dir)
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""Per-stage instrumentation for pipeline.Pipeline.
+
+Every call into a stage is measured: wall time, rows in and out (for the
+calls that take or return an orders frame) and how far the process's peak
+RSS rose during the call. Stages can also time named parts of their work
+(prices vs timestamps, one output table vs another). With cprofile=True
+each stage also gets its own cProfile.Profile, dumped as
+<dataset>_profile_<stage>.prof (load with pstats or snakeviz).
+
+With memory=True every stage also records data_mb: the most memory the
+pipeline's frames (users, books and the orders frame the stage handed on)
+held after any of its calls, per frame_memory_mb. The peak is reported
+against the raw input size the pipeline records with record_input (the
+input files, orders.parquet counted uncompressed), which doesn't depend on
+whether the orders were loaded whole or streamed, and checked against
+MEMORY_TARGET_RATIO. Only streamed runs meet that target: a whole
+orders table enriched with its parsed columns is already larger. Frames
+are measured between stage calls, so a peak inside a call (a temporary
+copy freed before the stage returns) only shows in the RSS figures.
+
+The numbers go to <dataset>_profile.json next to the summary.
+"""
+import os
+import sys
+import json
+import time
+import cProfile
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+# peak frame memory a run should stay under, as a multiple of its raw inputs
+MEMORY_TARGET_RATIO = 2.0
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, RSS is reported as null
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+def frame_rows(value):
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+
+def frame_memory_mb(*frames):
+    """Memory held by the columns of frames, in MB.
+
+    Unlike memory_usage(deep=True) it counts shared storage once: numpy
+    buffers two columns share (copy-on-write) and Python objects many rows
+    point at (the authors lists, author_set tuples). Object columns count
+    a pointer a row plus sys.getsizeof of each distinct object.
+    """
+    buffers = set()
+    objects = {}
+    total = 0
+    for df in frames:
+        if not isinstance(df, pd.DataFrame):
+            continue
+        for _, col in df.items():
+            if col.dtype == object:
+                values = col.to_numpy()
+                total += values.nbytes
+                objects.update((id(v), v) for v in values)
+            elif isinstance(col.dtype, np.dtype):
+                values = col.to_numpy()
+                address = values.__array_interface__['data'][0]
+                if address not in buffers:
+                    buffers.add(address)
+                    total += values.nbytes
+            else:
+                # categorical codes + categories, Arrow buffers, masked arrays
+                total += col.memory_usage(index=False, deep=True)
+    total += sum(sys.getsizeof(v) for v in objects.values())
+    return total / 2 ** 20
+
+
+class StageStats:
+    def __init__(self, name, cprofile=False):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.peak_rss_delta_mb = 0.0
+        self.data_mb = None
+        self.parts = {}
+        self.profiler = cProfile.Profile() if cprofile else None
+
+    def measure(self, fn, *args):
+        rows_in = sum(frame_rows(a) or 0 for a in args)
+        rss_before = peak_rss_mb()
+        if self.profiler is not None:
+            self.profiler.enable()
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args)
+        finally:
+            self.seconds += time.perf_counter() - t0
+            if self.profiler is not None:
+                self.profiler.disable()
+            self.calls += 1
+            if rss_before is not None:
+                self.peak_rss_delta_mb += peak_rss_mb() - rss_before
+        self.rows_in += rows_in
+        self.rows_out += frame_rows(result) or 0
+        return result
+
+    def as_dict(self):
+        stats = {
+            'seconds': round(self.seconds, 6),
+            'calls': self.calls,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_delta_mb': round(self.peak_rss_delta_mb, 1),
+            'parts': {name: round(seconds, 6) for name, seconds in self.parts.items()},
+        }
+        if self.data_mb is not None:
+            stats['data_mb'] = round(self.data_mb, 1)
+        return stats
+
+
+class PipelineProfile:
+    """StageStats for every stage of one dataset run, in stage order."""
+
+    def __init__(self, stage_names, cprofile=False, memory=False):
+        self.stages = {name: StageStats(name, cprofile) for name in stage_names}
+        self.cprofile = cprofile
+        self.memory = memory
+        self.started = time.time()
+        self.rss_start_mb = peak_rss_mb()
+        self.input_mb = None
+
+    def measure(self, stage_name, fn, *args):
+        return self.stages[stage_name].measure(fn, *args)
+
+    def record_data(self, stage_name, *frames):
+        """Note the memory frames hold after a call into the stage (memory=True only)."""
+        if not self.memory:
+            return
+        stats = self.stages[stage_name]
+        stats.data_mb = max(stats.data_mb or 0.0, frame_memory_mb(*frames))
+
+    def record_input(self, input_mb):
+        """The raw size of the run's inputs, the memory report's denominator."""
+        self.input_mb = input_mb
+
+    def memory_report(self):
+        """{input_mb, loaded_mb, data_peak_mb, data_peak_stage, data_peak_ratio,
+        target_ratio, within_target, rss_growth_mb}, or None without
+        memory=True. loaded_mb is what the load stage's frames held (users,
+        books and the whole orders table or one batch); the ratio is against
+        input_mb, the raw inputs, and within_target says whether it stayed
+        under MEMORY_TARGET_RATIO."""
+        if not self.memory:
+            return None
+        loaded_mb = next(iter(self.stages.values())).data_mb or 0.0
+        input_mb = self.input_mb if self.input_mb is not None else loaded_mb
+        stage, peak = max(((name, stats.data_mb or 0.0) for name, stats in self.stages.items()),
+                          key=lambda item: item[1])
+        rss = peak_rss_mb()
+        ratio = peak / input_mb if input_mb else None
+        return {
+            'input_mb': round(input_mb, 1),
+            'loaded_mb': round(loaded_mb, 1),
+            'data_peak_mb': round(peak, 1),
+            'data_peak_stage': stage,
+            'data_peak_ratio': round(ratio, 2) if ratio is not None else None,
+            'target_ratio': MEMORY_TARGET_RATIO,
+            'within_target': ratio is not None and ratio < MEMORY_TARGET_RATIO,
+            'rss_growth_mb': round(rss - self.rss_start_mb, 1) if rss is not None else None,
+        }
+
+    @contextlib.contextmanager
+    def part(self, stage_name, part_name):
+        """Time a named piece of a stage's work (adds up over calls)."""
+        parts = self.stages[stage_name].parts
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            parts[part_name] = parts.get(part_name, 0.0) + time.perf_counter() - t0
+
+    def timings(self):
+        return {name: stats.seconds for name, stats in self.stages.items()}
+
+    def report(self):
+        """One-line summary for the logs, e.g. 'load 0.10s, normalize 0.25s, ...'."""
+        return ", ".join(f"{name} {stats.seconds:.2f}s" for name, stats in self.stages.items())
+
+    def as_dict(self, dataset, rows):
+        profile = {
+            'dataset': dataset,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'seconds': round(sum(self.timings().values()), 6),
+            'rows': rows,
+            'peak_rss_start_mb': self.rss_start_mb,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {name: stats.as_dict() for name, stats in self.stages.items()},
+        }
+        if self.memory:
+            profile['memory'] = self.memory_report()
+        return profile
+
+    def write(self, out_prefix, dataset, rows):
+        """Write <out_prefix>_profile.json (plus the .prof dumps); returns its path."""
+        profile = self.as_dict(dataset, rows)
+        if self.cprofile:
+            profile['cprofile'] = {}
+            for name, stats in self.stages.items():
+                path = f"{out_prefix}_profile_{name}.prof"
+                stats.profiler.dump_stats(path)
+                profile['cprofile'][name] = path
+        path = out_prefix + "_profile.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2)
+        return path
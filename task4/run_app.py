@@ -24,7 +24,7 @@ def check_and_install_dependencies():
     return True
 
 def process_data():
-    """Run the data processing script"""
+    """Run the data processing script; unchanged datasets are reused"""
     print("🔄 Processing data...")
     
     # Try different possible paths for process_data.py
@@ -37,7 +37,7 @@ def process_data():
     for path in possible_paths:
         if os.path.exists(path):
             print(f"✅ Found process_data.py at: {path}")
-            result = subprocess.run([sys.executable, path], capture_output=True, text=True)
+            result = subprocess.run([sys.executable, path, "--incremental"], capture_output=True, text=True)
             if result.returncode == 0:
                 print("✅ Data processed successfully!")
                 return True
@@ -58,13 +58,10 @@ def main():
         print("❌ Failed to install dependencies")
         return
     
-    # Step 2: Process data if output doesn't exist
-    if not os.path.exists("./output"):
-        if not process_data():
-            print("❌ Data processing failed, cannot continue")
-            return
-    else:
-        print("✅ Output data already exists")
+    # Step 2: Process new or changed datasets (per-dataset manifests in ./output)
+    if not process_data():
+        print("❌ Data processing failed, cannot continue")
+        return
     
     # Step 3: Launch the dashboard
     print("🎯 Launching dashboard...")
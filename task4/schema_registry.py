@@ -0,0 +1,281 @@
+"""Column roles of the orders and books tables, resolved once per layout.
+
+Vendors name the same columns differently (user_id / customer / userId,
+unit_price / price / amount, ...). A dataset's layout is its column names
+and dtypes; its fingerprint is a short hash of that list. The first time a
+layout is seen its roles are resolved:
+
+  by name     pick_col over the candidates in ORDER_ROLES / BOOK_ROLES
+  by values   roles no column name matched are looked for in the first
+              rows: ids mostly found among the users' / books' ids,
+              parseable timestamps, price-like strings, small integer
+              quantities. An id column matched by name is also checked
+              against the known ids, and replaced when it fails and
+              another column passes
+
+The result goes into a registry file (by default
+<out_dir>/.cache/schema_registry.json), so later runs, and later batches of
+the same feed, look the fingerprint up instead. A layout that resolved
+wrongly can be fixed by editing its "roles" in the registry; the entry is
+used as written from then on.
+
+ResolvedSchema.renames maps the columns to their canonical names and
+ResolvedSchema.casts gives the dtype conversions that can be done up front,
+so a frame is renamed and cast in one pass.
+"""
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from outputs import write_json_atomic
+from prices import parse_price_series
+from timestamps import parse_timestamp_series
+
+# bump when resolution changes so older registry entries are ignored
+REGISTRY_VERSION = 1
+REGISTRY_FILE = 'schema_registry.json'
+
+# canonical column -> candidate names, most specific first
+ORDER_ROLES = {
+    'user_id': ['user_id', 'user', 'customer_id', 'customer', 'userId', 'id'],
+    'quantity': ['quantity', 'qty', 'count'],
+    'unit_price': ['unit_price', 'price', 'unitprice', 'amount'],
+    'timestamp_raw': ['timestamp', 'order_ts', 'created_at', 'order_date', 'date', 'time'],
+    'book_id': ['book_id', 'isbn', 'sku', 'product_id', 'book'],
+}
+BOOK_ROLES = {
+    'book_id': ['book_id', 'id', 'isbn', 'sku', 'product_id'],
+}
+ROLES = {'orders': ORDER_ROLES, 'books': BOOK_ROLES}
+
+# rows looked at when a role has to be found by its values
+SAMPLE_ROWS = 1000
+# share of the sampled non-null values that must fit a role
+MIN_SAMPLE_MATCH = 0.9
+MAX_SAMPLED_QUANTITY = 1000
+# a currency sign/code or a decimal separator after a digit, in a short string
+PRICE_HINT = re.compile(r'[$€£¢]|USD|EUR|\d[.,]', re.IGNORECASE)
+MAX_PRICE_LENGTH = 24
+
+
+def pick_col(cols, candidates):
+    for c in candidates:
+        if c in cols: return c
+    lower = {col.lower(): col for col in cols}
+    for c in candidates:
+        if c.lower() in lower:
+            return lower[c.lower()]
+    return None
+
+
+def registry_path(cache_dir):
+    return os.path.join(cache_dir, REGISTRY_FILE)
+
+
+def column_layout(columns):
+    """[[name, dtype string], ...] from (name, dtype) pairs, e.g. df.dtypes.items()."""
+    return [[str(name), str(dtype)] for name, dtype in columns]
+
+
+def layout_fingerprint(kind, layout):
+    payload = json.dumps([REGISTRY_VERSION, kind, layout], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class ResolvedSchema:
+    """The roles of one layout: roles[canonical] is the column holding it,
+    or None; sources[canonical] says how it was found ('name', 'sampled',
+    'registry')."""
+
+    def __init__(self, kind, fingerprint, layout, roles, sources):
+        self.kind = kind
+        self.fingerprint = fingerprint
+        self.dtypes = dict(layout)
+        self.roles = roles
+        self.sources = sources
+
+    def renames(self):
+        """{column: canonical name} for the columns that need renaming."""
+        return {col: role for role, col in self.roles.items() if col and col != role}
+
+    def source_dtype(self, role):
+        col = self.roles.get(role)
+        return self.dtypes.get(col) if col else None
+
+    @property
+    def casts(self):
+        """{canonical name: dtype} conversions known from the layout alone."""
+        if self.kind == 'books':
+            return {'book_id': 'str'} if self.roles.get('book_id') else {}
+        quantity = self.source_dtype('quantity')
+        if quantity and is_integer_dtype(quantity):
+            return {'quantity': 'int64'}
+        return {}
+
+    def record(self):
+        return {'kind': self.kind, 'columns': [[k, v] for k, v in self.dtypes.items()],
+                'roles': self.roles, 'sources': self.sources}
+
+    def describe(self):
+        found = [f"{col}->{role}" if col != role else role for role, col in self.roles.items() if col]
+        sampled = [role for role, how in self.sources.items() if how == 'sampled']
+        how = 'from registry' if 'registry' in self.sources.values() else 'resolved'
+        text = f"{self.kind} {self.fingerprint} {how}: " + (", ".join(found) or "no roles")
+        return text + (f" (by values: {', '.join(sampled)})" if sampled else "")
+
+
+def is_integer_dtype(dtype):
+    """numpy integer dtypes only: nullable Int64 etc. may hold missing values."""
+    try:
+        return np.dtype(dtype).kind in 'iu'
+    except TypeError:
+        return False
+
+
+def roles_by_name(columns, candidates):
+    return {role: pick_col(columns, names) for role, names in candidates.items()}
+
+
+def best_column(sample, columns, score):
+    """The column scoring highest (first on ties), if it reaches MIN_SAMPLE_MATCH."""
+    best, best_score = None, MIN_SAMPLE_MATCH
+    for col in columns:
+        values = sample[col].dropna()
+        if values.empty:
+            continue
+        s = score(values)
+        if s >= best_score and (best is None or s > best_score):
+            best, best_score = col, s
+    return best
+
+
+def id_score(known):
+    def score(values):
+        return float(values.astype(str).isin(known).mean())
+    return score
+
+
+def timestamp_score(values):
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return 1.0
+    if not (pd.api.types.is_string_dtype(values.dtype) or values.dtype == object):
+        return 0.0
+    return float(parse_timestamp_series(values.astype(str)).notna().mean())
+
+
+def price_score(values):
+    if pd.api.types.is_float_dtype(values.dtype):
+        # prices have cents somewhere; whole-number floats are more likely counts
+        return 1.0 if (values != np.floor(values)).any() else 0.0
+    if not (pd.api.types.is_string_dtype(values.dtype) or values.dtype == object):
+        return 0.0
+    text = values.astype(str)
+    hints = text.str.contains(PRICE_HINT) & (text.str.len() <= MAX_PRICE_LENGTH)
+    return float((hints & parse_price_series(text).notna()).mean())
+
+
+def quantity_score(values):
+    if pd.api.types.is_bool_dtype(values.dtype) or not pd.api.types.is_numeric_dtype(values.dtype):
+        return 0.0
+    fits = (values >= 0) & (values <= MAX_SAMPLED_QUANTITY) & (values == np.floor(values))
+    return float(fits.mean())
+
+
+def roles_by_values(sample, roles, known_ids):
+    """Roles found from the sampled rows: those pick_col left empty, and id
+    roles whose named column doesn't hold the known ids (a bare 'id' is
+    often the order's own id) when another column does. Only columns no
+    role claimed are considered. known_ids maps 'user_id' / 'book_id' to
+    the set of ids (as strings) orders can refer to."""
+    id_scores = [(role, id_score(known_ids[role])) for role in ('book_id', 'user_id') if known_ids.get(role)]
+    unverified = {role for role, score in id_scores
+                  if roles.get(role) and best_column(sample, [roles[role]], score) is None}
+    found = {}
+    free = [col for col in sample.columns if col not in set(roles.values())]
+    scores = id_scores + [('timestamp_raw', timestamp_score), ('unit_price', price_score),
+                          ('quantity', quantity_score)]
+    for role, score in scores:
+        if role not in roles or (roles[role] is not None and role not in unverified):
+            continue
+        col = best_column(sample, free, score)
+        if col is not None:
+            found[role] = col
+            free.remove(col)
+    return found
+
+
+class SchemaRegistry:
+    """Resolved layouts by fingerprint, backed by a JSON file (or only kept
+    in memory when path is None). Safe to share between runs; concurrent
+    writers at worst resolve a layout twice."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.stats = {'registry': 0, 'resolved': 0}
+        self._records = None
+
+    def records(self):
+        if self._records is None:
+            self._records = self.read()
+        return self._records
+
+    def read(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(data, dict) or data.get('registry_version') != REGISTRY_VERSION:
+            return {}
+        return data.get('schemas', {})
+
+    def resolve(self, kind, layout, sample=None, known_ids=None):
+        """ResolvedSchema for a layout (column_layout). sample() (a
+        DataFrame of the first rows) and known_ids() (see roles_by_values)
+        are only called for orders layouts the registry doesn't know."""
+        fingerprint = layout_fingerprint(kind, layout)
+        record = self.records().get(fingerprint)
+        if valid_record(record, kind, layout):
+            self.stats['registry'] += 1
+            return ResolvedSchema(kind, fingerprint, layout, record['roles'],
+                                  {role: 'registry' for role, col in record['roles'].items() if col})
+
+        columns = [name for name, _ in layout]
+        roles = roles_by_name(columns, ROLES[kind])
+        sources = {role: 'name' for role, col in roles.items() if col}
+        if kind == 'orders' and sample is not None:
+            for role, col in roles_by_values(sample(), roles, known_ids() if known_ids else {}).items():
+                roles[role] = col
+                sources[role] = 'sampled'
+        schema = ResolvedSchema(kind, fingerprint, layout, roles, sources)
+        self.stats['resolved'] += 1
+        self.records()[fingerprint] = schema.record()
+        self.write(fingerprint, schema.record())
+        return schema
+
+    def write(self, fingerprint, record):
+        """Add one entry to the file, keeping whatever other runs added meanwhile."""
+        if not self.path:
+            return
+        schemas = self.read()
+        schemas[fingerprint] = record
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            write_json_atomic(self.path, {'registry_version': REGISTRY_VERSION, 'schemas': schemas})
+        except OSError:
+            pass  # read-only cache dir: resolve again next run
+
+
+def valid_record(record, kind, layout):
+    """A registry entry that fits this layout (hand edits included)."""
+    if not isinstance(record, dict) or record.get('kind') != kind or not isinstance(record.get('roles'), dict):
+        return False
+    columns = {name for name, _ in layout}
+    return all(role in record['roles'] and (record['roles'][role] is None or record['roles'][role] in columns)
+               for role in ROLES[kind])
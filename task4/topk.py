@@ -0,0 +1,157 @@
+"""Top-k over grouped sums: exact heaps and a Space-Saving sketch.
+
+TopK keeps the k largest (key, value) pairs in a bounded min-heap, so
+finding them costs O(n log k) instead of a full sort. Ties go to the pair
+pushed first (the same rule as a stable sort, or heapq.nlargest);
+from_series pre-filters with np.partition so only candidates reach the heap. Two
+TopKs built over partitions with disjoint keys (one per tenant, per
+dataset, per author...) merge into the exact TopK of their union. Across
+batches of one key space, first merge the grouped partial sums
+(aggregations.OrderTotals does that) and take the top k at the end.
+
+SpaceSaving (Metwally et al.) finds the heavy hitters of a weighted stream
+(top books, authors or customers) with a fixed number of counters,
+whatever the number of distinct keys. Each counter's count
+overestimates the true total by at most its error. Any key whose true
+total is above total_weight / capacity is guaranteed to have a counter.
+Sketches merge, so batches or worker processes can each keep their own.
+"""
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+
+class TopK:
+    """The k largest values pushed so far, with their keys."""
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_series(cls, series, k):
+        """TopK of a Series' values, keyed by its index labels."""
+        values = series.to_numpy(dtype=float)
+        rows = np.flatnonzero(~np.isnan(values))
+        if len(rows) > 4 * k:
+            # only values reaching the k-th largest can make it; np.partition
+            # finds that threshold in linear time and keeps the heap small
+            kth = np.partition(values[rows], len(rows) - k)[len(rows) - k]
+            rows = rows[values[rows] >= kth]
+        return cls(k).push_many(series.index[rows].tolist(), series.iloc[rows].tolist())
+
+    def push(self, key, value):
+        if value != value:  # NaN never ranks
+            return
+        # the root is the entry to evict: smallest value, then latest pushed
+        entry = (value, -next(self._seq), key)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def push_many(self, keys, values):
+        for key, value in zip(keys, values):
+            self.push(key, value)
+        return self
+
+    def merge(self, other):
+        """Fold in a TopK over other keys; ties rank self's entries first."""
+        for key, value in other.items():
+            self.push(key, value)
+        return self
+
+    def items(self):
+        """[(key, value)], largest first."""
+        return [(key, value) for value, _, key in sorted(self._heap, reverse=True)]
+
+
+def top_k(series, k):
+    """The k largest values of a Series as [(index label, value)], largest first."""
+    return TopK.from_series(series, k).items()
+
+
+class SpaceSaving:
+    """Weighted Space-Saving sketch with at most capacity counters."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("SpaceSaving needs at least one counter")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # (count, seq, key) entries; stale ones (count since raised) are skipped on pop
+        self._heap = []
+        self._seq = itertools.count()
+
+    def update(self, key, weight=1):
+        self.total += weight
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            min_count, min_key = self._pop_min()
+            del self.counts[min_key], self.errors[min_key]
+            self.counts[key] = min_count + weight
+            self.errors[key] = min_count
+        self._push(key)
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def update_many(self, keys, weights):
+        """Add a batch; weights are summed per key first, so every distinct
+        key of the batch costs one update."""
+        sums = pd.Series(weights).groupby(pd.Series(keys).to_numpy(), sort=False).sum()
+        for key, weight in zip(sums.index.tolist(), sums.tolist()):
+            self.update(key, weight)
+        return self
+
+    def min_count(self):
+        """Smallest counter when the sketch is full (an upper bound on the
+        total of any key without a counter), else 0."""
+        if len(self.counts) < self.capacity:
+            return 0
+        count, key = self._pop_min()
+        self._push(key)
+        return count
+
+    def _push(self, key):
+        heapq.heappush(self._heap, (self.counts[key], next(self._seq), key))
+
+    def _rebuild_heap(self):
+        self._heap = [(count, next(self._seq), key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, _, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def merge(self, other):
+        """A sketch of both streams (counts and errors stay upper bounds)."""
+        merged = SpaceSaving(self.capacity)
+        min_self, min_other = self.min_count(), other.min_count()
+        combined = []
+        for key in itertools.chain(self.counts, (key for key in other.counts if key not in self.counts)):
+            count = self.counts.get(key, min_self) + other.counts.get(key, min_other)
+            error = self.errors.get(key, min_self) + other.errors.get(key, min_other)
+            combined.append((count, error, key))
+        for count, error, key in heapq.nlargest(self.capacity, combined, key=lambda c: c[0]):
+            merged.counts[key] = count
+            merged.errors[key] = error
+        merged.total = self.total + other.total
+        merged._rebuild_heap()
+        return merged
+
+    def top(self, k):
+        """[(key, count, error)] for the k largest counters, largest first.
+        The true total of each key lies in [count - error, count]."""
+        top = heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+        return [(key, count, self.errors[key]) for key, count in top]
@@ -0,0 +1,118 @@
+"""Array-backed disjoint sets over integer-encoded ids."""
+from array import array
+
+import numpy as np
+
+
+class UnionFind:
+    """Disjoint sets over the integers 0..n-1.
+
+    Parent and rank live in flat typed arrays, find uses iterative path
+    halving and union links by rank. Each set also carries a label: the
+    element whose root it was on the left-hand side of the union that
+    formed it, i.e. the root a naive ``parent[find(b)] = find(a)``
+    implementation would report. Labels therefore don't depend on how
+    the trees were balanced, which keeps cluster ids stable.
+    """
+
+    def __init__(self, n=0):
+        self.parent = array('q', range(n))
+        self.rank = array('b', bytes(n))
+        self.label = array('q', range(n))
+
+    @classmethod
+    def from_state(cls, parent, rank, label):
+        """Rebuild from the bytes returned by state()."""
+        uf = cls()
+        uf.parent.frombytes(parent)
+        uf.rank.frombytes(rank)
+        uf.label.frombytes(label)
+        return uf
+
+    def state(self):
+        """(parent, rank, label) as bytes, for storing the sets."""
+        return self.parent.tobytes(), self.rank.tobytes(), self.label.tobytes()
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self, count=1):
+        """Append count singleton sets and return the id of the first one."""
+        start = len(self.parent)
+        self.parent.extend(range(start, start + count))
+        self.rank.extend(bytes(count))
+        self.label.extend(range(start, start + count))
+        return start
+
+    def reset(self, elements):
+        """Make each of elements a singleton again. Only valid when
+        elements covers whole sets: nothing outside may point into them."""
+        parent, rank, label = self.parent, self.rank, self.label
+        for x in np.asarray(elements, dtype=np.int64).tolist():
+            parent[x] = x
+            rank[x] = 0
+            label[x] = x
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """Merge the sets holding a and b; returns False if already merged."""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        keep = self.label[ra]
+        rank = self.rank
+        if rank[ra] < rank[rb]:
+            ra, rb = rb, ra
+        elif rank[ra] == rank[rb]:
+            rank[ra] += 1
+        self.parent[rb] = ra
+        self.label[ra] = keep
+        return True
+
+    def union_many(self, pairs):
+        """Apply union(a, b) for every row of an (m, 2) edge array, in order.
+
+        Returns the number of unions that merged two different sets.
+        """
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        parent, rank, label = self.parent, self.rank, self.label
+        merged = 0
+        for a, b in zip(pairs[:, 0].tolist(), pairs[:, 1].tolist()):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            if a == b:
+                continue
+            keep = label[a]
+            if rank[a] < rank[b]:
+                a, b = b, a
+            elif rank[a] == rank[b]:
+                rank[a] += 1
+            parent[b] = a
+            label[a] = keep
+            merged += 1
+        return merged
+
+    def roots(self):
+        """Root of every element as one int64 array (fully compresses the trees)."""
+        parent = np.frombuffer(self.parent, dtype=np.int64).copy()
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        self.parent = array('q', parent.tobytes())
+        return parent
+
+    def labels(self):
+        """Set label of every element as one int64 array."""
+        return np.frombuffer(self.label, dtype=np.int64)[self.roots()]
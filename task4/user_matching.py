@@ -0,0 +1,287 @@
+"""Fuzzy user matching on canonical name / email / phone / address keys.
+
+user_reconciliation links two users when 3 of their 4 fields are equal
+once stripped and lowercased, so '(555) 123-4567' and '555.123.4567', or
+'Apt. 12 Main Street' and 'apt 12 main st', count as different values.
+FuzzyMatcher canonicalizes each field first:
+
+  phone    digits only, a leading country code 1 and any extension dropped
+  email    lowercased local@domain, without a '+tag' or 'mailto:'
+  name     set of lowercased word tokens, titles and suffixes (Dr., Jr.) dropped
+  address  set of lowercased word tokens, street abbreviations unified
+           (Street/St., Apartment/Apt./#, ...)
+
+Comparing every pair is O(n^2), so candidate pairs come from blocking:
+
+  sorted   sorted neighbourhood: rows are sorted by each canonical key in
+           turn and every row is paired with the next window - 1 rows
+  lsh      rows with equal canonical phone or email, plus MinHash LSH over
+           each row's name and address tokens: rows whose signatures agree
+           on all rows of any band become candidates
+
+Only candidates are scored, all at once with numpy: phone and email agree
+when their canonical values are equal, name and address when the Jaccard
+similarity of their token sets reaches the field's threshold. A pair whose
+agreeing fields reach min_fields becomes an edge, as in the exact rule;
+with thresholds of 1.0 the rule is the exact one on canonical values.
+"""
+import numpy as np
+import pandas as pd
+
+from user_reconciliation import MATCH_FIELDS, MIN_MATCHES
+
+BLOCKINGS = ('sorted', 'lsh')
+EMPTY_VALUES = ('', 'null', 'none', 'nan', 'n/a', 'na', '-')
+NAME_STOPWORDS = frozenset([
+    'mr', 'mrs', 'ms', 'miss', 'mx', 'dr', 'prof', 'rev', 'sir', 'madam',
+    'jr', 'sr', 'ii', 'iii', 'iv', 'phd', 'md', 'dds', 'dvm', 'esq', 'jd',
+])
+ADDRESS_ABBREVIATIONS = {
+    'apartment': 'apt', 'suite': 'ste', 'unit': 'apt', 'street': 'st', 'avenue': 'ave',
+    'av': 'ave', 'road': 'rd', 'boulevard': 'blvd', 'drive': 'dr', 'lane': 'ln',
+    'court': 'ct', 'place': 'pl', 'square': 'sq', 'terrace': 'ter', 'highway': 'hwy',
+    'parkway': 'pkwy', 'circle': 'cir', 'mount': 'mt', 'fort': 'ft', 'north': 'n',
+    'south': 's', 'east': 'e', 'west': 'w',
+}
+# tokens of a name / address that make up its sorted-neighbourhood key
+KEY_TOKENS = 4
+# Mersenne prime for the MinHash permutations (a * token + b) % MERSENNE
+MERSENNE = (1 << 31) - 1
+
+
+def _blank(s):
+    """s lowercased and stripped, with the EMPTY_VALUES turned into ''."""
+    s = s.fillna('').astype(str).str.strip().str.lower()
+    return s.where(~s.isin(EMPTY_VALUES), '')
+
+
+def canonical_phones(s):
+    """Digits only; extensions and a leading US country code 1 dropped."""
+    s = _blank(s).str.replace(r'\s*(?:x|ext\.?|extension)\s*\d+$', '', regex=True)
+    digits = s.str.replace(r'\D', '', regex=True)
+    digits = digits.where(~((digits.str.len() == 11) & digits.str.startswith('1')), digits.str[1:])
+    return digits.where(digits.str.len() >= 7, '')
+
+
+def canonical_emails(s):
+    """local@domain, lowercased, without 'mailto:' or a '+tag' on the local part."""
+    s = _blank(s).str.replace(r'^mailto:', '', regex=True).str.replace(r'\s+', '', regex=True)
+    return s.str.replace(r'\+[^@]*@', '@', regex=True)
+
+
+def token_sets(s, stopwords=(), synonyms=None):
+    """Lowercased word tokens of each value, deduplicated, as a
+    (row, token) frame; stopwords are dropped and synonyms mapped."""
+    tokens = _blank(s).str.replace(r'[^\w\s]', ' ', regex=True).str.split().explode()
+    tokens = tokens[tokens.notna() & ~tokens.isin(stopwords)]
+    if synonyms:
+        tokens = tokens.replace(synonyms)
+    frame = pd.DataFrame({'row': tokens.index.to_numpy(), 'token': tokens.to_numpy()})
+    return frame.drop_duplicates(ignore_index=True)
+
+
+def _codes(values):
+    """Integer code per canonical value in sorted order, -1 for ''."""
+    codes, _ = pd.factorize(values.where(values != '', None), sort=True, use_na_sentinel=True)
+    return codes.astype(np.int64)
+
+
+def token_keys(frame, n, width=KEY_TOKENS):
+    """Sort key of each row's token set, -1 for an empty set: the rank of
+    its first `width` tokens in sorted order, so rows with similar token
+    sets get close keys."""
+    ranks = pd.factorize(frame['token'], sort=True)[0].astype(np.int64)
+    rows = frame['row'].to_numpy(dtype=np.int64)
+    order = np.lexsort((ranks, rows))
+    rows, ranks = rows[order], ranks[order]
+    position = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    first = position < width
+    matrix = np.full((n, width), -1, dtype=np.int64)
+    matrix[rows[first], position[first]] = ranks[first]
+    order = np.lexsort(matrix.T[::-1])
+    ordered = matrix[order]
+    new = np.ones(n, dtype=np.int64)
+    new[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+    keys = np.empty(n, dtype=np.int64)
+    keys[order] = np.cumsum(new) - 1
+    keys[matrix[:, 0] == -1] = -1
+    return keys
+
+
+class TokenSets:
+    """Per-row token sets as integer token ids in CSR form (rows sorted,
+    each row's ids in offsets[row]:offsets[row + 1])."""
+
+    def __init__(self, rows, ids, n):
+        order = np.lexsort((ids, rows))
+        self.ids = ids[order]
+        self.offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.offsets[1:])
+        self.sizes = np.diff(self.offsets)
+
+    def gather(self, rows):
+        """(pair position, token id) of every token of the given rows."""
+        sizes = self.sizes[rows]
+        owner = np.repeat(np.arange(len(rows), dtype=np.int64), sizes)
+        starts = np.repeat(self.offsets[rows] - np.cumsum(sizes) + sizes, sizes)
+        return owner, self.ids[starts + np.arange(len(owner), dtype=np.int64)]
+
+    def jaccard(self, left, right):
+        """Jaccard similarity of the token sets of each (left, right) pair;
+        NaN where either set is empty."""
+        owner_l, ids_l = self.gather(left)
+        owner_r, ids_r = self.gather(right)
+        span = np.int64(self.ids.max() + 1 if len(self.ids) else 1)
+        keys = np.sort(np.concatenate([owner_l * span + ids_l, owner_r * span + ids_r]))
+        # sets hold no duplicates, so an id seen twice in a pair is shared
+        shared = keys[1:][keys[1:] == keys[:-1]]
+        inter = np.bincount(shared // span, minlength=len(left))
+        union = self.sizes[left] + self.sizes[right] - inter
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sim = inter / union
+        sim[(self.sizes[left] == 0) | (self.sizes[right] == 0)] = np.nan
+        return sim
+
+
+def canonical_users(norm):
+    """Canonical fields of the match-field frame norm: {'phone', 'email',
+    'name_key', 'address_key': sorted code arrays (-1 = empty), 'name',
+    'address': TokenSets, 'tokens': TokenSets of name and address
+    together (the MinHash input)}."""
+    n = len(norm)
+    index = pd.RangeIndex(n)
+    fields = {}
+    for col, canon in (('phone', canonical_phones), ('email', canonical_emails)):
+        fields[col] = _codes(canon(pd.Series(norm[col].to_numpy(), index=index)))
+
+    frames = []
+    for col, stopwords, synonyms in (('name', NAME_STOPWORDS, None), ('address', (), ADDRESS_ABBREVIATIONS)):
+        frame = token_sets(pd.Series(norm[col].to_numpy(), index=index), stopwords, synonyms)
+        fields[col + '_key'] = token_keys(frame, n)
+        frames.append(frame.assign(token=col[0] + ':' + frame['token']))
+    tokens = pd.concat(frames, ignore_index=True)
+    ids = pd.factorize(tokens['token'])[0].astype(np.int64)
+    rows = tokens['row'].to_numpy(dtype=np.int64)
+    kinds = tokens['token'].str[0].to_numpy()
+    for col in ('name', 'address'):
+        mask = kinds == col[0]
+        fields[col] = TokenSets(rows[mask], ids[mask], n)
+    fields['tokens'] = TokenSets(rows, ids, n)
+    return fields
+
+
+def neighbour_pairs(keys, window, equal_only=False):
+    """(i, j) pairs, i < j, of rows within window of each other once
+    sorted by keys (rows whose key is -1 are left out). equal_only keeps
+    only neighbours with equal keys."""
+    rows = np.flatnonzero(keys != -1)
+    rows = rows[np.argsort(keys[rows], kind='stable')]
+    sorted_keys = keys[rows]
+    pairs = []
+    for offset in range(1, min(window, len(rows))):
+        a, b = rows[:-offset], rows[offset:]
+        if equal_only:
+            same = sorted_keys[:-offset] == sorted_keys[offset:]
+            if not same.any():
+                break
+            a, b = a[same], b[same]
+        pairs.append(np.column_stack([np.minimum(a, b), np.maximum(a, b)]))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(pairs)
+
+
+def minhash_signatures(tokens, num_perm, seed=1):
+    """(n, num_perm) MinHash signatures of a TokenSets; rows with no
+    tokens get MERSENNE in every column."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE, num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE, num_perm, dtype=np.uint64)
+    ids = tokens.ids.astype(np.uint64)
+    present = tokens.sizes > 0
+    starts = tokens.offsets[:-1][present]
+    signatures = np.full((len(tokens.sizes), num_perm), MERSENNE, dtype=np.uint64)
+    if len(ids):
+        for p in range(num_perm):
+            signatures[present, p] = np.minimum.reduceat((a[p] * ids + b[p]) % np.uint64(MERSENNE), starts)
+    return signatures
+
+
+class FuzzyMatcher:
+    """Candidate generation plus scoring; edges(norm) has the signature of
+    user_reconciliation.blocking_edges.
+
+    min_fields: agreeing fields needed for a match.
+    name_threshold / address_threshold: token-set Jaccard at which the
+      name / address count as agreeing.
+    blocking: 'sorted' (window rows per sort key) or 'lsh' (bands x rows
+      MinHash; each LSH bucket and each equal phone / email run is paired
+      like a sorted neighbourhood of window).
+    """
+
+    def __init__(self, min_fields=MIN_MATCHES, name_threshold=0.8, address_threshold=0.8,
+                 blocking='sorted', window=8, bands=16, rows=4):
+        if blocking not in BLOCKINGS:
+            raise ValueError(f"Unknown blocking {blocking!r}, expected one of {BLOCKINGS}")
+        if not 1 <= min_fields <= len(MATCH_FIELDS):
+            raise ValueError(f"min_fields must be between 1 and {len(MATCH_FIELDS)}")
+        self.min_fields = min_fields
+        self.thresholds = {'name': name_threshold, 'address': address_threshold}
+        self.blocking = blocking
+        self.window = window
+        self.bands = bands
+        self.rows = rows
+
+    def params(self):
+        """The settings that change the clusters, for manifests."""
+        return {'blocking': self.blocking, 'min_fields': self.min_fields, 'window': self.window,
+                **{f'{field}_threshold': t for field, t in self.thresholds.items()},
+                **({'bands': self.bands, 'rows': self.rows} if self.blocking == 'lsh' else {})}
+
+    def candidates(self, fields):
+        """Unique candidate pairs (i, j), i < j, sorted."""
+        if self.blocking == 'sorted':
+            pairs = [neighbour_pairs(fields[key], self.window)
+                     for key in ('phone', 'email', 'name_key', 'address_key')]
+        else:
+            signatures = minhash_signatures(fields['tokens'], self.bands * self.rows)
+            present = fields['tokens'].sizes > 0
+            pairs = [neighbour_pairs(fields[key], self.window, equal_only=True) for key in ('phone', 'email')]
+            for band in range(self.bands):
+                band_rows = signatures[:, band * self.rows:(band + 1) * self.rows]
+                key = np.zeros(len(band_rows), dtype=np.uint64)
+                for col in band_rows.T:
+                    key = key * np.uint64(1000003) ^ col
+                key = key.view(np.int64).copy()
+                key[~present] = -1
+                pairs.append(neighbour_pairs(key, self.window, equal_only=True))
+        pairs = np.concatenate(pairs)
+        n = len(fields['phone'])
+        keys = np.sort(pairs[:, 0] * n + pairs[:, 1])
+        if len(keys):
+            keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        return np.column_stack([keys // n, keys % n])
+
+    def score(self, fields, pairs):
+        """Number of agreeing fields of each candidate pair. The token
+        fields are only compared for pairs that can still reach
+        min_fields, so most non-matches never get a Jaccard."""
+        left, right = pairs[:, 0], pairs[:, 1]
+        agree = np.zeros(len(pairs), dtype=np.int64)
+        for col in ('phone', 'email'):
+            codes = fields[col]
+            agree += (codes[left] >= 0) & (codes[left] == codes[right])
+        remaining = len(self.thresholds)
+        for col, threshold in self.thresholds.items():
+            alive = np.flatnonzero(agree + remaining >= self.min_fields)
+            agree[alive] += fields[col].jaccard(left[alive], right[alive]) >= threshold
+            remaining -= 1
+        return agree
+
+    def edges(self, norm):
+        """Matching pairs (i, j), i < j, sorted by (i, j)."""
+        fields = canonical_users(norm)
+        pairs = self.candidates(fields)
+        if not len(pairs):
+            return pairs
+        return pairs[self.score(fields, pairs) >= self.min_fields]
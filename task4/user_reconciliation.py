@@ -0,0 +1,116 @@
+"""User reconciliation shared by process_data.py and bookstore_analytics.py.
+
+Two user rows belong to the same real customer when at least 3 of their
+normalized name / email / phone / address fields are equal and non-empty.
+Any such pair must share at least one 3-field combination, so instead of
+comparing every pair we bucket users by their four 3-of-4 combinations and
+only link users that land in the same bucket.
+"""
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from union_find import UnionFind
+
+MATCH_FIELDS = ['name', 'email', 'phone', 'address']
+MIN_MATCHES = 3
+
+
+def prepare_users(df_users):
+    """Stringify the users frame and make sure user_id and the match fields exist."""
+    # fillna already returns a new frame, so the caller's is never modified
+    df = df_users.fillna("").astype(str)
+    if 'user_id' not in df.columns:
+        if 'id' in df.columns:
+            df = df.rename(columns={'id': 'user_id'})
+        else:
+            df = df.reset_index().rename(columns={'index': 'user_id'})
+    for c in MATCH_FIELDS:
+        if c not in df.columns:
+            df[c] = ''
+    return df
+
+
+def normalize_match_fields(df):
+    """Return the match fields stripped and lowercased, one column per field."""
+    return pd.DataFrame(
+        {c: [str(v).strip().lower() for v in df[c].tolist()] for c in MATCH_FIELDS},
+        index=df.index,
+    )
+
+
+def blocking_edges(norm):
+    """Candidate edges (i, j), i < j, for rows sharing a 3-field blocking key.
+
+    Every user in a bucket agrees with the others on the bucket's three
+    fields, so each bucket is a clique. Linking each member to the
+    bucket's first row is enough: the remaining clique edges only join
+    rows that are already connected. Edges come back as an (m, 2) array
+    sorted by (i, j), which is the order the pairwise scan visits them in.
+    """
+    n = len(norm)
+    positions = np.arange(n, dtype=np.int64)
+    empty = (norm == '').to_numpy()
+    edge_keys = []
+    for combo in combinations(range(len(MATCH_FIELDS)), MIN_MATCHES):
+        mask = ~empty[:, list(combo)].any(axis=1)
+        if mask.sum() < 2:
+            continue
+        cols = [MATCH_FIELDS[k] for k in combo]
+        bucket = norm.loc[mask, cols].groupby(cols, sort=False).ngroup().to_numpy()
+        members = positions[mask]
+        first = pd.Series(members).groupby(bucket).transform('min').to_numpy()
+        linked = members != first
+        edge_keys.append(first[linked] * n + members[linked])
+    if not edge_keys:
+        return np.empty((0, 2), dtype=np.int64)
+    keys = np.unique(np.concatenate(edge_keys))
+    return np.column_stack([keys // n, keys % n])
+
+
+def pairwise_edges(norm):
+    """Reference O(n^2) scan kept for verification and benchmarks."""
+    records = norm.to_dict(orient='records')
+    n = len(records)
+    edges = []
+    for i in range(n):
+        for j in range(i+1, n):
+            matches = 0
+            for k in MATCH_FIELDS:
+                if records[i][k] != '' and records[i][k] == records[j][k]:
+                    matches += 1
+            if matches >= MIN_MATCHES:
+                edges.append((i, j))
+    return np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+
+def reconcile_users(df_users, indexed=True, matcher=None):
+    """Cluster users into real customers.
+
+    Returns the prepared users frame with a cluster_id column, the
+    user_id -> cluster_id mapping and the cluster_id -> [user_id] dict.
+    Set indexed=False to fall back to the pairwise scan, or pass a
+    user_matching.FuzzyMatcher to match on canonical keys instead.
+    """
+    df = prepare_users(df_users)
+    ids = df['user_id'].tolist()
+    norm = normalize_match_fields(df)
+    if matcher is not None:
+        edges = matcher.edges(norm)
+    else:
+        edges = blocking_edges(norm) if indexed else pairwise_edges(norm)
+
+    # union on user ids rather than rows so repeated ids share one set
+    codes, uniques = pd.factorize(df['user_id'], sort=False)
+    uf = UnionFind(len(uniques))
+    uf.union_many(codes[edges])
+    cluster_ids = np.asarray(uniques, dtype=object)[uf.labels()[codes]]
+
+    mapping = dict(zip(ids, cluster_ids.tolist()))
+    clusters = defaultdict(list)
+    for uid, root in zip(ids, cluster_ids.tolist()):
+        clusters[root].append(uid)
+    df['cluster_id'] = cluster_ids
+    return df, mapping, clusters
@@ -0,0 +1,338 @@
+"""Persistent user clusters, updated incrementally as users arrive or change.
+
+reconcile_users rebuilds every cluster from users.csv on each run.
+UserClusterStore keeps what that run works out in a SQLite file instead:
+
+  users       user_id -> position in the union-find and a digest of its
+              name / email / phone / address, to spot changed users
+  block_keys  the hash of each user's 3-of-4 blocking keys
+              (user_reconciliation.blocking_edges), indexed by key
+  union_find  the UnionFind arrays
+
+A later run only looks at the users that are new or whose digest changed
+(and, for a full users.csv, those that disappeared). New users get their
+own sets and are linked to everyone sharing one of their blocking keys,
+found through the index. A changed or removed user may split its cluster,
+and a union-find can't split, so that cluster's members are reset to
+singletons and relinked the same way. Clusters the delta doesn't touch
+keep their cluster_id, and linking a new user to a cluster keeps that
+cluster's id.
+
+What reconcile(df_users), the pipeline's --user-store path, saves is the
+matching: the union-find is not rebuilt, and only the delta's users are
+normalized, blocked and linked. It still factorizes and digests every
+row of the users table it is given, and reads the store's whole users
+table to find the delta. That part grows with the customer base.
+update(df_delta), the --users-delta path, costs in proportion to the
+delta alone: it is handed the new and changed rows and never looks at
+the others. It can't tell about removed users; those need a reconcile.
+assign(df_users) then only looks up the stored cluster of every user,
+for the tables and metrics that cover all of them.
+
+The first run on an empty store is a plain reconcile_users, so it gives
+the same cluster ids. Later runs give the same clusters as a full rebuild,
+but a cluster that merged or split may be named after another member.
+"""
+import os
+import sqlite3
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from books import CACHE_SUBDIR
+from union_find import UnionFind
+from user_reconciliation import MATCH_FIELDS, MIN_MATCHES, blocking_edges, normalize_match_fields, prepare_users
+
+# bump when blocking keys or digests change so older stores are rebuilt
+STORE_VERSION = 1
+COMBOS = list(combinations(range(len(MATCH_FIELDS)), MIN_MATCHES))
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, pos INTEGER NOT NULL, digest INTEGER NOT NULL)",
+    # clustered on the key, so a bucket's members are read in one go
+    "CREATE TABLE IF NOT EXISTS block_keys (combo INTEGER NOT NULL, key INTEGER NOT NULL, pos INTEGER NOT NULL, "
+    "PRIMARY KEY (combo, key, pos)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS union_find (id INTEGER PRIMARY KEY CHECK (id = 0), parent BLOB, rank BLOB, label BLOB)",
+]
+# dropped while the store is bulk loaded
+INDEXES = {
+    'users_pos': "CREATE INDEX IF NOT EXISTS users_pos ON users (pos)",
+    'block_keys_pos': "CREATE INDEX IF NOT EXISTS block_keys_pos ON block_keys (pos)",
+}
+
+
+def user_store_path(out_dir, dataset_name):
+    return os.path.join(out_dir, CACHE_SUBDIR, f"{dataset_name}_users.sqlite")
+
+
+def field_hashes(df):
+    """uint64 hash of every value of each match field of df (stable
+    across runs, so keys from different runs can be compared)."""
+    return {col: pd.util.hash_array(df[col].to_numpy(dtype=object), categorize=False) for col in MATCH_FIELDS}
+
+
+def combine_hashes(hashes):
+    """One uint64 per row out of several per-field hash arrays."""
+    combined = np.full(len(hashes[0]), 0x345678, dtype=np.uint64)
+    for h in hashes:
+        combined = (combined ^ h) * np.uint64(1000003)
+    return combined
+
+
+def user_digests(df, codes, n_ids):
+    """int64 digest of the raw match fields per user id (summed over
+    repeated rows of one id)."""
+    hashes = field_hashes(df)
+    rows = combine_hashes([hashes[col] for col in MATCH_FIELDS])
+    digests = np.zeros(n_ids, dtype=np.uint64)
+    np.add.at(digests, codes, rows)
+    return digests.view(np.int64)
+
+
+def block_keys(norm, positions):
+    """(combo, key, pos) frame of the blocking keys of the normalized rows
+    norm, pos being each row's union-find position."""
+    empty = (norm == '').to_numpy()
+    hashes = field_hashes(norm)
+    frames = []
+    for combo_id, combo in enumerate(COMBOS):
+        mask = ~empty[:, list(combo)].any(axis=1)
+        if not mask.any():
+            continue
+        keys = combine_hashes([hashes[MATCH_FIELDS[k]][mask] for k in combo]).view(np.int64)
+        frames.append(pd.DataFrame({'combo': combo_id, 'key': keys, 'pos': positions[mask]}))
+    if not frames:
+        return pd.DataFrame({'combo': [], 'key': [], 'pos': []}, dtype=np.int64)
+    return pd.concat(frames, ignore_index=True)
+
+
+def bucket_edges(members):
+    """Edges linking every (combo, key) bucket of members to its lowest
+    position, sorted by (i, j), like blocking_edges."""
+    first = members.groupby(['combo', 'key'])['pos'].transform('min').to_numpy()
+    pos = members['pos'].to_numpy()
+    linked = pos != first
+    edges = np.unique(np.column_stack([first[linked], pos[linked]]), axis=0)
+    return edges.reshape(-1, 2).astype(np.int64)
+
+
+def clusters_of(ids, cluster_ids):
+    clusters = defaultdict(list)
+    for uid, root in zip(ids, cluster_ids):
+        clusters[root].append(uid)
+    return clusters
+
+
+class UserClusterStore:
+    """The clusters of one dataset's users, kept in a SQLite file at path.
+
+    reconcile(df_users) takes the whole users table and returns what
+    reconcile_users returns; update(df_delta) takes only new or changed
+    users, and assign(df_users) returns the same as reconcile from the
+    stored clusters. After reconcile or update, self.stats tells how much
+    work the delta caused.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {}
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        con = sqlite3.connect(self.path)
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        for statement in SCHEMA + list(INDEXES.values()):
+            con.execute(statement)
+        version = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or int(version[0]) != STORE_VERSION:
+            with con:
+                for table in ('users', 'block_keys', 'union_find'):
+                    con.execute(f"DELETE FROM {table}")
+                con.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+        return con
+
+    def reconcile(self, df_users):
+        """Cluster the whole users table; users missing from it are dropped
+        from the store. Returns (users frame with cluster_id, user_id ->
+        cluster_id mapping, cluster_id -> [user_id] dict)."""
+        df = prepare_users(df_users)
+        codes, uniques = pd.factorize(df['user_id'], sort=False)
+        uniques = np.asarray(uniques, dtype=object)
+        con = self.connect()
+        try:
+            with con:
+                uf = self._load(con)
+                if uf is None:
+                    uf, positions = self._bootstrap(con, df, codes, uniques)
+                else:
+                    stored = pd.read_sql_query("SELECT user_id, pos, digest FROM users", con)
+                    positions = self._apply(con, uf, df, codes, uniques, stored, full=True)
+        finally:
+            con.close()
+        # every set is labelled by one of its members, all of them in df
+        owner = np.full(len(uf), None, dtype=object)
+        owner[positions] = uniques
+        cluster_ids = owner[uf.labels()[positions[codes]]]
+        ids = df['user_id'].tolist()
+        mapping = dict(zip(ids, cluster_ids.tolist()))
+        df['cluster_id'] = cluster_ids
+        return df, mapping, clusters_of(ids, cluster_ids.tolist())
+
+    def update(self, df_delta):
+        """Fold new and changed users into the store without reading the
+        rest. Returns {user_id: cluster_id} for every user whose cluster_id
+        is new or changed."""
+        df = prepare_users(df_delta)
+        codes, uniques = pd.factorize(df['user_id'], sort=False)
+        uniques = np.asarray(uniques, dtype=object)
+        con = self.connect()
+        try:
+            with con:
+                uf = self._load(con)
+                if uf is None:
+                    uf, positions = self._bootstrap(con, df, codes, uniques)
+                    return dict(zip(uniques.tolist(), uniques[uf.labels()[positions]].tolist()))
+                self._temp_table(con, 'delta_ids', 'user_id TEXT', [(uid,) for uid in uniques.tolist()])
+                stored = pd.read_sql_query(
+                    "SELECT u.user_id, u.pos, u.digest FROM delta_ids d CROSS JOIN users u ON u.user_id = d.user_id", con)
+                before = uf.labels().copy()
+                self._apply(con, uf, df, codes, uniques, stored, full=False)
+                after = uf.labels()
+                moved = np.flatnonzero(before != after[:len(before)])
+                affected = np.concatenate([moved, np.arange(len(before), len(after))])
+                owners = self._owners(con, len(uf), np.concatenate([affected, after[affected]]))
+        finally:
+            con.close()
+        return {owners[p]: owners[after[p]] for p in affected.tolist() if owners[p] is not None}
+
+    def is_empty(self):
+        """True while no users have been stored (or they were from an older STORE_VERSION)."""
+        con = self.connect()
+        try:
+            return self._load(con) is None
+        finally:
+            con.close()
+
+    def assign(self, df_users):
+        """What reconcile(df_users) returns, taken from the stored clusters
+        without matching anything: df_users must hold exactly the stored
+        users (e.g. after update() with the rows that changed since)."""
+        df = prepare_users(df_users)
+        con = self.connect()
+        try:
+            uf = self._load(con)
+            stored = pd.read_sql_query("SELECT user_id, pos FROM users", con)
+        finally:
+            con.close()
+        ids = pd.Index(df['user_id'].unique())
+        if uf is None or len(ids) != len(stored) or (pd.Index(stored['user_id']).get_indexer(ids) < 0).any():
+            raise ValueError("The users table and the user store hold different users; "
+                             "removed users, or a delta that missed some, need a run without the delta")
+        positions = stored['pos'].to_numpy(dtype=np.int64)
+        owner = np.full(len(uf), None, dtype=object)
+        owner[positions] = stored['user_id'].to_numpy(dtype=object)
+        mapping = dict(zip(stored['user_id'].tolist(), owner[uf.labels()[positions]].tolist()))
+        df['cluster_id'] = df['user_id'].map(mapping)
+        ids = df['user_id'].tolist()
+        return df, mapping, clusters_of(ids, df['cluster_id'].tolist())
+
+    def _load(self, con):
+        row = con.execute("SELECT parent, rank, label FROM union_find WHERE id = 0").fetchone()
+        return None if row is None else UnionFind.from_state(*row)
+
+    def _save(self, con, uf):
+        con.execute("INSERT OR REPLACE INTO union_find VALUES (0, ?, ?, ?)", uf.state())
+
+    def _temp_table(self, con, name, columns, rows):
+        con.execute(f"DROP TABLE IF EXISTS temp.{name}")
+        con.execute(f"CREATE TEMP TABLE {name} ({columns})")
+        width = columns.count(',') + 1
+        con.executemany(f"INSERT INTO temp.{name} VALUES ({', '.join('?' * width)})", rows)
+
+    def _insert_users(self, con, user_ids, positions, digests):
+        con.executemany("INSERT OR REPLACE INTO users VALUES (?, ?, ?)",
+                        zip(user_ids.tolist(), positions.tolist(), digests.tolist()))
+
+    def _insert_keys(self, con, keys):
+        con.executemany("INSERT INTO block_keys VALUES (?, ?, ?)", keys.itertuples(index=False, name=None))
+
+    def _bootstrap(self, con, df, codes, uniques):
+        """Fill an empty store from a full reconcile; returns the UnionFind
+        and each user id's position."""
+        norm = normalize_match_fields(df)
+        uf = UnionFind(len(uniques))
+        uf.union_many(codes[blocking_edges(norm)])
+        positions = np.arange(len(uniques), dtype=np.int64)
+        for name in INDEXES:
+            con.execute(f"DROP INDEX IF EXISTS {name}")
+        self._insert_users(con, uniques, positions, user_digests(df, codes, len(uniques)))
+        # in primary key order, so the clustered table is filled by appends
+        self._insert_keys(con, block_keys(norm, codes.astype(np.int64)).sort_values(['combo', 'key', 'pos']))
+        for statement in INDEXES.values():
+            con.execute(statement)
+        self._save(con, uf)
+        self.stats = {'users': len(uniques), 'new': len(uniques), 'changed': 0, 'removed': 0, 'relinked': len(uniques)}
+        return uf, positions
+
+    def _apply(self, con, uf, df, codes, uniques, stored, full):
+        """Fold the users of df into uf and the tables. stored holds the
+        store's rows for (at least) the ids in df; with full=True the ids
+        of stored missing from df are removed. Returns each id's position."""
+        digests = user_digests(df, codes, len(uniques))
+        found = pd.Index(stored['user_id']).get_indexer(uniques)
+        is_new = found < 0
+        positions = len(uf) + np.cumsum(is_new, dtype=np.int64) - 1
+        positions[~is_new] = stored['pos'].to_numpy(dtype=np.int64)[found[~is_new]]
+        is_changed = np.zeros(len(uniques), dtype=bool)
+        is_changed[~is_new] = stored['digest'].to_numpy(dtype=np.int64)[found[~is_new]] != digests[~is_new]
+        removed = np.empty(0, dtype=np.int64)
+        if full:
+            gone = np.ones(len(stored), dtype=bool)
+            gone[found[~is_new]] = False
+            removed = stored['pos'].to_numpy(dtype=np.int64)[gone]
+            con.executemany("DELETE FROM users WHERE user_id = ?", ((uid,) for uid in stored['user_id'][gone]))
+
+        # changed or removed users may split their clusters: reset them whole
+        dirty = np.concatenate([positions[is_changed], removed])
+        members = np.empty(0, dtype=np.int64)
+        if len(dirty):
+            roots = uf.roots()
+            members = np.flatnonzero(np.isin(roots, roots[dirty]))
+            uf.reset(members)
+            con.executemany("DELETE FROM block_keys WHERE pos = ?", ((p,) for p in dirty.tolist()))
+        uf.add(int(is_new.sum()))
+
+        touched = is_new | is_changed
+        self._insert_users(con, uniques[touched], positions[touched], digests[touched])
+        rows = np.flatnonzero(touched[codes])
+        if len(rows):
+            norm = normalize_match_fields(df.iloc[rows])
+            self._insert_keys(con, block_keys(norm, positions[codes[rows]]))
+
+        # everyone sharing a blocking key with a relinked user, through the index
+        relink = np.union1d(np.setdiff1d(members, removed), positions[is_new])
+        self._temp_table(con, 'relink', 'pos INTEGER', [(p,) for p in relink.tolist()])
+        buckets = pd.read_sql_query(
+            "SELECT b.combo, b.key, b.pos FROM ("
+            "  SELECT DISTINCT k.combo, k.key FROM relink r CROSS JOIN block_keys k ON k.pos = r.pos"
+            ") t CROSS JOIN block_keys b ON b.combo = t.combo AND b.key = t.key", con)
+        if len(buckets):
+            uf.union_many(bucket_edges(buckets))
+        self._save(con, uf)
+        self.stats = {'users': len(uniques), 'new': int(is_new.sum()), 'changed': int(is_changed.sum()),
+                      'removed': len(removed), 'relinked': len(relink)}
+        return positions
+
+    def _owners(self, con, n, positions):
+        """Array of n user_ids with those at the given union-find positions
+        filled in (None elsewhere and for removed users)."""
+        owner = np.full(n, None, dtype=object)
+        self._temp_table(con, 'wanted', 'pos INTEGER', [(p,) for p in np.unique(positions).tolist()])
+        rows = con.execute("SELECT u.pos, u.user_id FROM wanted w CROSS JOIN users u ON u.pos = w.pos").fetchall()
+        if rows:
+            pos, ids = zip(*rows)
+            owner[list(pos)] = ids
+        return owner